@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import sys
+import json
+import struct
+from collections import deque
+from binascii import hexlify
+from Bits import BitWriter, DEFAULT_CAPACITY
+from Factory import Factory
+from Logger import Logger
+from Container import ContainerWriter
+from Constants import FRAMING_LENGTH, FRAMING_RAW, FRAMING_HEX, FRAMING_CONTAINER
+from Constants import FRAMINGS, DEFAULT_CHUNK_SIZE
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Prefix of the headers with FRAMING_LENGTH: their size in bytes, as
+# a 32-bit big-endian unsigned integer. The framings are defined in
+# Constants.py.
+LENGTH_PREFIX = struct.Struct(">I")
+
+# Number of chunks queued per worker process
+CHUNKS_PER_WORKER = 2
+#//////////////////////////////////////////////////////////
+
+def parse_spec(_line):
+	"""
+		Parses a message specification given as a JSON object.
+	"""
+	try:
+		spec = json.loads(_line)
+	except ValueError as e:
+		raise Exception("Invalid JSON: {:s}.".format(e))
+	if (not isinstance(spec, dict)):
+		raise Exception("Specification is not a JSON object.")
+	return spec
+
+def read_lines(_input):
+	"""
+		Reads the lines of a JSON lines file, one at a time. Empty
+		lines are ignored.
+
+		Returns:
+			A generator of (line number, line) tuples.
+	"""
+	lineno = 0
+	for line in _input:
+		lineno += 1
+		line = line.strip()
+		if (line):
+			yield (lineno, line)
+
+def read_specs(_input, _report=None):
+	"""
+		Reads message specifications from a file containing one
+		JSON object per line. Empty lines are ignored.
+
+		The file is read one line at a time, so batches of any size
+		can be processed.
+
+		Args:
+			_input: File object to read.
+			_report: Function called with the line number and the
+					error message of each invalid line, which is
+					then skipped. By default, the first invalid
+					line raises an exception.
+
+		Returns:
+			A generator of (line number, dictionary) tuples.
+	"""
+	for (lineno, line) in read_lines(_input):
+		try:
+			spec = parse_spec(line)
+		except Exception as e:
+			if (_report is None):
+				raise Exception("Line {:d}: {:s}".format(lineno, e))
+			_report(lineno, str(e))
+			continue
+		yield (lineno, spec)
+
+def frame(_data, _framing=FRAMING_LENGTH):
+	"""
+		Frames an encoded header for output.
+	"""
+	if (_framing == FRAMING_LENGTH):
+		return LENGTH_PREFIX.pack(len(_data)) + _data
+	if (_framing == FRAMING_RAW):
+		return _data
+	if (_framing == FRAMING_HEX):
+		return hexlify(_data) + "\n"
+	if (_framing == FRAMING_CONTAINER):
+		# Records are framed by the ContainerWriter
+		return _data
+	raise Exception("Unknown framing '{:s}'.".format(_framing))
+
+# =============================================================================
+# BatchEncoder Class
+#
+# Description:
+#   Encodes a stream of message specifications and writes the framed
+#   headers to an output file as they are produced. Specifications
+#   use the keys of the command line parameters. A single BitWriter
+#   is reused for all the messages.
+#
+class BatchEncoder(object):
+
+	def __init__(self, _output, _framing=FRAMING_LENGTH, _defaults=None, _factory=None, _where=None):
+		"""
+			Creates a new batch encoder.
+
+			Args:
+				_output: File object receiving the framed headers.
+				_framing: One of FRAMINGS.
+				_defaults: Dictionary of parameters applied to all
+						the messages, which the specifications
+						may override.
+				_factory: Factory used to build the messages.
+				_where: Filter expression (see Query.py). Messages
+						which do not match it are not written.
+		"""
+		if (_framing not in FRAMINGS):
+			raise Exception("Unknown framing '{:s}'.".format(_framing))
+		self.output = _output
+		self.framing = _framing
+		self.container = None
+		if (_framing == FRAMING_CONTAINER and _output is not None):
+			self.container = ContainerWriter(_output)
+		self.defaults = dict(_defaults or {})
+		self.factory = _factory
+		if (self.factory is None):
+			self.factory = Factory()
+		self.writer = BitWriter(DEFAULT_CAPACITY)
+		self.where = None
+		if (_where):
+			# Imported here as Query depends on this module
+			from Query import Where
+			self.where = Where(_where)
+		# Number of messages which did not match the filter
+		self.filtered = 0
+
+	def encode(self, _spec):
+		"""
+			Encodes the header of a message specification.
+
+			Returns:
+				The header as a string of bytes, or None if the
+				message does not match the filter.
+		"""
+		params = _spec
+		if (self.defaults):
+			params = dict(self.defaults)
+			params.update(_spec)
+		message = self.factory.new_message(params)
+		if (self.where is not None and not self.where(message.values)):
+			self.filtered += 1
+			return None
+		writer = self.writer
+		writer.reset()
+		message.write_to(writer)
+		return writer.tobytes()
+
+	def write(self, _spec):
+		"""
+			Encodes a message specification and writes the framed
+			header to the output.
+
+			Returns:
+				True if the header was written, False if the message
+				does not match the filter.
+		"""
+		data = self.encode(_spec)
+		if (data is None):
+			return False
+		if (self.container is not None):
+			self.container.append(data)
+		else:
+			self.output.write(frame(data, self.framing))
+		return True
+
+	def close(self):
+		"""
+			Completes the output. The index of containers is written
+			once all the headers are.
+		"""
+		if (self.container is not None):
+			self.container.close()
+
+	def run(self, _input):
+		"""
+			Encodes the specifications of a JSON lines file, one
+			line at a time. Invalid specifications are reported and
+			skipped.
+
+			Returns:
+				A tuple containing the number of headers written
+				and the number of specifications skipped.
+		"""
+		logger = self.factory.logger
+		written = 0
+		skipped = []
+		def report(_lineno, _error):
+			skipped.append(_lineno)
+			logger.print_error("Line {:d}: {:s}".format(_lineno, _error))
+		for (lineno, spec) in read_specs(_input, report):
+			try:
+				if (self.write(spec)):
+					written += 1
+			except Exception as e:
+				report(lineno, str(e))
+		return (written, len(skipped))
+
+	def run_specs(self, _specs):
+		"""
+			Encodes message specifications given as dictionaries,
+			e.g. by a generator. Invalid specifications are reported
+			and skipped.
+
+			Returns:
+				A tuple containing the number of headers written
+				and the number of specifications skipped.
+		"""
+		logger = self.factory.logger
+		written = 0
+		skipped = 0
+		for (number, spec) in enumerate(_specs):
+			try:
+				if (self.write(spec)):
+					written += 1
+			except Exception as e:
+				skipped += 1
+				logger.print_error("Message {:d}: {:s}".format(number + 1, e))
+		return (written, skipped)
+
+	def encode_lines(self, _lines):
+		"""
+			Encodes a list of (line number, JSON line) tuples, as
+			returned by read_lines().
+
+			Returns:
+				A tuple containing the list of framed headers, the
+				list of (line number, error message) tuples of the
+				invalid specifications and the number of messages
+				which did not match the filter.
+		"""
+		framed = []
+		errors = []
+		framing = self.framing
+		filtered = self.filtered
+		for (lineno, line) in _lines:
+			try:
+				data = self.encode(parse_spec(line))
+				if (data is not None):
+					framed.append(frame(data, framing))
+			except Exception as e:
+				errors.append((lineno, str(e)))
+		return (framed, errors, self.filtered - filtered)
+
+# Encoder of the current worker process
+_worker_encoder = None
+
+def _init_worker(_framing, _defaults, _where):
+	"""
+		Initializes a worker process of a ParallelBatchEncoder. The
+		header layout and the filter are compiled once per worker.
+	"""
+	global _worker_encoder
+	_worker_encoder = BatchEncoder(None, _framing, _defaults, _where=_where)
+	_worker_encoder.factory.new_message({})
+
+def _encode_chunk(_lines):
+	return _worker_encoder.encode_lines(_lines)
+
+# =============================================================================
+# ParallelBatchEncoder Class
+#
+# Description:
+#   Encodes a JSON lines file across a pool of worker processes. The
+#   lines are sent to the workers in chunks and parsed there, so the
+#   parent process only reads and writes; the framed headers are
+#   written in the order of the input. Only a few chunks per worker
+#   are pending at any time, so memory does not grow with the size of
+#   the batch.
+#
+class ParallelBatchEncoder(object):
+
+	def __init__(self, _output, _framing=FRAMING_LENGTH, _defaults=None,
+		_workers=None, _chunksize=DEFAULT_CHUNK_SIZE, _logger=None, _where=None):
+		"""
+			Creates a new parallel batch encoder.
+
+			Args:
+				_output: File object receiving the framed headers.
+				_framing: One of FRAMINGS.
+				_defaults: Dictionary of parameters applied to all
+						the messages.
+				_workers: Number of worker processes. Defaults to
+						the number of processors.
+				_chunksize: Number of specifications per chunk.
+				_logger: Logger reporting invalid specifications.
+				_where: Filter expression. Messages which do not
+						match it are not written.
+		"""
+		if (_framing not in FRAMINGS):
+			raise Exception("Unknown framing '{:s}'.".format(_framing))
+		if (_chunksize < 1):
+			raise Exception("Chunk size must be at least 1.")
+		self.output = _output
+		self.framing = _framing
+		self.container = None
+		if (_framing == FRAMING_CONTAINER):
+			self.container = ContainerWriter(_output)
+		self.defaults = dict(_defaults or {})
+		if (not _workers):
+			import multiprocessing
+			_workers = multiprocessing.cpu_count()
+		self.workers = _workers
+		self.chunksize = _chunksize
+		self.logger = _logger
+		if (self.logger is None):
+			self.logger = Logger(sys.stderr)
+		self.where = _where
+		if (_where):
+			# Report invalid expressions before starting the workers
+			from Query import Where
+			Where(_where)
+		self.filtered = 0
+
+	def chunks(self, _input):
+		"""
+			Splits a JSON lines file into lists of (line number,
+			line) tuples.
+		"""
+		chunk = []
+		for line in read_lines(_input):
+			chunk.append(line)
+			if (len(chunk) >= self.chunksize):
+				yield chunk
+				chunk = []
+		if (chunk):
+			yield chunk
+
+	def run(self, _input):
+		"""
+			Encodes the specifications of a JSON lines file.
+
+			Returns:
+				A tuple containing the number of headers written
+				and the number of specifications skipped.
+		"""
+		written = 0
+		skipped = 0
+		maxpending = self.workers * CHUNKS_PER_WORKER
+		# Loaded here as most runs encode in a single process
+		import multiprocessing
+		pool = multiprocessing.Pool(self.workers, _init_worker,
+			(self.framing, self.defaults, self.where))
+		try:
+			pending = deque()
+			chunks = self.chunks(_input)
+			while (True):
+				while (len(pending) < maxpending):
+					chunk = next(chunks, None)
+					if (chunk is None):
+						break
+					pending.append(pool.apply_async(_encode_chunk, (chunk,)))
+				if (not pending):
+					break
+				# Results are written in the order of the input
+				(framed, errors, filtered) = pending.popleft().get()
+				self.filtered += filtered
+				if (self.container is not None):
+					for data in framed:
+						self.container.append(data)
+				else:
+					self.output.write(''.join(framed))
+				written += len(framed)
+				skipped += len(errors)
+				for (lineno, error) in errors:
+					self.logger.print_error("Line {:d}: {:s}".format(lineno, error))
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+		return (written, skipped)
+
+	def close(self):
+		"""
+			Completes the output. The index of containers is written
+			once all the headers are.
+		"""
+		if (self.container is not None):
+			self.container.close()
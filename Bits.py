@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+from binascii import hexlify, unhexlify
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Number of pending bits kept in the accumulator before
+# complete bytes are moved to the output buffer.
+FLUSH_THRESHOLD = 64
+
+# Number of bytes preallocated for the encoding of a header.
+DEFAULT_CAPACITY = 256
+
+# Number of bytes loaded at once in the window of a BitReader.
+WINDOW_SIZE = 64
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# BitWriter Class
+#
+# Description:
+#   Packs values into a bytearray. Bits are shifted into an integer
+#   accumulator and complete bytes are moved to the output buffer,
+#   so that no intermediate bitstring is created.
+#
+class BitWriter(object):
+	__slots__ = ("buffer", "pos", "acc", "nbits")
+
+	def __init__(self, _capacity=0):
+		"""
+			Creates a new writer.
+
+			Args:
+				_capacity: Number of bytes to preallocate in the
+						output buffer. The buffer grows as needed.
+		"""
+		self.buffer = bytearray(_capacity)
+		self.pos = 0		# Number of complete bytes in the buffer
+		self.acc = 0		# Pending bits
+		self.nbits = 0		# Number of pending bits
+
+	def __len__(self):
+		return (self.pos << 3) + self.nbits
+
+	def __repr__(self):
+		return "<BitWriter: {:d} bits>".format(len(self))
+
+	def reset(self):
+		"""
+			Discards the written bits. The preallocated buffer is
+			kept so the writer can be reused for the next message.
+		"""
+		self.pos = 0
+		self.acc = 0
+		self.nbits = 0
+
+	def write(self, _value, _size):
+		"""
+			Appends the _size least significant bits of an
+			unsigned integer.
+		"""
+		self.acc = (self.acc << _size) | _value
+		self.nbits += _size
+		if (self.nbits >= FLUSH_THRESHOLD):
+			self.flush()
+
+	def write_bit(self, _bit):
+		self.acc = (self.acc << 1) | _bit
+		self.nbits += 1
+		if (self.nbits >= FLUSH_THRESHOLD):
+			self.flush()
+
+	def write_bits(self, _bits):
+		"""
+			Appends the content of a bitstring object.
+		"""
+		if (_bits.len > 0):
+			self.write(_bits.uint, _bits.len)
+
+	def flush(self):
+		"""
+			Moves the complete bytes of the accumulator to the
+			output buffer.
+		"""
+		nbytes = self.nbits >> 3
+		if (nbytes == 0):
+			return
+		rem = self.nbits & 7
+		chunk = self.acc >> rem
+		self.acc &= (1 << rem) - 1
+		self.nbits = rem
+		pos = self.pos
+		if (nbytes == 1):
+			data = (chunk,)
+		else:
+			data = unhexlify("{:0{}x}".format(chunk, nbytes << 1))
+		self.buffer[pos:pos+nbytes] = data
+		self.pos = pos + nbytes
+
+	def tobytes(self):
+		"""
+			Returns the written bits as a string of bytes. The last
+			byte is padded with zero bits.
+		"""
+		self.flush()
+		data = bytes(self.buffer[:self.pos])
+		if (self.nbits):
+			data += chr(self.acc << (8 - self.nbits))
+		return data
+
+	def bitarray(self):
+		"""
+			Returns the written bits as a BitArray. The bitstring
+			module is only loaded when needed, as the encoders and
+			decoders work on bytes.
+		"""
+		from bitstring import BitArray
+		length = len(self)
+		return BitArray(bytes=self.tobytes(), length=length)
+
+# =============================================================================
+# BitReader Class
+#
+# Description:
+#   Cursor reading unsigned integers of any size from a buffer of
+#   bytes (string, bytearray, memoryview or mmap). The bytes around
+#   the cursor are loaded into an integer window, so reads are
+#   performed with shifts and masks instead of one call per bit.
+#
+class BitReader(object):
+	__slots__ = ("data", "pos", "end", "wstart", "wend", "window")
+
+	def __init__(self, _data, _offset=0, _length=None):
+		"""
+			Creates a new reader.
+
+			Args:
+				_data: Buffer to read from.
+				_offset: Position of the first bit to read.
+				_length: Number of bits which can be read from
+						the offset. Defaults to the end of the
+						buffer.
+		"""
+		self.data = _data
+		self.pos = _offset
+		self.end = len(_data) << 3
+		if (_length is not None):
+			self.end = min(self.end, _offset + _length)
+		self.wstart = 0		# First byte loaded in the window
+		self.wend = 0		# Byte following the window
+		self.window = 0
+
+	def __repr__(self):
+		return "<BitReader: {:d}/{:d} bits>".format(self.pos, self.end)
+
+	@classmethod
+	def from_bits(cls, _bits):
+		"""
+			Creates a reader from a bitstring object. The reader
+			starts at the current position of BitStream objects.
+		"""
+		return cls(_bits.tobytes(), getattr(_bits, "pos", 0), _bits.len)
+
+	def remaining(self):
+		return self.end - self.pos
+
+	def read(self, _size):
+		"""
+			Reads an unsigned integer of _size bits.
+		"""
+		pos = self.pos
+		end = pos + _size
+		if (end > self.end):
+			raise Exception("Cannot read {:d} bits at position {:d}: end of data reached.".format(_size, pos))
+		if ((pos >> 3) < self.wstart or end > (self.wend << 3)):
+			self._load(pos, end)
+		self.pos = end
+		return int((self.window >> ((self.wend << 3) - end)) & ((1 << _size) - 1))
+
+	def peek(self, _size):
+		"""
+			Reads an unsigned integer of _size bits without moving
+			the cursor.
+		"""
+		pos = self.pos
+		value = self.read(_size)
+		self.pos = pos
+		return value
+
+	def _load(self, _pos, _end):
+		start = _pos >> 3
+		stop = min(max((_end + 7) >> 3, start + WINDOW_SIZE), len(self.data))
+		self.window = int(hexlify(self.data[start:stop]), 16)
+		self.wstart = start
+		self.wend = stop
+
+	def skip(self, _size):
+		"""
+			Moves the cursor forward by _size bits.
+		"""
+		if (self.pos + _size > self.end):
+			raise Exception("Cannot skip {:d} bits at position {:d}: end of data reached.".format(_size, self.pos))
+		self.pos += _size
+
+	def align(self):
+		"""
+			Moves the cursor to the next byte boundary.
+		"""
+		self.pos = min((self.pos + 7) & ~7, self.end)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import mmap
+from collections import Counter
+from Bits import BitReader
+from Batch import LENGTH_PREFIX, FRAMING_LENGTH, FRAMING_RAW
+from Factory import Factory
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Framings which can be read from a capture file
+CAPTURE_FRAMINGS = (FRAMING_LENGTH, FRAMING_RAW)
+
+# Fields counted by default by analyze_capture()
+ANALYSIS_FIELDS = ("fad", "msgnumber", "msgprecedence", "originator_urn")
+# Default number of records per shard of an analysis
+DEFAULT_SHARD_SIZE = 10000
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# CaptureReader Class
+#
+# Description:
+#   Decodes the headers stored in a capture file, as written by the
+#   batch encoders with the length or raw framing. The file is
+#   memory-mapped and read through a BitReader, so only the pages
+#   being decoded are loaded and memory use does not depend on the
+#   size of the file.
+#
+class CaptureReader(object):
+
+	def __init__(self, _filename, _framing=FRAMING_LENGTH, _factory=None):
+		"""
+			Opens a capture file.
+
+			Args:
+				_filename: Path of the capture file.
+				_framing: FRAMING_LENGTH if each header is preceded
+						by its length, or FRAMING_RAW if headers are
+						concatenated, each padded to a byte boundary.
+				_factory: Factory used to decode the messages.
+		"""
+		if (_framing not in CAPTURE_FRAMINGS):
+			raise Exception("Cannot read captures with framing '{:s}'.".format(_framing))
+		self.filename = _filename
+		self.framing = _framing
+		self.factory = _factory
+		if (self.factory is None):
+			self.factory = Factory()
+		self.file = open(_filename, "rb")
+		self.map = None
+		self.data = ""
+		try:
+			self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			# Empty files cannot be mapped
+			pass
+		if (self.map is not None):
+			try:
+				self.data = memoryview(self.map)
+			except TypeError:
+				# mmap objects do not support memoryview on
+				# Python 2; the BitReader slices the map directly.
+				self.data = self.map
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, _type, _value, _traceback):
+		self.close()
+
+	def close(self):
+		if (isinstance(self.data, memoryview)):
+			self.data.release()
+		self.data = ""
+		if (self.map is not None):
+			self.map.close()
+			self.map = None
+		self.file.close()
+
+	def records(self, _offset=0, _count=None):
+		"""
+			Iterates over the headers of the capture.
+
+			Args:
+				_offset: Position of the first record to read, in
+						bytes. Only supported by the length framing.
+				_count: Maximum number of records to read.
+
+			Returns:
+				A generator of (offset, BitReader) tuples, giving
+				the position of each header in the file and a reader
+				limited to that header.
+		"""
+		data = self.data
+		size = len(data)
+		offset = _offset
+		if (self.framing == FRAMING_LENGTH):
+			count = 0
+			while (offset < size and count != _count):
+				(start, length) = self._record_at(offset)
+				yield (offset, BitReader(data, start << 3, length << 3))
+				offset = start + length
+				count += 1
+		elif (_offset or _count is not None):
+			raise Exception("Records of raw captures can only be read sequentially.")
+		else:
+			reader = BitReader(data)
+			while (reader.remaining() > 0):
+				yield (reader.pos >> 3, reader)
+				# Headers are padded to a byte boundary
+				reader.align()
+
+	def _record_at(self, _offset):
+		"""
+			Reads the length prefix of the record at the given
+			offset.
+
+			Returns:
+				A tuple containing the offset and the length of the
+				header, in bytes.
+		"""
+		data = self.data
+		start = _offset + LENGTH_PREFIX.size
+		if (start > len(data)):
+			raise Exception("Truncated record at offset {:d}.".format(_offset))
+		(length,) = LENGTH_PREFIX.unpack_from(data, _offset)
+		if (start + length > len(data)):
+			raise Exception("Truncated record at offset {:d}.".format(_offset))
+		return (start, length)
+
+	def shards(self, _size):
+		"""
+			Splits the capture into shards of consecutive records.
+			Only the length prefixes are read.
+
+			Args:
+				_size: Number of records per shard.
+
+			Returns:
+				A generator of (offset, number of records) tuples.
+		"""
+		if (self.framing != FRAMING_LENGTH):
+			raise Exception("Only captures with framing '{:s}' can be split.".format(FRAMING_LENGTH))
+		size = len(self.data)
+		offset = 0
+		first = 0
+		count = 0
+		while (offset < size):
+			(start, length) = self._record_at(offset)
+			offset = start + length
+			count += 1
+			if (count == _size):
+				yield (first, count)
+				first = offset
+				count = 0
+		if (count):
+			yield (first, count)
+
+	def messages(self):
+		"""
+			Decodes the headers of the capture.
+
+			Returns:
+				A generator of Message objects.
+		"""
+		read_message = self.factory.read_message
+		for (offset, reader) in self.records():
+			yield read_message(reader)
+
+	def dicts(self, _fields=None):
+		"""
+			Decodes the headers of the capture into dictionaries of
+			the fields present.
+
+			Args:
+				_fields: Codes of the fields to decode. Only the
+						part of each header preceding those fields is
+						read, and absent fields are included with a
+						value of None. All the fields are decoded
+						by default.
+
+			Returns:
+				A generator of dictionaries.
+		"""
+		if (_fields is None):
+			for message in self.messages():
+				yield dict(message.values.items())
+			return
+		read_fields = self.factory.read_fields
+		raw = (self.framing == FRAMING_RAW)
+		for (offset, reader) in self.records():
+			if (raw):
+				# The end of a header is only known once it is
+				# entirely read.
+				values = self.factory.read_message(reader).values
+				yield dict((code, values.get(code)) for code in _fields)
+			else:
+				yield read_fields(reader, _fields)
+
+def read_capture(_filename, _framing=FRAMING_LENGTH, _fields=None, _dicts=False):
+	"""
+		Decodes all the headers of a capture file.
+
+		Args:
+			_filename: Path of the capture file.
+			_framing: Framing of the headers in the file.
+			_fields: Codes of the fields to decode. Implies _dicts.
+			_dicts: Yield dictionaries instead of Message objects.
+
+		Returns:
+			A generator of Message objects or dictionaries. The file
+			is closed once the generator is exhausted or closed.
+	"""
+	with CaptureReader(_filename, _framing) as capture:
+		if (_dicts or _fields is not None):
+			for item in capture.dicts(_fields):
+				yield item
+		else:
+			for message in capture.messages():
+				yield message
+
+def count_fields(_items, _fields):
+	"""
+		Counts the values of some fields.
+
+		Args:
+			_items: Iterable of dictionaries of field values.
+			_fields: Codes of the fields to count.
+
+		Returns:
+			A dictionary containing a Counter of the values of each
+			field. Absent fields are not counted, and each value
+			of a repeated field is counted.
+	"""
+	counts = dict((code, Counter()) for code in _fields)
+	for item in _items:
+		for code in _fields:
+			value = item.get(code)
+			if (value is None):
+				continue
+			if (isinstance(value, list)):
+				counts[code].update(v for v in value if v is not None)
+			else:
+				counts[code][value] += 1
+	return counts
+
+def merge_counts(_counts, _partial):
+	"""
+		Adds partial counts returned by count_fields() to _counts.
+	"""
+	for (code, counter) in _partial.items():
+		_counts.setdefault(code, Counter()).update(counter)
+	return _counts
+
+# Capture opened by the current worker process
+_worker_capture = None
+
+def _count_shard(_args):
+	"""
+		Counts the values of the fields of a shard of a capture, in
+		a worker process of analyze_capture().
+	"""
+	global _worker_capture
+	(filename, offset, count, fields) = _args
+	if (_worker_capture is None or _worker_capture.filename != filename):
+		if (_worker_capture is not None):
+			_worker_capture.close()
+		_worker_capture = CaptureReader(filename)
+	read_fields = _worker_capture.factory.read_fields
+	items = (read_fields(reader, fields)
+		for (pos, reader) in _worker_capture.records(offset, count))
+	return count_fields(items, fields)
+
+def analyze_capture(_filename, _fields=ANALYSIS_FIELDS, _workers=None, _shardsize=DEFAULT_SHARD_SIZE):
+	"""
+		Counts the values of some fields across all the headers
+		of a capture with the length framing.
+
+		The capture is split into shards of consecutive records,
+		which are decoded by a pool of worker processes. Each worker
+		only decodes the fields counted and returns partial counts,
+		which are merged as they are received.
+
+		Args:
+			_filename: Path of the capture file.
+			_fields: Codes of the fields to count.
+			_workers: Number of worker processes. Defaults to the
+					number of processors. With 1, the capture is
+					analyzed in the current process.
+			_shardsize: Number of records per shard.
+
+		Returns:
+			A dictionary containing a Counter of the values of each
+			field.
+	"""
+	fields = tuple(_fields)
+	counts = dict((code, Counter()) for code in fields)
+	with CaptureReader(_filename) as capture:
+		if (_workers == 1):
+			return merge_counts(counts, count_fields(capture.dicts(fields), fields))
+		tasks = [(_filename, offset, count, fields)
+			for (offset, count) in capture.shards(_shardsize)]
+	import multiprocessing
+	pool = multiprocessing.Pool(_workers or multiprocessing.cpu_count())
+	try:
+		for partial in pool.imap_unordered(_count_shard, tasks):
+			merge_counts(counts, partial)
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	return counts
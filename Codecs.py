@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+from collections import OrderedDict
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Terminator character for strings in VMF messages
+TERMINATOR		= 0x7F
+# Default maximum size of a string, in bits
+MAX_STRING_SIZE	= 448
+# Maximum number of packed strings kept by each codec
+STRING_CACHE_SIZE	= 4096
+
+# 7-bit code of each character which can appear in a string. The
+# terminator is excluded as it cannot be part of the value.
+CHAR_CODES = dict((chr(c), c) for c in range(TERMINATOR))
+# Character of each 7-bit code
+CODE_CHARS = tuple(chr(c) for c in range(TERMINATOR + 1))
+
+# Value used when seconds are not specified in date time groups
+NO_STATEMENT	= 63
+# Sizes of the year, month, day, hour, minute and second
+# subfields of a date time group, followed by the size of
+# the optional extension.
+DTG_SIZES		= (7, 4, 5, 5, 6, 6)
+DTG_EXT_SIZE	= 12
+# Number of encoded date time groups kept by each codec
+DTG_CACHE_SIZE	= 1024
+# Number of days in each month of a leap year
+MONTH_DAYS = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# StringCodec Class
+#
+# Description:
+#   Packs strings into 7-bit ASCII codes followed by the TERMINATOR
+#   character, as used by unit names and file names. A packed string
+#   is returned as a (value, size) tuple ready to be written to a
+#   BitWriter.
+#
+class StringCodec(object):
+
+	def __init__(self, _maxsize=MAX_STRING_SIZE):
+		self.maxsize = _maxsize
+		self.cache = {}
+
+	def __repr__(self):
+		return "<StringCodec: {:d} bits>".format(self.maxsize)
+
+	def pack(self, _string):
+		"""
+			Packs a string.
+
+			Args:
+				_string: string to pack.
+
+			Returns:
+				A tuple containing the packed bits as an unsigned
+				integer and the number of bits.
+		"""
+		packed = self.cache.get(_string)
+		if (packed is not None):
+			return packed
+
+		size = 7 * len(_string)
+		if (size > self.maxsize):
+			raise Exception("Size of bit array exceeds the maximum size allowed ({:d}).".format(self.maxsize))
+		value = 0
+		codes = CHAR_CODES
+		try:
+			for c in _string:
+				value = (value << 7) | codes[c]
+		except KeyError:
+			raise Exception("Character {!r} cannot be encoded in a 7-bit string.".format(c))
+		# Strings shorter than the maximum size are terminated
+		if (size < self.maxsize):
+			value = (value << 7) | TERMINATOR
+			size += 7
+
+		packed = (value, size)
+		if (len(self.cache) >= STRING_CACHE_SIZE):
+			self.cache.clear()
+		self.cache[_string] = packed
+		return packed
+
+	def write(self, _string, _writer):
+		"""
+			Packs a string and writes it to a BitWriter.
+		"""
+		(value, size) = self.pack(_string)
+		_writer.write(value, size)
+
+	def unpack(self, _value, _size):
+		"""
+			Unpacks a string from the packed bits given as an
+			unsigned integer of _size bits.
+		"""
+		chars = []
+		shift = _size - 7
+		while (shift >= 0):
+			c = (_value >> shift) & TERMINATOR
+			if (c == TERMINATOR):
+				break
+			chars.append(CODE_CHARS[c])
+			shift -= 7
+		return ''.join(chars)
+
+# Codecs shared by all the fields of the same size
+_string_codecs = {}
+
+def string_codec(_maxsize=MAX_STRING_SIZE):
+	"""
+		Returns the StringCodec of strings of the given maximum
+		size.
+	"""
+	codec = _string_codecs.get(_maxsize)
+	if (codec is None):
+		codec = _string_codecs[_maxsize] = StringCodec(_maxsize)
+	return codec
+
+# =============================================================================
+# DtgCodec Class
+#
+# Description:
+#   Parses and packs date time groups (DTG) of the form
+#   "YYYY-MM-DD HH:mm[:ss] [extension]". Only the last two digits of
+#   the year are encoded. The most recently encoded DTGs are kept in
+#   a bounded LRU cache, as batches of messages tend to reuse the
+#   same timestamps.
+#
+class DtgCodec(object):
+
+	def __init__(self, _extension=True, _cachesize=DTG_CACHE_SIZE):
+		self.has_extension = _extension
+		self.cachesize = _cachesize
+		self.cache = OrderedDict()
+
+	def __repr__(self):
+		return "<DtgCodec: extension={}>".format(self.has_extension)
+
+	def parse(self, _value):
+		"""
+			Parses a DTG string.
+
+			Returns:
+				A tuple containing the year, month, day, hour,
+				minute, second and extension. The second is set to
+				NO_STATEMENT and the extension to None when they are
+				not provided.
+		"""
+		date_items = _value.split(' ')
+		if (len(date_items) != 2 and len(date_items) != 3):
+			raise Exception("Unknown datetime group format: {:s}.".format(_value))
+		date = date_items[0].split('-')
+		time = date_items[1].split(':')
+		if (len(date) != 3 or len(time) < 2 or len(time) > 3):
+			raise Exception("Unknown datetime group format: {:s}.".format(_value))
+		try:
+			year = int(date[0])
+			month = int(date[1])
+			day = int(date[2])
+			hour = int(time[0])
+			minute = int(time[1])
+			second = NO_STATEMENT
+			if (len(time) == 3):
+				second = int(time[2])
+				if (second < 0 or second > 59):
+					raise ValueError
+			ext = None
+			if (len(date_items) == 3):
+				ext = int(date_items[2])
+				if (ext < 0 or ext >> DTG_EXT_SIZE):
+					raise ValueError
+		except ValueError:
+			raise Exception("Invalid datetime group: {:s}.".format(_value))
+		if (month < 1 or month > 12 or day < 1 or day > MONTH_DAYS[month] or
+			(month == 2 and day == 29 and (year % 4 != 0 or
+				(year % 100 == 0 and year % 400 != 0))) or
+			hour < 0 or hour > 23 or minute < 0 or minute > 59 or year < 0):
+			raise Exception("Invalid datetime group: {:s}.".format(_value))
+		return (year, month, day, hour, minute, second, ext)
+
+	def pack(self, _value):
+		"""
+			Packs a DTG string.
+
+			Returns:
+				A tuple containing the packed bits as an unsigned
+				integer and the number of bits.
+		"""
+		cache = self.cache
+		packed = cache.get(_value)
+		if (packed is not None):
+			# Move the entry to the end of the LRU order
+			del cache[_value]
+			cache[_value] = packed
+			return packed
+
+		(year, month, day, hour, minute, second, ext) = self.parse(_value)
+		value = ((((((year % 100) << 4 | month) << 5 | day) << 5 | hour)
+			<< 6 | minute) << 6 | second)
+		size = 33
+		if (self.has_extension):
+			if (ext is None):
+				value <<= 1
+				size += 1
+			else:
+				value = (((value << 1) | 1) << DTG_EXT_SIZE) | ext
+				size += 1 + DTG_EXT_SIZE
+
+		packed = (value, size)
+		cache[_value] = packed
+		if (len(cache) > self.cachesize):
+			cache.popitem(last=False)
+		return packed
+
+	def write(self, _value, _writer):
+		"""
+			Packs a DTG string and writes it to a BitWriter.
+		"""
+		(value, size) = self.pack(_value)
+		_writer.write(value, size)
+
+	def sort_key(self, _value, _upper=False):
+		"""
+			Returns an integer ordering DTG strings chronologically.
+			The extension is ignored.
+
+			Args:
+				_value: DTG string.
+				_upper: If the seconds are not specified, use the
+						end of the minute instead of its start, for
+						the upper bound of a range.
+		"""
+		(year, month, day, hour, minute, second, ext) = self.parse(_value)
+		if (second == NO_STATEMENT):
+			second = 59 if _upper else 0
+		return (((((year * 16 + month) * 32 + day) * 32 + hour) * 64 + minute) * 64 + second)
+
+	def format(self, _year, _month, _day, _hour, _minute, _second=NO_STATEMENT, _ext=None):
+		"""
+			Builds a DTG string from its decoded subfields.
+		"""
+		dtg = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}".format(
+			2000 + _year, _month, _day, _hour, _minute)
+		if (_second != NO_STATEMENT):
+			dtg += ":{:02d}".format(_second)
+		if (_ext is not None):
+			dtg += " {:d}".format(_ext)
+		return dtg
+
+# Codecs of date time groups with and without extension
+DTG_CODECS = {
+	True	: DtgCodec(True),
+	False	: DtgCodec(False)
+}
+
+def dtg_codec(_extension=True):
+	"""
+		Returns the DtgCodec of date time groups with or without
+		extension.
+	"""
+	return DTG_CODECS[bool(_extension)]
+
+# =============================================================================
+# Enumerator Lookup Table Class
+#
+# Description:
+#   Name->value and value->name tables of an enumerator. Names are
+#   matched regardless of case, and the short codewords accepted on
+#   the command line are registered as aliases. The tables only hold
+#   strings and integers, so that they can be stored with a compiled
+#   layout without the Enum class.
+#
+class EnumTable(object):
+	__slots__ = ("name", "by_name", "by_value")
+
+	def __init__(self, _name, _by_name, _by_value):
+		self.name = _name
+		self.by_name = _by_name
+		self.by_value = tuple(_by_value)
+
+	@classmethod
+	def from_enum(cls, _enumerator, _aliases=None):
+		"""
+			Builds the tables of an Enum class.
+
+			Args:
+				_enumerator: Enum class.
+				_aliases: dictionary of the codewords accepted in
+						addition to the names of the members, and
+						the member they stand for.
+		"""
+		by_name = {}
+		values = {}
+		for member in _enumerator:
+			by_name[member.name] = member.value
+			by_name[member.name.lower()] = member.value
+			values.setdefault(member.value, member.name)
+		for (alias, member) in (_aliases or {}).items():
+			by_name[alias] = member.value
+		names = [None] * (max(values) + 1)
+		for (value, name) in values.items():
+			names[value] = name
+		return cls(_enumerator.__name__, by_name, names)
+
+	def __repr__(self):
+		return "<EnumTable '{:s}'>".format(self.name)
+
+	def value_of(self, _name):
+		"""
+			Returns the numeric value of a codeword, or None if the
+			codeword is unknown. Numeric values are returned as is.
+		"""
+		if (not isinstance(_name, basestring)):
+			return _name
+		value = self.by_name.get(_name)
+		if (value is None):
+			value = self.by_name.get(_name.lower())
+		return value
+
+	def name_of(self, _value):
+		"""
+			Returns the codeword of a numeric value, or None if the
+			value is not defined by the enumerator.
+		"""
+		if (0 <= _value < len(self.by_value)):
+			return self.by_value[_value]
+		return None
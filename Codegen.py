@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+from binascii import hexlify
+from Bits import WINDOW_SIZE
+from Codecs import TERMINATOR, CODE_CHARS, DTG_EXT_SIZE
+from Elements import ABSENT, PRESENT
+from Schema import Instances, KIND_ENUM, KIND_STRING, KIND_DTG
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Largest enumerated field decoded with a table holding every value
+MAX_TABLE_SIZE	= 12
+
+# Name of the generated code in tracebacks
+CODE_FILENAME	= "<header layout>"
+
+# Error messages raised by the generated functions
+ERR_VALUE_SIZE		= "Value {:d} does not fit in field '{:s}' ({:d} bits)."
+ERR_ENUM_VALUE		= "Unknown value '{:s}' for field '{:s}'."
+ERR_FIELD_REPEAT	= "Field '{:s}' is repeated {:d} times, maximum is {:d}."
+ERR_GROUP_REPEAT	= "Group '{:s}' is repeated {:d} times, maximum is {:d}."
+ERR_FIELD_MORE		= "Field '{:s}' is repeated more than {:d} times."
+ERR_GROUP_MORE		= "Group '{:s}' is repeated more than {:d} times."
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# SourceWriter Class
+#
+# Description:
+#   Lines of generated Python source, indented with tabs.
+#
+class SourceWriter(object):
+
+	def __init__(self):
+		self.lines = []
+		self.depth = 0
+
+	def line(self, _text, *_args):
+		"""
+			Appends a line at the current indentation. The text is
+			formatted with the arguments given, if any.
+		"""
+		if (_args):
+			_text = _text.format(*_args)
+		self.lines.append("\t" * self.depth + _text)
+
+	def indent(self):
+		self.depth += 1
+
+	def dedent(self):
+		self.depth -= 1
+
+	def source(self):
+		return "\n".join(self.lines) + "\n"
+
+def _count_function(_out, _group):
+	"""
+		Generates the function returning the number of instances
+		of a group within an instance of its context. See
+		HeaderLayout.count().
+	"""
+	gid = _group.gid
+	_out.line("def count_{:d}(idx, values, counts):", gid)
+	_out.indent()
+	_out.line("c = counts[{:d}]", gid)
+	_out.line("if c is not None:")
+	_out.line("\treturn c[idx] if idx < len(c) else 0")
+	if (not _group.is_repeatable):
+		for slot in _group.local_slots:
+			_out.line("v = values[{:d}]", slot)
+			_out.line("if v is not None and ((idx < len(v) and v[idx] is not None) if v.__class__ is Instances else not idx):")
+			_out.line("\treturn 1")
+		for sub in _group.subgroups:
+			_out.line("if count_{:d}(idx, values, counts):", sub.gid)
+			_out.line("\treturn 1")
+		_out.line("return 0")
+	else:
+		# All the instances belong to the first instance of the
+		# context, unless the counts were set.
+		_out.line("if idx:")
+		_out.line("\treturn 0")
+		_out.line("n = 0")
+		for slot in _group.local_slots:
+			_out.line("v = values[{:d}]", slot)
+			_out.line("if v.__class__ is Instances:")
+			_out.line("\tn = max(n, instances_count(v))")
+			_out.line("elif v is not None and not n:")
+			_out.line("\tn = 1")
+		if (_group.subgroups):
+			_out.line("if not n and ({:s}):", " or ".join(
+				"count_{:d}(0, values, counts)".format(sub.gid) for sub in _group.subgroups))
+			_out.line("\treturn 1")
+		_out.line("return n")
+	_out.dedent()
+	_out.line("")
+
+# =============================================================================
+# Encoder
+#
+# The generated encode(values, counts, w) function shifts the bits of
+# the header into a local integer, which is written to the BitWriter w
+# at the end. Presence indicators, sizes and enumerator tables are
+# constants of the code; instances of nested repeatable groups are
+# numbered with local cursors.
+#
+def _write_bits(_out, _value, _size):
+	_out.line("acc = (acc << {:d}) | {:s}", _size, _value)
+	_out.line("n += {:d}", _size)
+
+def _encode_value(_out, _slot, _value):
+	"""
+		Generates the code writing the value of a field. See
+		HeaderLayout.write_value().
+	"""
+	s = _slot.slot
+	if (_slot.kind == KIND_STRING or _slot.kind == KIND_DTG):
+		_out.line("(x, k) = P{:d}({:s})", s, _value)
+		_out.line("acc = (acc << k) | x")
+		_out.line("n += k")
+		return
+	if (_slot.kind == KIND_ENUM):
+		_out.line("x = E{:d}({:s})", s, _value)
+		_out.line("if x is None:")
+		_out.indent()
+		_out.line("x = V{:d}({:s})", s, _value)
+		_out.line("if x is None:")
+		_out.line("\traise Exception(ERR_ENUM_VALUE.format({:s}, {!r}))", _value, _slot.name)
+		_out.line("x = int(x)")
+		_out.dedent()
+	else:
+		_out.line("x = int({:s})", _value)
+	_out.line("if x < 0 or x >> {:d}:", _slot.size)
+	_out.line("\traise Exception(ERR_VALUE_SIZE.format(x, {!r}, {:d}))", _slot.name, _slot.size)
+	_write_bits(_out, "x", _slot.size)
+
+def _encode_field(_out, _slot, _idx):
+	_out.line("v = values[{:d}]", _slot.slot)
+	_out.line("if v.__class__ is Instances:")
+	_out.line("\tv = v[{0:s}] if {0:s} < len(v) else None", _idx)
+	if (_idx != "0"):
+		_out.line("elif {:s}:", _idx)
+		_out.line("\tv = None")
+	# Fields without FPI only contain their value.
+	if (_slot.is_indicator):
+		_out.line("if v is None:")
+		_out.line("\tv = 0")
+		_encode_value(_out, _slot, "v")
+		return
+	_out.line("if v is None:")
+	_out.indent()
+	_write_bits(_out, str(ABSENT), 1)
+	_out.dedent()
+	_out.line("else:")
+	_out.indent()
+	_write_bits(_out, str(PRESENT), 1)
+	if (not _slot.is_repeatable):
+		_encode_value(_out, _slot, "v")
+	else:
+		_out.line("if not isinstance(v, (list, tuple)):")
+		_out.line("\tv = [v]")
+		if (_slot.max_repeat):
+			_out.line("if len(v) > {:d}:", _slot.max_repeat)
+			_out.line("\traise Exception(ERR_FIELD_REPEAT.format({!r}, len(v), {:d}))",
+				_slot.name, _slot.max_repeat)
+		_out.line("last = len(v) - 1")
+		_out.line("for (i, item) in enumerate(v):")
+		_out.indent()
+		# The FRI indicates if another occurrence follows
+		_write_bits(_out, "(i < last)", 1)
+		_encode_value(_out, _slot, "item")
+		_out.dedent()
+	_out.dedent()
+
+def _encode_group(_out, _group, _idx):
+	gid = _group.gid
+	if (not _group.is_repeatable):
+		_out.line("if count_{:d}({:s}, values, counts):", gid, _idx)
+		_out.indent()
+		_write_bits(_out, str(PRESENT), 1)
+		_encode_children(_out, _group, _idx)
+		_out.dedent()
+		_out.line("else:")
+		_out.indent()
+		_write_bits(_out, str(ABSENT), 1)
+		_out.dedent()
+		return
+
+	_out.line("c{:d} = count_{:d}({:s}, values, counts)", gid, gid, _idx)
+	_out.line("if c{:d}:", gid)
+	_out.indent()
+	_out.line("if c{:d} > {!r}:", gid, _group.max_repeat)
+	_out.line("\traise Exception(ERR_GROUP_REPEAT.format({!r}, c{:d}, {!r}))",
+		_group.name, gid, _group.max_repeat)
+	_write_bits(_out, str(PRESENT), 1)
+	# Instances of a repeatable group are numbered in the order
+	# they appear in the message.
+	if (_group.context is None):
+		_out.line("b{:d} = 0", gid)
+	else:
+		_out.line("b{0:d} = k{0:d}", gid)
+		_out.line("k{0:d} = b{0:d} + c{0:d}", gid)
+	_out.line("for i{0:d} in xrange(c{0:d}):", gid)
+	_out.indent()
+	# The GRI indicates if another instance follows
+	_write_bits(_out, "(i{0:d} < c{0:d} - 1)".format(gid), 1)
+	_out.line("x{0:d} = b{0:d} + i{0:d}", gid)
+	_encode_children(_out, _group, "x{:d}".format(gid))
+	_out.dedent()
+	_out.dedent()
+	_out.line("else:")
+	_out.indent()
+	_write_bits(_out, str(ABSENT), 1)
+	_out.dedent()
+
+def _encode_children(_out, _group, _idx):
+	for node in _group.children:
+		if (node.is_group):
+			_encode_group(_out, node, _idx)
+		else:
+			_encode_field(_out, node, _idx)
+
+def _nested_groups(_layout):
+	"""
+		Returns the repeatable groups contained in other repeatable
+		groups, whose instances are numbered with a cursor.
+	"""
+	return [g for g in _layout.groups if g.is_repeatable and g.context is not None]
+
+def encoder_source(_layout):
+	"""
+		Generates the source of the encode() function of a layout,
+		and of the functions counting the instances of its groups.
+	"""
+	out = SourceWriter()
+	for group in _layout.groups:
+		if (not group.is_root):
+			_count_function(out, group)
+	out.line("def encode(values, counts, w):")
+	out.indent()
+	out.line("acc = 0")
+	out.line("n = 0")
+	for group in _nested_groups(_layout):
+		out.line("k{:d} = 0", group.gid)
+	_encode_children(out, _layout.root, "0")
+	out.line("w.write(acc, n)")
+	out.dedent()
+	return out.source()
+
+# =============================================================================
+# Decoder
+#
+# The generated decode(reader, values, counts) function reads the
+# header into the slot values and instance counts of a HeaderValues
+# object, which are initially empty. Bits are read from a local
+# window over the bytes of the reader, as BitReader.read() does, and
+# the position of the reader is moved past the header at the end.
+#
+def _read_bits(_out, _target, _size):
+	"""
+		Generates the code reading an unsigned integer of _size
+		bits into the _target variable.
+	"""
+	_out.line("e = p + {:d}", _size)
+	_out.line("if e > limit:")
+	_out.line("\t(window, wend, limit) = load_window(data, p, e, end)")
+	_out.line("{:s} = (window >> (wend - e)) & {:#x}", _target, (1 << _size) - 1)
+	_out.line("p = e")
+
+def _decode_value(_out, _slot, _target):
+	"""
+		Generates the code reading the value of a field. See
+		HeaderLayout.read_value().
+	"""
+	s = _slot.slot
+	kind = _slot.kind
+	if (kind == KIND_STRING):
+		_out.line("chars = []")
+		_out.line("for i in xrange({:d}):", _slot.size // 7)
+		_out.indent()
+		_read_bits(_out, "c", 7)
+		_out.line("if c == {:d}:", TERMINATOR)
+		_out.line("\tbreak")
+		_out.line("chars.append(CODE_CHARS[c])")
+		_out.dedent()
+		_out.line("{:s} = ''.join(chars)", _target)
+	elif (kind == KIND_DTG):
+		_read_bits(_out, "d", 33)
+		_out.line("x = None")
+		if (_slot.has_extension):
+			_read_bits(_out, "f", 1)
+			_out.line("if f:")
+			_out.indent()
+			_read_bits(_out, "x", DTG_EXT_SIZE)
+			_out.dedent()
+		_out.line("{:s} = F{:d}(d >> 26, (d >> 22) & 0xF, (d >> 17) & 0x1F, (d >> 12) & 0x1F, (d >> 6) & 0x3F, d & 0x3F, x)",
+			_target, s)
+	elif (kind == KIND_ENUM and _slot.size <= MAX_TABLE_SIZE):
+		_read_bits(_out, "x", _slot.size)
+		_out.line("{:s} = N{:d}[x]", _target, s)
+	elif (kind == KIND_ENUM):
+		_read_bits(_out, "x", _slot.size)
+		_out.line("{:s} = N{:d}(x)", _target, s)
+		_out.line("if {:s} is None:", _target)
+		_out.line("\t{:s} = int(x)", _target)
+	else:
+		# Bits read from windows larger than a machine word are
+		# returned as long integers.
+		_read_bits(_out, "x", _slot.size)
+		_out.line("{:s} = int(x)", _target)
+
+def _decode_field(_out, _slot, _idx):
+	if (_slot.is_indicator):
+		_decode_value(_out, _slot, "v")
+	else:
+		# Absent fields keep their initial value, None
+		_read_bits(_out, "f", 1)
+		_out.line("if f:")
+		_out.indent()
+		if (not _slot.is_repeatable):
+			_decode_value(_out, _slot, "v")
+		else:
+			_out.line("v = []")
+			_out.line("more = 1")
+			_out.line("while more:")
+			_out.indent()
+			if (_slot.max_repeat):
+				_out.line("if len(v) == {:d}:", _slot.max_repeat)
+				_out.line("\traise Exception(ERR_FIELD_MORE.format({!r}, {:d}))",
+					_slot.name, _slot.max_repeat)
+			_read_bits(_out, "more", 1)
+			_decode_value(_out, _slot, "item")
+			_out.line("v.append(item)")
+			_out.dedent()
+	if (_idx == "0"):
+		_out.line("values[{:d}] = v", _slot.slot)
+	else:
+		_out.line("if {:s}:", _idx)
+		_out.line("\tstore_value(values, {:d}, {:s}, v)", _slot.slot, _idx)
+		_out.line("else:")
+		_out.line("\tvalues[{:d}] = v", _slot.slot)
+	if (not _slot.is_indicator):
+		_out.dedent()
+
+def _decode_group(_out, _group, _idx):
+	gid = _group.gid
+	_read_bits(_out, "f", 1)
+	_out.line("if f:")
+	_out.indent()
+	if (not _group.is_repeatable):
+		if (not _group.children):
+			_out.line("pass")
+		_decode_children(_out, _group, _idx)
+		_out.dedent()
+		return
+
+	if (_group.context is None):
+		_out.line("b{:d} = 0", gid)
+	else:
+		_out.line("b{0:d} = k{0:d}", gid)
+	_out.line("c{:d} = 0", gid)
+	_out.line("more{:d} = 1", gid)
+	_out.line("while more{:d}:", gid)
+	_out.indent()
+	_out.line("if c{:d} == {!r}:", gid, _group.max_repeat)
+	_out.line("\traise Exception(ERR_GROUP_MORE.format({!r}, {!r}))",
+		_group.name, _group.max_repeat)
+	_read_bits(_out, "more{:d}".format(gid), 1)
+	_out.line("x{0:d} = b{0:d} + c{0:d}", gid)
+	_decode_children(_out, _group, "x{:d}".format(gid))
+	_out.line("c{:d} += 1", gid)
+	_out.dedent()
+	if (_group.context is not None):
+		_out.line("k{0:d} = b{0:d} + c{0:d}", gid)
+	_out.line("store_count(counts, {:d}, {:s}, c{:d})", gid, _idx, gid)
+	_out.dedent()
+	_out.line("else:")
+	_out.line("\tstore_count(counts, {:d}, {:s}, 0)", gid, _idx)
+
+def _decode_children(_out, _group, _idx):
+	for node in _group.children:
+		if (node.is_group):
+			_decode_group(_out, node, _idx)
+		else:
+			_decode_field(_out, node, _idx)
+
+def decoder_source(_layout):
+	"""
+		Generates the source of the decode() function of a layout.
+	"""
+	out = SourceWriter()
+	out.line("def decode(reader, values, counts):")
+	out.indent()
+	out.line("data = reader.data")
+	out.line("p = reader.pos")
+	out.line("end = reader.end")
+	# The window is loaded by the first read
+	out.line("window = 0")
+	out.line("wend = 0")
+	out.line("limit = 0")
+	for group in _nested_groups(_layout):
+		out.line("k{:d} = 0", group.gid)
+	_decode_children(out, _layout.root, "0")
+	out.line("reader.pos = p")
+	out.dedent()
+	return out.source()
+
+# =============================================================================
+# Compiled functions
+#
+
+# Generators of the source of each function
+FUNCTION_SOURCES = {
+	"encode"	: encoder_source,
+	"decode"	: decoder_source
+}
+
+def compile_function(_layout, _name):
+	"""
+		Generates and compiles a function of a layout.
+
+		Args:
+			_layout: HeaderLayout object.
+			_name: Name of the function, "encode" or "decode".
+
+		Returns:
+			A code object, which can be stored with marshal and
+			bound to the layout with bind_function().
+	"""
+	return compile(FUNCTION_SOURCES[_name](_layout), CODE_FILENAME, "exec")
+
+def instances_count(_instances):
+	"""
+		Returns the number of instances of a field, ignoring the
+		trailing absent ones.
+	"""
+	n = len(_instances)
+	while (n and _instances[n - 1] is None):
+		n -= 1
+	return n
+
+def load_window(_data, _pos, _end, _stop):
+	"""
+		Loads the bytes following a position into an integer, as
+		BitReader._load() does.
+
+		Args:
+			_data: Buffer of the reader.
+			_pos: Position of the next bit to read.
+			_end: Position following the next bits to read.
+			_stop: Position following the last bit of the reader.
+
+		Returns:
+			A tuple containing the window, the position following
+			its last bit, and the position up to which bits can be
+			read from it.
+	"""
+	if (_end > _stop):
+		raise Exception("Cannot read {:d} bits at position {:d}: end of data reached.".format(_end - _pos, _pos))
+	start = _pos >> 3
+	stop = min(max((_end + 7) >> 3, start + WINDOW_SIZE), len(_data))
+	wend = stop << 3
+	return (int(hexlify(_data[start:stop]), 16), wend, min(wend, _stop))
+
+def store_count(_counts, _gid, _idx, _n):
+	"""
+		Stores the number of instances of a group within an
+		instance of its context.
+	"""
+	counts = _counts[_gid]
+	if (counts is None):
+		counts = _counts[_gid] = []
+	while (len(counts) < _idx):
+		counts.append(0)
+	counts.append(_n)
+
+def _enum_values(_enum, _size):
+	"""
+		Returns the decoded value of each integer of _size bits:
+		the name of the enumerated value, or the integer if it is
+		not defined.
+	"""
+	return tuple(_enum.name_of(value) or value for value in range(1 << _size))
+
+def bind_function(_layout, _code, _name):
+	"""
+		Runs the code returned by compile_function() with the
+		codecs and enumerator tables of a layout.
+
+		Returns:
+			The generated function.
+	"""
+	namespace = {
+		"Instances"			: Instances,
+		"CODE_CHARS"		: CODE_CHARS,
+		"instances_count"	: instances_count,
+		"store_count"		: store_count,
+		"load_window"		: load_window,
+		"store_value"		: _layout._store_value,
+		"ERR_VALUE_SIZE"	: ERR_VALUE_SIZE,
+		"ERR_ENUM_VALUE"	: ERR_ENUM_VALUE,
+		"ERR_FIELD_REPEAT"	: ERR_FIELD_REPEAT,
+		"ERR_GROUP_REPEAT"	: ERR_GROUP_REPEAT,
+		"ERR_FIELD_MORE"	: ERR_FIELD_MORE,
+		"ERR_GROUP_MORE"	: ERR_GROUP_MORE
+	}
+	for slot in _layout.slots:
+		s = slot.slot
+		if (slot.kind == KIND_ENUM):
+			namespace["E{:d}".format(s)] = slot.enum.by_name.get
+			namespace["V{:d}".format(s)] = slot.enum.value_of
+			if (slot.size <= MAX_TABLE_SIZE):
+				namespace["N{:d}".format(s)] = _enum_values(slot.enum, slot.size)
+			else:
+				namespace["N{:d}".format(s)] = slot.enum.name_of
+		elif (slot.kind == KIND_STRING):
+			namespace["P{:d}".format(s)] = slot.codec.pack
+		elif (slot.kind == KIND_DTG):
+			namespace["P{:d}".format(s)] = slot.codec.pack
+			namespace["F{:d}".format(s)] = slot.codec.format
+	exec _code in namespace
+	return namespace[_name]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software 
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Global constants
+#
+# Constants of the command line options, which are imported when
+# the parser is built. This module must not import other modules.
+
+# Each header is preceded by its size in bytes, as a 32-bit
+# big-endian unsigned integer.
+FRAMING_LENGTH	= "length"
+# Headers are concatenated without separation.
+FRAMING_RAW		= "raw"
+# Each header is written as a line of hexadecimal digits.
+FRAMING_HEX		= "hex"
+# Headers are stored in a container with an index of the records
+# (see Container.py).
+FRAMING_CONTAINER	= "container"
+
+FRAMINGS = (FRAMING_LENGTH, FRAMING_RAW, FRAMING_HEX, FRAMING_CONTAINER)
+
+# Default number of specifications sent at once to a worker process
+DEFAULT_CHUNK_SIZE = 1000
+
+# Formats of the rows written by --decode (see Export.py)
+FORMAT_JSONL	= "jsonl"
+FORMAT_CSV		= "csv"
+
+OUTPUT_FORMATS = (FORMAT_JSONL, FORMAT_CSV)
+#//////////////////////////////////////////////////////////
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import mmap
+import struct
+from array import array
+from zlib import crc32
+from Bits import BitReader, BitWriter, DEFAULT_CAPACITY
+from Factory import Factory
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+#
+# A container is made of a file header, the records and a footer:
+#
+#   file header : magic "VMFC", format version (1 byte), 3 reserved
+#                 bytes.
+#   record      : length of the payload (4 bytes), CRC-32 of the
+#                 payload (4 bytes), payload (the encoded header).
+#   footer      : offset of each record from the start of the
+#                 container (8 bytes each), followed by the trailer.
+#   trailer     : offset of the footer (8 bytes), number of records
+#                 (4 bytes), magic "VMFI".
+#
+# All integers are big-endian. The footer lets readers locate any
+# record without reading the ones before it. Containers whose footer
+# is missing, e.g. when the writer was interrupted, are recovered by
+# scanning the records.
+CONTAINER_MAGIC		= "VMFC"
+CONTAINER_VERSION	= 1
+INDEX_MAGIC			= "VMFI"
+
+FILE_HEADER		= struct.Struct(">4sB3x")
+RECORD_HEADER	= struct.Struct(">II")
+INDEX_ENTRY		= struct.Struct(">Q")
+TRAILER			= struct.Struct(">QI4s")
+#//////////////////////////////////////////////////////////
+
+def _checksum(_data):
+	return crc32(_data) & 0xFFFFFFFF
+
+# =============================================================================
+# ContainerWriter Class
+#
+# Description:
+#   Appends encoded headers to a container. The offsets of the records
+#   are kept in an array and written as the footer when the writer is
+#   closed. The output file does not need to be seekable.
+#
+class ContainerWriter(object):
+
+	def __init__(self, _output):
+		"""
+			Starts a new container.
+
+			Args:
+				_output: File object opened for binary writing, or
+						path of the file to create.
+		"""
+		self.owned = isinstance(_output, basestring)
+		if (self.owned):
+			_output = open(_output, "wb")
+		self.output = _output
+		# Doubles hold offsets exactly where longs are 32-bit
+		self.offsets = array('L' if array('L').itemsize >= INDEX_ENTRY.size else 'd')
+		self.writer = BitWriter(DEFAULT_CAPACITY)
+		self.output.write(FILE_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION))
+		self.pos = FILE_HEADER.size
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, _type, _value, _traceback):
+		self.close()
+
+	def __len__(self):
+		return len(self.offsets)
+
+	def append(self, _data):
+		"""
+			Appends an encoded header given as a string of bytes.
+
+			Returns:
+				The number of the record.
+		"""
+		self.output.write(RECORD_HEADER.pack(len(_data), _checksum(_data)))
+		self.output.write(_data)
+		self.offsets.append(self.pos)
+		self.pos += RECORD_HEADER.size + len(_data)
+		return len(self.offsets) - 1
+
+	def append_message(self, _message):
+		"""
+			Encodes the header of a message and appends it.
+
+			Returns:
+				The number of the record.
+		"""
+		writer = self.writer
+		writer.reset()
+		_message.write_to(writer)
+		return self.append(writer.tobytes())
+
+	def close(self):
+		"""
+			Writes the footer. The output file is closed if it was
+			opened by the writer.
+		"""
+		if (self.output is None):
+			return
+		output = self.output
+		footer = self.pos
+		pack = INDEX_ENTRY.pack
+		for offset in self.offsets:
+			output.write(pack(int(offset)))
+		output.write(TRAILER.pack(footer, len(self.offsets), INDEX_MAGIC))
+		output.flush()
+		if (self.owned):
+			output.close()
+		self.output = None
+
+# =============================================================================
+# ContainerReader Class
+#
+# Description:
+#   Random access to the records of a memory-mapped container. Records
+#   are located through the footer, and their checksum is verified
+#   before they are decoded.
+#
+class ContainerReader(object):
+
+	def __init__(self, _filename, _factory=None):
+		"""
+			Opens a container.
+
+			Args:
+				_filename: Path of the container.
+				_factory: Factory used to decode the messages.
+		"""
+		self.filename = _filename
+		self.factory = _factory
+		if (self.factory is None):
+			self.factory = Factory()
+		self.file = open(_filename, "rb")
+		try:
+			self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			self.file.close()
+			raise Exception("'{:s}' is empty.".format(_filename))
+		if (len(self.map) < FILE_HEADER.size):
+			self.close()
+			raise Exception("'{:s}' is not a VMF container.".format(_filename))
+		(magic, version) = FILE_HEADER.unpack_from(self.map, 0)
+		if (magic != CONTAINER_MAGIC):
+			self.close()
+			raise Exception("'{:s}' is not a VMF container.".format(_filename))
+		if (version != CONTAINER_VERSION):
+			self.close()
+			raise Exception("Unsupported container version {:d}.".format(version))
+		self.recovered = False
+		self.index = self._read_footer()
+		if (self.index is None):
+			self.index = self._scan()
+			self.recovered = True
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, _type, _value, _traceback):
+		self.close()
+
+	def __len__(self):
+		return self.count
+
+	def close(self):
+		if (self.map is not None):
+			self.map.close()
+			self.map = None
+		self.file.close()
+
+	def _read_footer(self):
+		"""
+			Reads the location of the footer from the trailer.
+
+			Returns:
+				The offset of the footer, or None if the trailer is
+				missing or inconsistent.
+		"""
+		size = len(self.map)
+		if (size < FILE_HEADER.size + TRAILER.size):
+			return None
+		(footer, count, magic) = TRAILER.unpack_from(self.map, size - TRAILER.size)
+		if (magic != INDEX_MAGIC or
+			footer + count * INDEX_ENTRY.size + TRAILER.size != size):
+			return None
+		self.count = count
+		self.end = footer
+		return footer
+
+	def footer_checksum(self):
+		"""
+			Returns the CRC-32 of the footer, which changes with the
+			number and the sizes of the records. The offsets of the
+			records are used for containers without footer.
+		"""
+		if (self.recovered):
+			return _checksum(array('L' if array('L').itemsize >= INDEX_ENTRY.size else 'd',
+				self.index).tostring())
+		return _checksum(self.map[self.end:])
+
+	def _scan(self):
+		"""
+			Rebuilds the offsets of the records of a container
+			without footer. Scanning stops at the first truncated
+			record, or at the start of a footer whose trailer is
+			missing or inconsistent.
+
+			Returns:
+				An array of offsets.
+		"""
+		offsets = []
+		size = len(self.map)
+		offset = FILE_HEADER.size
+		while (offset + RECORD_HEADER.size <= size):
+			(length, crc) = RECORD_HEADER.unpack_from(self.map, offset)
+			# The first entry of a footer is the offset of the first
+			# record, which reads as an empty record with a wrong
+			# checksum.
+			if (length == 0 and crc == FILE_HEADER.size):
+				break
+			end = offset + RECORD_HEADER.size + length
+			if (end > size):
+				break
+			offsets.append(offset)
+			offset = end
+		self.count = len(offsets)
+		self.end = offset
+		return offsets
+
+	def offset(self, _n):
+		"""
+			Returns the offset of record _n.
+		"""
+		if (_n < 0):
+			_n += self.count
+		if (_n < 0 or _n >= self.count):
+			raise IndexError("Record {:d} does not exist.".format(_n))
+		if (self.recovered):
+			return self.index[_n]
+		(offset,) = INDEX_ENTRY.unpack_from(self.map, self.index + _n * INDEX_ENTRY.size)
+		return offset
+
+	def record(self, _n):
+		"""
+			Returns the payload of record _n.
+
+			Raises an exception if the record is corrupted.
+		"""
+		offset = self.offset(_n)
+		start = offset + RECORD_HEADER.size
+		if (start > self.end):
+			raise Exception("Record {:d} is corrupted.".format(_n))
+		(length, crc) = RECORD_HEADER.unpack_from(self.map, offset)
+		if (start + length > self.end):
+			raise Exception("Record {:d} is corrupted.".format(_n))
+		data = self.map[start:start+length]
+		if (_checksum(data) != crc):
+			raise Exception("Record {:d} is corrupted.".format(_n))
+		return data
+
+	def message(self, _n):
+		"""
+			Decodes the header of record _n.
+
+			Returns:
+				A Message object.
+		"""
+		return self.factory.read_message(BitReader(self.record(_n)))
+
+	def read_fields(self, _n, _codes):
+		"""
+			Decodes some fields of the header of record _n.
+
+			Returns:
+				A dictionary of the values of the fields.
+		"""
+		return self.factory.read_fields(BitReader(self.record(_n)), _codes)
+
+	def records(self, _start=0, _stop=None, _skip_corrupt=True):
+		"""
+			Iterates over a range of records.
+
+			Args:
+				_start: Number of the first record.
+				_stop: Number of the record following the range.
+						Defaults to the end of the container.
+				_skip_corrupt: Skip corrupted records instead of
+						raising an exception.
+
+			Returns:
+				A generator of (record number, payload) tuples.
+		"""
+		if (_stop is None or _stop > self.count):
+			_stop = self.count
+		for n in xrange(_start, _stop):
+			try:
+				data = self.record(n)
+			except Exception:
+				if (_skip_corrupt):
+					continue
+				raise
+			yield (n, data)
+
+	def messages(self, _start=0, _stop=None, _skip_corrupt=True):
+		"""
+			Decodes a range of records.
+
+			Returns:
+				A generator of (record number, Message) tuples.
+		"""
+		read_message = self.factory.read_message
+		for (n, data) in self.records(_start, _stop, _skip_corrupt):
+			yield (n, read_message(BitReader(data)))
+
+	def ranges(self, _count):
+		"""
+			Splits the records into contiguous ranges, e.g. to be
+			processed in parallel.
+
+			Args:
+				_count: Number of ranges.
+
+			Returns:
+				A list of (start, stop) tuples.
+		"""
+		size = max(1, -(-self.count // max(1, _count)))
+		return [(start, min(start + size, self.count))
+			for start in xrange(0, self.count, size)]
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import json
+from collections import OrderedDict
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+#
+# A schema file describes the groups and fields of a header as a JSON
+# object:
+#
+#   {
+#     "name": "std47001d_rev1",
+#     "versions": ["std47001d_change"],
+#     "enumerations": {"codes": {"alpha": 0, "bravo": 1}},
+#     "groups": {
+#       "header": {"name": "Application Header", "root": true},
+#       "g1": {"name": "Originator Address", "parent": "header", "index": 2},
+#       ...
+#     },
+#     "fields": {
+#       "vmfversion": {"name": "Version", "size": 4, "group": "header",
+#                      "index": 0, "enumeration": "version", "indicator": true},
+#       "originatordtg": {"name": "Originator DTG", "group": "g10",
+#                         "index": 10, "dtg": true},
+#       ...
+#     }
+#   }
+#
+# Enumerations are either defined by the file, as codewords and their
+# values, or refer to the enumerations of Fields.py by name. The header
+# is used by the versions listed, or by all the versions if "versions"
+# is omitted. The definition of the application header in this format
+# is written by "vmfcat --dump-schema".
+DEFAULT_DEFINITION_NAME = "schema"
+
+# Attributes of the groups of a schema file, and the matching
+# arguments of the Group constructor.
+GROUP_ATTRIBUTES = {
+	"name"			: "_name",
+	"index"			: "_index",
+	"parent"		: "_parent",
+	"root"			: "_isroot",
+	"repeatable"	: "_is_repeatable",
+	"max_repeat"	: "_max_repeat"
+}
+
+# Attributes of the fields, and the matching arguments of the Field
+# constructor.
+FIELD_ATTRIBUTES = {
+	"name"			: "_name",
+	"index"			: "_index",
+	"group"			: "_groupcode",
+	"size"			: "_size",
+	"repeatable"	: "_repeatable",
+	"max_repeat"	: "_max_repeat",
+	"indicator"		: "_indicator",
+	"string"		: "_string",
+	"enumeration"	: "_enumerator"
+}
+
+# Attributes of the date time group fields, and the matching arguments
+# of the dtg_field constructor.
+DTG_ATTRIBUTES = {
+	"name"			: "_name",
+	"index"			: "_index",
+	"group"			: "_groupcode",
+	"repeatable"	: "_repeatable",
+	"extension"		: "_extension"
+}
+#//////////////////////////////////////////////////////////
+
+def _native(_value):
+	"""
+		Converts the unicode strings read from JSON to strings.
+	"""
+	if (isinstance(_value, unicode)):
+		return _value.encode("ascii")
+	if (isinstance(_value, list)):
+		return [_native(v) for v in _value]
+	if (isinstance(_value, dict)):
+		return OrderedDict((_native(k), _native(v)) for (k, v) in _value.items())
+	return _value
+
+def _arguments(_kind, _code, _attributes, _names):
+	"""
+		Maps the attributes of a group or field to the arguments of
+		its constructor.
+	"""
+	args = {}
+	for (attribute, value) in _attributes.items():
+		name = _names.get(attribute)
+		if (name is None):
+			raise Exception("Unknown attribute '{:s}' of {:s} '{:s}'.".format(attribute, _kind, _code))
+		args[name] = value
+	return args
+
+# =============================================================================
+# HeaderDefinition Class
+#
+# Description:
+#   Definition of a header read from a schema file. The definition is
+#   used like the Header class: calling it builds a Header object with
+#   its elements, which is compiled into a layout by compile_header().
+#   The elements are only built when the layout is compiled, so that a
+#   cached layout can be used without them.
+#
+class HeaderDefinition(object):
+
+	def __init__(self, _data, _source=None):
+		"""
+			Args:
+				_data: dictionary read from a schema file.
+				_source: Text of the schema file, which identifies
+						the definition in the layout cache.
+		"""
+		self.data = _native(_data)
+		for key in self.data.keys():
+			if (key not in ("name", "versions", "enumerations", "groups", "fields")):
+				raise Exception("Unknown entry '{:s}' in schema.".format(key))
+		self.__name__ = self.data.get("name", DEFAULT_DEFINITION_NAME)
+		self.versions = self.data.get("versions")
+		self.source = _source
+
+	def __repr__(self):
+		return "<HeaderDefinition '{:s}'>".format(self.__name__)
+
+	def __call__(self):
+		"""
+			Builds a Header object with the elements of the
+			definition.
+		"""
+		from Message import Header
+		return Header(self.elements())
+
+	def enumerations(self):
+		"""
+			Returns the enumerators which can be used by the fields,
+			by name: the Enum classes of Fields.py and those defined
+			by the schema.
+		"""
+		from enum import Enum
+		from Fields import ENUM_TABLES
+		enums = dict((e.__name__, e) for e in ENUM_TABLES.keys())
+		for (name, members) in self.data.get("enumerations", {}).items():
+			enums[name] = Enum(name, list(members.items()))
+		return enums
+
+	def elements(self):
+		"""
+			Builds the Field and Group objects of the definition.
+
+			Returns:
+				A dictionary of the elements by code, as defined
+				in Header.elements.
+		"""
+		from Fields import Field, dtg_field
+		from Groups import Group
+		groups = self.data.get("groups", {})
+		fields = self.data.get("fields", {})
+		enums = None
+		elements = {}
+		for (code, attributes) in groups.items():
+			parent = attributes.get("parent")
+			if (parent is not None and parent not in groups):
+				raise Exception("Unknown parent group '{:s}' of group '{:s}'.".format(parent, code))
+			args = _arguments("group", code, attributes, GROUP_ATTRIBUTES)
+			args.setdefault("_name", code)
+			elements[code] = Group(**args)
+		for (code, attributes) in fields.items():
+			if (code in elements):
+				raise Exception("Code '{:s}' is used by a group and a field.".format(code))
+			attributes = dict(attributes)
+			group = attributes.get("group")
+			if (group not in groups):
+				raise Exception("Unknown group '{}' of field '{:s}'.".format(group, code))
+			attributes.setdefault("name", code)
+			if (attributes.pop("dtg", False)):
+				elements[code] = dtg_field(**_arguments("field", code, attributes, DTG_ATTRIBUTES))
+				continue
+			if ("size" not in attributes):
+				raise Exception("No size given for field '{:s}'.".format(code))
+			enum = attributes.get("enumeration")
+			if (enum is not None):
+				if (enums is None):
+					enums = self.enumerations()
+				if (enum not in enums):
+					raise Exception("Unknown enumeration '{:s}' of field '{:s}'.".format(enum, code))
+				attributes["enumeration"] = enums[enum]
+			elements[code] = Field(**_arguments("field", code, attributes, FIELD_ATTRIBUTES))
+		return elements
+
+def load_definition(_file):
+	"""
+		Loads a header definition from a schema file object or
+		path.
+
+		Returns:
+			A HeaderDefinition object.
+	"""
+	if (isinstance(_file, basestring)):
+		with open(_file, "r") as f:
+			source = f.read()
+	else:
+		source = _file.read()
+	return HeaderDefinition(json.loads(source, object_pairs_hook=OrderedDict), source)
+
+def definition_data(_definition=None):
+	"""
+		Describes a header definition in the format of schema files.
+		Groups and fields are listed in the order of the header.
+
+		Args:
+			_definition: Header class or HeaderDefinition object.
+					Defaults to the Header class.
+
+		Returns:
+			A dictionary which can be written as JSON.
+	"""
+	from Message import Header
+	from Schema import compile_header
+	from Fields import dtg_field
+	if (_definition is None):
+		_definition = Header
+	elements = _definition().elements
+	layout = compile_header(elements)
+	groups = OrderedDict()
+	for node in layout.groups:
+		group = elements[node.code]
+		attributes = OrderedDict([("name", group.name)])
+		if (group.is_root):
+			attributes["root"] = True
+		else:
+			attributes["parent"] = group.parent_group
+			attributes["index"] = group.index
+		if (group.is_repeatable):
+			attributes["repeatable"] = True
+			attributes["max_repeat"] = group.max_repeat
+		groups[node.code] = attributes
+	fields = OrderedDict()
+	for slot in layout.slots:
+		field = elements[slot.code]
+		attributes = OrderedDict([
+			("name", field.name),
+			("group", field.grp_code),
+			("index", field.index)])
+		if (isinstance(field, dtg_field)):
+			attributes["dtg"] = True
+			if (not field.has_extension):
+				attributes["extension"] = False
+		else:
+			attributes["size"] = field.size
+			if (field.is_indicator):
+				attributes["indicator"] = True
+			if (field.is_string):
+				attributes["string"] = True
+			if (field.enumerator):
+				attributes["enumeration"] = field.enumerator.__name__
+		if (field.is_repeatable):
+			attributes["repeatable"] = True
+			if (not isinstance(field, dtg_field)):
+				attributes["max_repeat"] = field.max_repeat
+		fields[slot.code] = attributes
+	return OrderedDict([
+		("name", _definition.__name__),
+		("groups", groups),
+		("fields", fields)])
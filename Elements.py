@@ -27,12 +27,6 @@
 __version_info__ = ('0','1','0')
 __version__ = '.'.join(__version_info__)
 
-#//////////////////////////////////////////////////////////
-# Imports Statements
-from enum import Enum
-from bitstring import BitArray
-#//////////////////////////////////////////////////////////
-
 #//////////////////////////////////////////////////////////
 # Global constants
 ABSENT  = 0x0
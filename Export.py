@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import csv
+import json
+from cStringIO import StringIO
+from Elements import CODE_GRP_RCPT_ADDR, CODE_GRP_INFO_ADDR, CODE_GRP_MSG_HAND, CODE_GRP_REF
+from Schema import Instances
+from Message import header_layouts
+from Batch import FRAMING_LENGTH
+from Query import filter_records
+from Constants import FORMAT_JSONL, FORMAT_CSV, OUTPUT_FORMATS
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+# Number of rows formatted before they are written to the output
+DEFAULT_BUFFER_ROWS = 4096
+# Separator of the values of repeated fields in CSV files
+CSV_LIST_SEPARATOR = ";"
+# Separator of the occurrences of a repeatable field within each
+# instance of its group in CSV files
+CSV_OCCURRENCE_SEPARATOR = ","
+
+# Table of the headers in SQLite exports
+SQL_MESSAGES_TABLE = "messages"
+# Table of the instances of the message handling group
+SQL_HANDLING_TABLE = "message_handling"
+# Tables of the repeatable groups in SQLite exports, one row per
+# instance of the group. The fields of a group nested in another one
+# are only columns of the table of the inner group.
+SQL_CHILD_TABLES = (
+	(CODE_GRP_RCPT_ADDR,	"recipients"),
+	(CODE_GRP_INFO_ADDR,	"info_addresses"),
+	(CODE_GRP_MSG_HAND,		SQL_HANDLING_TABLE),
+	(CODE_GRP_REF,			"message_references")
+)
+# Columns indexed once an export is loaded
+SQL_INDEXES = (
+	(SQL_MESSAGES_TABLE,	("fad", "msgnumber")),
+	(SQL_MESSAGES_TABLE,	("originator_urn",)),
+	(SQL_MESSAGES_TABLE,	("originatordtg",)),
+	("recipients",			("rcpt_urns",)),
+	("recipients",			("message_id",)),
+	("info_addresses",		("message_id",)),
+	(SQL_HANDLING_TABLE,	("fad", "msgnumber")),
+	(SQL_HANDLING_TABLE,	("message_id",)),
+	("message_references",	("message_id",)),
+)
+# Number of headers inserted per executemany() call
+SQL_BATCH_ROWS = 10000
+# Number of headers inserted per transaction
+SQL_TRANSACTION_ROWS = 200000
+# Largest integer stored as such; larger values are stored as text
+SQL_MAX_INT = (1 << 63) - 1
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# ProjectionWriter Class
+#
+# Description:
+#   Writes selected fields of decoded headers, one row per header.
+#   Rows are formatted into a buffer which is written to the output
+#   in large chunks. Enumerated values are written by name, as they
+#   are decoded. Fields contained in a repeatable group are written
+#   as a list of their values in each instance of the group, even if
+#   there is a single instance.
+#
+class ProjectionWriter(object):
+
+	def __init__(self, _output, _fields, _buffer_rows=DEFAULT_BUFFER_ROWS, _layout=None):
+		"""
+			Creates a new writer.
+
+			Args:
+				_output: File object receiving the rows.
+				_fields: Codes of the fields to write.
+				_buffer_rows: Number of rows kept before writing.
+				_layout: HeaderLayout of the headers. Defaults to
+						the LayoutRegistry of all the versions of
+						the header.
+		"""
+		self.layout = _layout
+		if (self.layout is None):
+			self.layout = header_layouts()
+		for code in _fields:
+			if (code not in self.layout.slot_index):
+				raise Exception("Unknown field '{:s}'.".format(code))
+		self.output = _output
+		self.fields = tuple(_fields)
+		self.slots = tuple(self.layout.slot_index[code].slot for code in self.fields)
+		self.grouped = tuple(self.layout.slot_index[code].context is not None for code in self.fields)
+		self.buffer_rows = _buffer_rows
+		self.rows = 0
+		self.pending = 0
+		self.buffer = StringIO()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, _type, _value, _traceback):
+		self.close()
+
+	def write(self, _values):
+		"""
+			Writes the fields of a header.
+
+			Args:
+				_values: List of slot values, or HeaderValues object.
+		"""
+		if (not isinstance(_values, list)):
+			_values = self.layout.values_of(_values)
+		row = [_values[slot] for slot in self.slots]
+		for (i, grouped) in enumerate(self.grouped):
+			# A single instance is decoded as the value itself
+			if (grouped and row[i] is not None and not isinstance(row[i], Instances)):
+				row[i] = [row[i]]
+		self.write_row(row)
+		self.rows += 1
+		self.pending += 1
+		if (self.pending >= self.buffer_rows):
+			self.flush()
+
+	def write_row(self, _row):
+		raise NotImplementedError
+
+	def flush(self):
+		"""
+			Writes the buffered rows to the output.
+		"""
+		if (self.pending):
+			self.output.write(self.buffer.getvalue())
+			self.buffer.seek(0)
+			self.buffer.truncate()
+			self.pending = 0
+
+	def close(self):
+		self.flush()
+		self.output.flush()
+
+# =============================================================================
+# JsonLinesWriter Class
+#
+# Description:
+#   Writes each header as a JSON object. Absent fields are null, and
+#   repeated fields and fields of repeatable groups are arrays.
+#
+class JsonLinesWriter(ProjectionWriter):
+
+	def __init__(self, _output, _fields, _buffer_rows=DEFAULT_BUFFER_ROWS, _layout=None):
+		super(JsonLinesWriter, self).__init__(_output, _fields, _buffer_rows, _layout)
+		self.encoder = json.JSONEncoder(separators=(',', ':'))
+
+	def write_row(self, _row):
+		encode = self.encoder.encode
+		buffer = self.buffer
+		buffer.write('{')
+		for (i, code) in enumerate(self.fields):
+			if (i):
+				buffer.write(',')
+			buffer.write(encode(code))
+			buffer.write(':')
+			buffer.write(encode(_row[i]))
+		buffer.write('}\n')
+
+# =============================================================================
+# CsvWriter Class
+#
+# Description:
+#   Writes each header as a CSV row, after a row of field codes. Absent
+#   fields are empty and the values of repeated fields and fields of
+#   repeatable groups are separated by CSV_LIST_SEPARATOR. Repeated
+#   fields within repeatable groups have their occurrences separated
+#   by CSV_OCCURRENCE_SEPARATOR.
+#
+class CsvWriter(ProjectionWriter):
+
+	def __init__(self, _output, _fields, _buffer_rows=DEFAULT_BUFFER_ROWS, _layout=None):
+		super(CsvWriter, self).__init__(_output, _fields, _buffer_rows, _layout)
+		self.writer = csv.writer(self.buffer)
+		self.writer.writerow(self.fields)
+		self.pending += 1
+
+	def write_row(self, _row):
+		cells = []
+		for value in _row:
+			if (value is None):
+				cells.append("")
+			elif (isinstance(value, list)):
+				cells.append(CSV_LIST_SEPARATOR.join(_csv_item(v) for v in value))
+			else:
+				cells.append(value)
+		self.writer.writerow(cells)
+
+def _csv_item(_value):
+	"""
+		Formats a value of a list written in a CSV cell.
+	"""
+	if (_value is None):
+		return ""
+	if (isinstance(_value, list)):
+		return CSV_OCCURRENCE_SEPARATOR.join("" if v is None else str(v) for v in _value)
+	return str(_value)
+
+PROJECTION_WRITERS = {
+	FORMAT_JSONL	: JsonLinesWriter,
+	FORMAT_CSV		: CsvWriter
+}
+
+def project_capture(_filename, _output, _fields=None, _format=FORMAT_JSONL,
+	_framing=FRAMING_LENGTH, _where=None):
+	"""
+		Writes selected fields of the headers of a capture or
+		container matching a filter. Only the fields needed are
+		decoded.
+
+		Args:
+			_filename: Path of the capture or container.
+			_output: File object receiving the rows.
+			_fields: Codes of the fields to write. Defaults to all
+					the fields of all the versions of the header.
+			_format: One of OUTPUT_FORMATS.
+			_framing: Framing of the capture.
+			_where: Where object, or None to write all the headers.
+
+		Returns:
+			The number of headers written.
+	"""
+	if (_format not in PROJECTION_WRITERS):
+		raise Exception("Unknown output format '{:s}'.".format(_format))
+	if (_fields is None):
+		_fields = [slot.code for slot in header_layouts().slots]
+	with PROJECTION_WRITERS[_format](_output, _fields) as writer:
+		for (data, values) in filter_records(_filename, _framing, _where, _fields):
+			writer.write(values)
+		return writer.rows
+
+def _sql_value(_value):
+	"""
+		Converts a decoded value to a value which SQLite can store.
+	"""
+	if (isinstance(_value, (int, long)) and _value > SQL_MAX_INT):
+		return str(_value)
+	if (isinstance(_value, list)):
+		return CSV_LIST_SEPARATOR.join("" if v is None else str(v) for v in _value)
+	return _value
+
+def _instances(_values, _slots):
+	"""
+		Returns the number of instances of a group in which one of
+		the given fields is set. The instances of a group nested in
+		a repeatable group are counted across all the instances of
+		the outer group.
+	"""
+	n = 0
+	for slot in _slots:
+		value = _values[slot.slot]
+		if (isinstance(value, Instances)):
+			n = max(n, len(value))
+		elif (value is not None):
+			n = max(n, 1)
+	return n
+
+# =============================================================================
+# SqliteExporter Class
+#
+# Description:
+#   Loads decoded headers into a SQLite database. Each header is a row
+#   of the messages table, with a column per field. Every instance of
+#   the recipient, information address, message handling and reference
+#   groups is a row of a child table referring to the message, numbered
+#   by its position. The messages table also holds the first instance
+#   of the message handling group, so that the messages can be queried
+#   and read by --from-sqlite without joins.
+#
+#   Rows are accumulated and inserted with executemany() in large
+#   transactions, and the indexes are created once all the rows are
+#   loaded.
+#
+class SqliteExporter(object):
+
+	def __init__(self, _database, _layout=None):
+		"""
+			Opens or creates a database. Headers are appended to the
+			tables of an existing export.
+
+			Args:
+				_database: Path of the database.
+				_layout: HeaderLayout of the headers. Defaults to
+						the LayoutRegistry of all the versions of
+						the header, whose fields are all columns.
+		"""
+		self.layout = _layout
+		if (self.layout is None):
+			self.layout = header_layouts()
+		layout = self.layout
+		import sqlite3
+		self.connection = sqlite3.connect(_database)
+
+		# Slots of each table. Fields are stored in the table of the
+		# innermost group containing them.
+		groups = [(table, layout.group_index[code]) for (code, table) in SQL_CHILD_TABLES]
+		owners = {}
+		for (table, group) in sorted(groups, key=lambda item: -len(item[1].slots)):
+			for s in group.slots:
+				owners[s] = table
+		self.children = tuple((table, group, tuple(layout.slots[s] for s in group.slots if owners[s] == table))
+			for (table, group) in groups)
+		self.columns = tuple(slot for slot in layout.slots
+			if owners.get(slot.slot, SQL_HANDLING_TABLE) == SQL_HANDLING_TABLE)
+
+		self._create_table(SQL_MESSAGES_TABLE, ["id INTEGER PRIMARY KEY"], self.columns)
+		for (table, group, slots) in self.children:
+			self._create_table(table, ["message_id INTEGER NOT NULL", "position INTEGER NOT NULL"], slots)
+		self.insert_message = self._insert_statement(SQL_MESSAGES_TABLE, ["id"], self.columns)
+		self.insert_child = dict((table, self._insert_statement(table, ["message_id", "position"], slots))
+			for (table, group, slots) in self.children)
+
+		(last,) = self.connection.execute("SELECT MAX(id) FROM {:s}".format(SQL_MESSAGES_TABLE)).fetchone()
+		self.next_id = (last or 0) + 1
+		self.rows = 0
+		self.messages = []
+		self.child_rows = dict((table, []) for (table, group, slots) in self.children)
+		self.uncommitted = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, _type, _value, _traceback):
+		if (_type is None):
+			self.close()
+		else:
+			self.connection.close()
+
+	def _create_table(self, _table, _keys, _slots):
+		columns = list(_keys)
+		for slot in _slots:
+			columns.append('"{:s}"'.format(slot.code))
+		self.connection.execute("CREATE TABLE IF NOT EXISTS {:s} ({:s})".format(_table, ", ".join(columns)))
+
+	def _insert_statement(self, _table, _keys, _slots):
+		count = len(_keys) + len(_slots)
+		return "INSERT INTO {:s} VALUES ({:s})".format(_table, ", ".join(["?"] * count))
+
+	def write(self, _values):
+		"""
+			Adds a decoded header to the export.
+
+			Args:
+				_values: List of slot values, or HeaderValues object.
+		"""
+		if (not isinstance(_values, list)):
+			_values = self.layout.values_of(_values)
+		value_at = self.layout.value_at
+		id = self.next_id
+		self.next_id += 1
+		self.messages.append([id] + [_sql_value(value_at(_values, slot, 0)) for slot in self.columns])
+		for (table, group, slots) in self.children:
+			rows = self.child_rows[table]
+			for position in range(_instances(_values, slots)):
+				rows.append([id, position] + [_sql_value(value_at(_values, slot, position)) for slot in slots])
+		self.rows += 1
+		if (len(self.messages) >= SQL_BATCH_ROWS):
+			self.flush()
+
+	def flush(self):
+		"""
+			Inserts the pending rows. The transaction is committed
+			once enough rows were inserted.
+		"""
+		connection = self.connection
+		if (self.messages):
+			connection.executemany(self.insert_message, self.messages)
+			self.uncommitted += len(self.messages)
+			self.messages = []
+		for (table, rows) in self.child_rows.items():
+			if (rows):
+				connection.executemany(self.insert_child[table], rows)
+				self.child_rows[table] = []
+		if (self.uncommitted >= SQL_TRANSACTION_ROWS):
+			connection.commit()
+			self.uncommitted = 0
+
+	def create_indexes(self):
+		"""
+			Creates the indexes of the tables.
+		"""
+		for (table, columns) in SQL_INDEXES:
+			name = "{:s}_{:s}".format(table, "_".join(columns))
+			self.connection.execute('CREATE INDEX IF NOT EXISTS {:s} ON {:s} ({:s})'.format(
+				name, table, ", ".join('"{:s}"'.format(c) for c in columns)))
+
+	def close(self):
+		"""
+			Inserts the pending rows, creates the indexes and closes
+			the database.
+		"""
+		self.flush()
+		self.connection.commit()
+		self.create_indexes()
+		self.connection.commit()
+		self.connection.close()
+
+def export_sqlite(_filename, _database, _framing=FRAMING_LENGTH, _where=None):
+	"""
+		Loads the headers of a capture or container matching a
+		filter into a SQLite database.
+
+		Returns:
+			The number of headers exported.
+	"""
+	codes = [slot.code for slot in header_layouts().slots]
+	with SqliteExporter(_database) as exporter:
+		for (data, values) in filter_records(_filename, _framing, _where, codes):
+			exporter.write(values)
+		return exporter.rows
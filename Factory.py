@@ -30,11 +30,10 @@ __version__ = '.'.join(__version_info__)
 #//////////////////////////////////////////////////////////
 # Imports Statements
 import sys
-from Fields import *
-from Groups import *
+from Elements import *
 from Message import *
 from Logger import Logger
-from bitstring import *
+from Bits import BitReader
 #//////////////////////////////////////////////////////////
 
 # =============================================================================
@@ -52,6 +51,14 @@ class Factory(object):
 		CODE_GRP_ORIGIN_ADDR
 	]
 
+	# Command line parameters named differently than the fields
+	# of the header.
+	param_fields = {
+		"rc"		: "rccode",
+		"autha-len"	: "autha_len",
+		"authb-len"	: "authb_len"
+	}
+
 	def __init__(self, _logger = None):
 		self.logger = _logger
 		if (self.logger == None):
@@ -76,114 +83,78 @@ class Factory(object):
 			Returns:
 				A message object containing fields and groups
 		"""	
-		new_message = Message()
-	
-		# Iterate thru the parameters provided by the user to
-		# create the message object.
-		for field_name, field_value in _args.__dict__.items():
-			# Validate the field given
-			if (field_value != None and field_name in new_message.header.elements.keys()):
-				# Get the field to create, and create a copy
-				# from the dictionary.
-				vmf_field_name = new_message.header.elements[field_name].name
-				vmf_field_group = new_message.header.elements[field_name].grp_code
-				new_field = new_message.header.elements[field_name]
-				# Set the FPI/GPI of the field/group
-				new_field.enable_and_set(field_value)
-				new_message.header.elements[vmf_field_name] = new_field
-				# Add the field to group
-				vmf_group = new_message.header.elements[vmf_field_group]
-				vmf_group.append_field(new_field)
-				
-		# Structure the fields and groups
-		for (code, group) in new_message.header.groups().iteritems():
-			parent_group = group.parent_group
-			if (not parent_group is None):
-				new_message.header.elements[parent_group].fields.append(group)
-				
-		# Sort the fields and groups according to index
-		new_message.header.sort()
+		if (not isinstance(_args, dict)):
+			_args = _args.__dict__
+		# The layout follows the version of the message
+		new_message = Message(_layout=header_layout(_args.get(CODE_FLD_VERSION)))
+		# Set the values of the fields provided by the user. Group
+		# presence and ordering are given by the compiled layout.
+		new_message.values.update(_args)
+		slot_index = new_message.layout.slot_index
+		for (param, code) in Factory.param_fields.iteritems():
+			value = _args.get(param)
+			if (value is not None and code in slot_index):
+				new_message.values[code] = value
 		return new_message
 
 	def read_message(self, _bitstream):
+		"""
+			Decodes a VMF message.
+
+			The header is decoded by walking the compiled layout
+			of its version, selected by the first 4 bits, reading
+			the GPI/GRI/FPI/FRI indicators and values from a
+			BitReader.
+
+			Args:
+				_bitstream: BitReader, BitStream or string of bytes
+						containing the message. BitStream objects
+						are read from their current position, which
+						is moved past the header.
+
+			Returns:
+				A message object containing the decoded fields, or
+				None if no bitstream is provided.
+		"""
 		#Check if bitstring is valid
-		if (_bitstream != None):
-			#Creates a new VMF message object
-			new_message = Message()
+		if (_bitstream == None):
+			return None
+		reader = _bitstream
+		if (isinstance(_bitstream, (str, bytearray, memoryview))):
+			reader = BitReader(_bitstream)
+		# Populate the fields based on the bitstream received, using
+		# the layout of the version of the header.
+		values = header_layouts().decode(reader)
+		new_message = Message(_logger=self.logger, _layout=values.layout)
+		new_message.values = values
+		if (self.logger.debug):
+			for (code, value) in new_message.values.items():
+				self.logger.print_debug("Processing field '{:s}': value={}".format(code, value))
+		return new_message
 
-			# Iterate thru the parameters provided by the user to
-			# create the message object with default values.
-			for (field_name, field_obj) in new_message.header.fields().iteritems():
-				vmf_field_group = field_obj.grp_code
-				vmf_group_obj = new_message.header.elements[vmf_field_group]
-				vmf_group_obj.append_field(field_obj)	
-				
-			# Structure the fields and groups
-			for (code, group) in new_message.header.groups().iteritems():
-				parent_group = group.parent_group
-				if (not parent_group is None):
-					new_message.header.elements[parent_group].fields.append(group)
+	def read_fields(self, _bitstream, _codes):
+		"""
+			Decodes only some fields of a VMF message.
 
-			new_message.header.sort()
-			root_grp = new_message.header.elements[CODE_GRP_HEADER]
-			self.logger.print_debug("Creating message from stream:\n{:s}".format(_bitstream.hex))
-			# Populate the fields based on the bitstream received.
-			self.read_message3(root_grp, _bitstream)
-			self.read_message_rec(root_grp, _bitstream)
+			Only the part of the header preceding the requested
+			fields is read. The values of the other fields are
+			skipped, so filters needing a few fields of many
+			messages avoid a full decode.
 
-	def read_message_rec(self, _element, _bitstream):
-		#TODO: Manage repeatable fields
-		if (isinstance(_element, Field)):
-			# If field has a FPI bit indicator, read
-			# the next bit as the FPI
-			if (not _element.is_indicator):
-				_element.pi = _bitstream.read('uint:1')
-				# If the field is repeatable and is present
-				# read the next bit as the FRI
-				if (_element.is_present()):
-					if (_element.is_repeatable):
-						_element.ri = _bitstream.read('uint:1')
-					# Finally, read the value
-					_element.value = _bitstream.read(_element.size)
-					while (_element.ri):
-						_element.ri = _bitstream.read('uint:1')
-						#TODO: Manage multiple values
-						
-			# If this field has not FPI/FRI, e.g. flags, version,
-			# simply read the value.
-			else:
-				if _element.is_string:
-					str = ""
-					count = 0
-					char = ''
-					while (count <= 448 and char != TERMINATOR):
-						char = chr(_bitstring.read('uint:7'))
-						count += 7
-						if (char != TERMINATOR):
-							str += char
-					_element.value = str
-				else:
-					_element.value = _bitstream.read('uint:{:d}'.format(_element.size))
+			Args:
+				_bitstream: BitReader, BitStream or string of bytes
+						containing the message.
+				_codes: List of the codes of the fields to decode,
+						e.g. ["fad", "msgnumber"].
 
-			self.logger.print_debug("Processing field '{:s}': FPI={:d}, FRI={:d}, value={}".format(
-				_element.name, _element.pi, _element.ri, _element.value))
-		# If the element is a group, only consider the GPI/GRI and
-		# if present, start processing all contained fields and subgroups.
-		elif (isinstance(_element, Group)):
-			self.logger.print_debug("Processing group '{:s}'...".format(_element.name))
-			if (not _element.is_root):
-				# Read the GPI
-				_element.pi = _bitstream.read('uint:1')
-				# If the field is repeatable and is present
-				# read the next bit as the GRI
-				if (_element.pi == PRESENT and 
-					_element.is_repeatable):
-					_element.ri = _bitstream.read('uint:1')
-			# For all fields/groups in the header or if the current group
-			# is present, process all sub elements
-			if (_element.is_root or
-				_element.pi == PRESENT):
-				for sub_elem in _element.fields:
-					self.read_message3(sub_elem, _bitstream)			
-		else:
-			raise Exception("Unknown/Unsupported object type: {:s}".format(type(_element)))
+			Returns:
+				A dictionary containing the value of each requested
+				field, or None if the field is absent. None is
+				returned if no bitstream is provided.
+		"""
+		if (_bitstream == None):
+			return None
+		reader = _bitstream
+		if (isinstance(_bitstream, (str, bytearray, memoryview))):
+			reader = BitReader(_bitstream)
+		return header_layouts().read_fields(reader, _codes)
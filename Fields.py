@@ -31,33 +31,21 @@ __version__ = '.'.join(__version_info__)
 # Imports Statements
 
 import sys
-import imp
 try:
-	imp.find_module('enum')
 	from enum import Enum
 except ImportError:
 	print("[-] Could not load the 'Enum' module. Use `pip install Enum` to install it.")
 	sys.exit(1)
 
-try:
-	imp.find_module('bitstring')
-	from bitstring import BitArray
-except ImportError:
-	print("[-] Could not load the 'bitstring' module. Use `pip install bitstring` to install it.")
-	sys.exit(1)
-
 from Elements import *
-from datetime import datetime
+from Bits import BitWriter, DEFAULT_CAPACITY
+from Codecs import TERMINATOR, NO_STATEMENT, string_codec, dtg_codec, EnumTable
 #//////////////////////////////////////////////////////////
 
 #//////////////////////////////////////////////////////////
 # Global Variables
 
 ENABLE_FUTURE_GRP = 0
-# Terminator character for strings in VMF messages
-TERMINATOR 	= 0x7F
-# Value used when seconds are not specified in date time groups
-NO_STATEMENT	= 63
 #//////////////////////////////////////////////////////////
 
 
@@ -220,6 +208,49 @@ class cantpro_reasons(Enum):
     fail_signed_ack = 0x1F
     no_retrans = 0x20
 
+# Codewords accepted by the command line which differ from
+# the names of the enumerators.
+ENUM_ALIASES = {
+    umf : {
+        "xml-mtf"   : umf.xml_mtf,
+        "xml-vmf"   : umf.xml_vmf },
+    operation : {
+        "op"        : operation.operation,
+        "ex"        : operation.exercise,
+        "sim"       : operation.simulation },
+    precedence : {
+        "reserved"  : precedence.reserved1,
+        "flashover" : precedence.flash_override,
+        "imm"       : precedence.immediate,
+        "pri"       : precedence.priority },
+    classification : {
+        "unclass"   : classification.unclassified,
+        "conf"      : classification.confidential,
+        "topsecret" : classification.top_secret },
+    rc_codes : {
+        "mr"        : rc_codes.machine_receipt,
+        "undef"     : rc_codes.undefined0 },
+    cantco_reasons : {
+        "comm"      : cantco_reasons.comms,
+        "tac"       : cantco_reasons.tactical }
+}
+
+ENUM_TABLES = dict((e, EnumTable.from_enum(e, ENUM_ALIASES.get(e, {}))) for e in [
+    version, data_compression, umf, operation, precedence,
+    classification, rc_codes, fad_codes, cantco_reasons,
+    cantpro_reasons])
+
+def enum_table(_enumerator):
+    """
+        Returns the EnumTable of an enumerator. The tables of the
+        enumerators defined elsewhere, e.g. by schema files, are
+        built on first use.
+    """
+    table = ENUM_TABLES.get(_enumerator)
+    if (table is None):
+        table = ENUM_TABLES[_enumerator] = EnumTable.from_enum(_enumerator)
+    return table
+
 
 # =============================================================================
 # Parameter information
@@ -409,72 +440,59 @@ class Field(HeaderElement):
 			self.value = _value
 
 	def get_value_from_dict(self, _key, _dict):
-		for key, value in _dict.__dict__.items():
-			if (key.lower() == _key.lower()):
-				return value
-		return None		
+		return enum_table(_dict).value_of(_key)
 		
 	def get_bit_array(self):
-		b = BitArray()
+		w = BitWriter(DEFAULT_CAPACITY)
+		self.write_to(w)
+		return w.bitarray()
+
+	def write_to(self, _writer):
+		"""
+			Writes the bits of the field to a BitWriter shared
+			by all the elements of the header.
+		"""
+		w = _writer
 		# Some fields do no have a FPI field assigned to them.
 		# Therefore, these fields must only contain bits representing
 		# their value.
 		if (self.is_indicator):
 			field_value = self.value
-			#TODO: Replace string with constant/field variable
-			if (self.name == "Version" and self.enumerator):
+			if (self.enumerator):
 				field_value = self.get_value_from_dict(self.value, self.enumerator)
-				b.append(self.format_str.format(field_value))
-			else: 
-				field_value = int(self.value)
-				b.append("{:#03b}".format(field_value))
-			return b
+			w.write(int(field_value), self.size)
+			return
 		else:
 			# Include the FPI
-			b.append("{:#03b}".format(self.pi))
+			w.write_bit(self.pi)
 
 			# If the fiels is flagged as present, then
 			# append additional data.
 			if (self.pi == PRESENT):
-				if (not self.is_string):
-					field_value = int(self.value)
-				else:
-					field_value = self.value
+				field_value = self.value
 
 				# If the field is provided with an enumerator,get the
 				# numeric value.
 				if (self.enumerator):
 					field_value = self.get_value_from_dict(self.value, self.enumerator)
-				
+				elif (not self.is_string):
+					field_value = int(self.value)
 
 				# If the value is numeric, convert directly to a bitstring
-				if (isinstance(field_value, int)):
+				if (isinstance(field_value, (int, long))):
 					# Include the FRI is the field is repeatable
 					if (self.is_repeatable):
-						b.append("{:#03b}".format(self.fri))
-				#	if (self.pi == PRESENT or self.is_indicator):
-					b.append(self.format_str.format(field_value))
-				elif (isinstance(field_value, str) or isinstance(field_value, unicode)):
-					sb = self.string_to_bitarray(field_value)
-					b.append(sb)
+						w.write_bit(self.ri)
+					w.write(field_value, self.size)
+				elif (isinstance(field_value, basestring)):
+					string_codec(self.size).write(field_value, w)
 				else:
 					raise Exception("Unsupported type for field {:s}: {:s}".format(self.name, type(field_value)))
-			return b
 
 	def string_to_bitarray(self, _string, _maxsize=448):
-		b = BitArray()
-		pos = 0
-		if (_string):
-			for c in _string:
-				c_str = "{:#09b}".format(ord(c))
-				print("{:s}:{:s}".format(c, c_str))
-				b.insert(c_str, pos)
-				pos += 7
-		if (len(b.bin) < _maxsize):
-			b.insert("{:#09b}".format(TERMINATOR), pos)
-		if (len(b.bin) > _maxsize):
-			raise Exception("Size of bit array exceeds the maximum size allowed ({:d}).".format(_maxsize))
-		return b
+		from bitstring import BitArray
+		(value, size) = string_codec(_maxsize).pack(_string or "")
+		return BitArray(uint=value, length=size)
 
 
 # =============================================================================
@@ -486,7 +504,7 @@ class dtg_field(Field):
     has_extension = False
         
     def __init__(self, _name, _size=46, _value=0, _groupcode = 0, _repeatable=False, _extension=True, _index=0):
-        super(dtg_field, self).__init__(_name, _size, _value, _groupcode, _repeatable, _index)
+        super(dtg_field, self).__init__(_name, _size, _value, _groupcode, _repeatable, _index=_index)
         self.has_extension=_extension
         self.fields = {
             "year"  : Field(
@@ -525,68 +543,48 @@ class dtg_field(Field):
                     _size=12,
                     _index=6)
         }
+        self.ordered_fields = sorted(self.fields.values(), key=lambda f: f.index)
         self.enable_and_set(_value)
 
     def enable_and_set(self, _value):
         #Expected format: YYYY-MM-DD HH:mm[:ss] [extension]"
-	if (_value == None):
-		return 
+        if (_value == None):
+            return
 
         self.value = _value
         if (_value):
             self.pi = PRESENT
-            date_items = _value.split(' ')
-
-            if (len(date_items) == 2 or len(date_items) == 3):
-                format_str = "%Y-%m-%d %H:%M"
-                #
-                # Check if seconds are included.
-                #
-                secondsIncluded = False
-                if (date_items[1].count(":") > 1):
-                    format_str = "%Y-%m-%d %H:%M:%S"
-                    secondsIncluded = True
-                else:
-                    self.fields["second"].enable_and_set(NO_STATEMENT)
-                #TODO: the year should only contain the last 2 digits, not the entire
-                date_obj = datetime.strptime(date_items[0] + ' ' + date_items[1], format_str)
-		century = int(date_obj.year / 100)
-		year = date_obj.year % 100
-			
-                # 4 digits.
-                self.fields["year"].enable_and_set(year)
-                self.fields["month"].enable_and_set(date_obj.month)
-                self.fields["day"].enable_and_set(date_obj.day)
-                self.fields["hour"].enable_and_set(date_obj.hour)
-                self.fields["minute"].enable_and_set(date_obj.minute)
-                if (secondsIncluded):
-                    self.fields["second"].enable_and_set(date_obj.second)
-                #               
-                # Check if extension has been included
-                #
-                if (len(date_items) == 3):
-                    self.fields["ext"].enable_and_set(date_items[2])
-                print(self)
-            else:
-                raise Exception("Unknown datetime group format: {:s}.".format(_value))
+            (year, month, day, hour, minute, second, ext) = dtg_codec(self.has_extension).parse(_value)
+            # Only the last 2 digits of the year are kept.
+            self.fields["year"].enable_and_set(year % 100)
+            self.fields["month"].enable_and_set(month)
+            self.fields["day"].enable_and_set(day)
+            self.fields["hour"].enable_and_set(hour)
+            self.fields["minute"].enable_and_set(minute)
+            self.fields["second"].enable_and_set(second)
+            #
+            # Check if extension has been included
+            #
+            if (ext is not None):
+                self.fields["ext"].enable_and_set(ext)
 
         #else:
         #   raise Exception("Datetime group provided is null or empty.")
-        
-    def get_bit_array(self):
-        b = BitArray()
-        dtgfields = self.fields.values()
-        #self.fields.sort()
-        dtgfields.sort()
-        for f in dtgfields:
-            if (f.name == "ext"):
+
+    def write_to(self, _writer):
+        # Like other fields, a DTG starts with its FPI
+        _writer.write_bit(self.pi)
+        if (self.pi == ABSENT):
+            return
+        if (self.value):
+            dtg_codec(self.has_extension).write(self.value, _writer)
+            return
+        for f in self.ordered_fields:
+            if (f.name == "extension"):
                 if (self.has_extension):
-                    fbits = f.get_bit_array()
-                    b.append(fbits)
+                    f.write_to(_writer)
             else:
-                fbits = f.get_bit_array()
-                b.append(fbits)
-        return b
+                f.write_to(_writer)
 
     def __repr__(self):
         return "<Datetime Group Field: {:d}:{:s}:{:s}>".format(self.index, self.name, str(self.value))
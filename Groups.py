@@ -30,22 +30,14 @@ __version__ = '.'.join(__version_info__)
 #//////////////////////////////////////////////////////////
 # Imports Statements
 import sys
-import imp
 try:
-	imp.find_module('enum')
 	from enum import Enum
 except ImportError:
 	print("[-] Could not load the 'Enum' module. Use `pip install Enum` to install it.")
 	sys.exit(1)
 
-try:
-	imp.find_module('bitstring')
-	from bitstring import BitArray
-except ImportError:
-	print("[-] Could not load the 'bitstring' module. Use `pip install bitstring` to install it.")
-	sys.exit(1)
-
 from Elements import *
+from Bits import BitWriter, DEFAULT_CAPACITY
 from Fields import Field
 #//////////////////////////////////////////////////////////
 
@@ -101,28 +93,36 @@ class Group(HeaderElement):
 
 		
     def get_bit_array(self):
-		b = BitArray()
+		w = BitWriter(DEFAULT_CAPACITY)
+		self.write_to(w)
+		return w.bitarray()
+
+    def write_to(self, _writer):
+		"""
+			Writes the group and all its fields to a BitWriter.
+			The same writer is passed to every sub element, so
+			each bit is only written once.
+		"""
+		w = _writer
 		# Do not include a GPI/GRI for the root group,
 		# which is only a container.
 		if (not self.is_root):
 			# Includes the GPI
-			b.append("{:#03b}".format(self.pi))
+			w.write_bit(self.pi)
 		
 			# If this group is absent, no more bits
 			# are needed
 			if (self.pi == ABSENT):
-				return b
+				return
 
 			# If this is a repeatable field, include
 			# the current value of the GRI
 			if (self.is_repeatable):
-				b.append("{:#03b}".format(self.ri))
+				w.write_bit(self.ri)
 
-		# Append all the sub bitstrings of each
-		# field contained in the group
+		# Write the bits of each field contained
+		# in the group
 		for f in self.fields:
-			fbits = f.get_bit_array()
-			b.append(fbits)
-		return b
+			f.write_to(w)
 
 
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import mmap
+import struct
+from array import array
+from Schema import KIND_INT, KIND_ENUM, KIND_DTG
+from Message import header_layouts
+from Container import ContainerReader
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+#
+# An index file holds one sorted table per indexed field:
+#
+#   file header : magic "VMFX", format version (1 byte), number of
+#                 tables (1 byte), 2 reserved bytes, size of the
+#                 container (8 bytes), number of records (4 bytes),
+#                 modification time of the container (8-byte double),
+#                 CRC-32 of the footer of the container (4 bytes).
+#   table       : length of the field code (1 byte), field code,
+#                 number of entries (4 bytes), entries.
+#   entry       : key (8 bytes), record number (4 bytes).
+#
+# Entries are sorted by key, then by record number. Enumerated fields
+# are keyed by their value and DTGs by DtgCodec.sort_key(). Repeated
+# fields have one entry per distinct value of each record. An index
+# is stale once its container is rewritten or modified.
+INDEX_MAGIC		= "VMFX"
+INDEX_VERSION	= 2
+INDEX_SUFFIX	= ".idx"
+
+INDEX_HEADER	= struct.Struct(">4sBB2xQIdI")
+TABLE_HEADER	= struct.Struct(">B")
+TABLE_COUNT		= struct.Struct(">I")
+ENTRY			= struct.Struct(">QI")
+
+# Fields indexed by default
+INDEX_FIELDS = ("fad", "msgnumber", "originator_urn", "rcpt_urns", "originatordtg")
+#//////////////////////////////////////////////////////////
+
+def index_key(_slot, _value, _upper=False):
+	"""
+		Converts the value of a field to the key of an index.
+	"""
+	kind = _slot.kind
+	if (kind == KIND_ENUM):
+		key = _slot.enum.value_of(_value)
+		if (key is None):
+			raise Exception("Unknown value '{}' for field '{:s}'.".format(_value, _slot.code))
+		return key
+	if (kind == KIND_DTG):
+		return _slot.codec.sort_key(_value, _upper)
+	if (kind == KIND_INT):
+		return int(_value)
+	raise Exception("Field '{:s}' cannot be indexed.".format(_slot.code))
+
+def index_filename(_container):
+	"""
+		Returns the path of the index of a container.
+	"""
+	return _container + INDEX_SUFFIX
+
+def build_index(_container, _fields=INDEX_FIELDS, _filename=None):
+	"""
+		Indexes the records of a container. Each header is decoded
+		once, and only up to the last indexed field.
+
+		Args:
+			_container: Path of the container.
+			_fields: Codes of the fields to index.
+			_filename: Path of the index. Defaults to the path of
+					the container followed by INDEX_SUFFIX.
+
+		Returns:
+			The number of records indexed.
+	"""
+	# Fields added by the definitions of some versions can be
+	# indexed as well.
+	layout = header_layouts()
+	fields = tuple(_fields)
+	slots = []
+	for code in fields:
+		if (code not in layout.slot_index):
+			raise Exception("Unknown field '{:s}'.".format(code))
+		slots.append(layout.slot_index[code])
+		# Reject fields which cannot be indexed before reading
+		if (slots[-1].kind not in (KIND_INT, KIND_ENUM, KIND_DTG)):
+			raise Exception("Field '{:s}' cannot be indexed.".format(code))
+	if (_filename is None):
+		_filename = index_filename(_container)
+
+	# Keys and record numbers of each table. Doubles hold the keys
+	# exactly where longs are 32-bit.
+	typecode = 'L' if array('L').itemsize >= 8 else 'd'
+	keys = [array(typecode) for code in fields]
+	records = [array('I') for code in fields]
+	with ContainerReader(_container) as container:
+		stat = os.stat(_container)
+		checksum = container.footer_checksum()
+		count = len(container)
+		for (n, data) in container.records():
+			values = container.factory.read_fields(data, fields)
+			for (i, slot) in enumerate(slots):
+				value = values[slot.code]
+				if (value is None):
+					continue
+				if (isinstance(value, list)):
+					items = set(index_key(slot, v) for v in value if v is not None)
+				else:
+					items = (index_key(slot, value),)
+				for key in items:
+					keys[i].append(key)
+					records[i].append(n)
+
+	temp = _filename + ".tmp"
+	with open(temp, "wb") as f:
+		f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(fields),
+			stat.st_size, count, stat.st_mtime, checksum))
+		for (i, code) in enumerate(fields):
+			f.write(TABLE_HEADER.pack(len(code)))
+			f.write(code)
+			# Entries are sorted as single integers made of the key
+			# followed by the record number.
+			entries = sorted((int(key) << 32) | n for (key, n) in zip(keys[i], records[i]))
+			f.write(TABLE_COUNT.pack(len(entries)))
+			pack = ENTRY.pack
+			f.write(''.join(pack(e >> 32, e & 0xFFFFFFFF) for e in entries))
+			# Release the entries of the table once written
+			keys[i] = records[i] = None
+	os.rename(temp, _filename)
+	return count
+
+# =============================================================================
+# ArchiveIndex Class
+#
+# Description:
+#   Answers equality and range queries over the indexes of a
+#   container. Tables are memory-mapped and searched by bisection, and
+#   matching records are read from the container by number.
+#
+class ArchiveIndex(object):
+
+	def __init__(self, _container, _filename=None):
+		"""
+			Opens the index of a container.
+
+			Args:
+				_container: Path of the container.
+				_filename: Path of the index. Defaults to the path of
+						the container followed by INDEX_SUFFIX.
+		"""
+		if (_filename is None):
+			_filename = index_filename(_container)
+		self.layout = header_layouts()
+		self.file = open(_filename, "rb")
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		if (len(self.map) < INDEX_HEADER.size):
+			self.close()
+			raise Exception("'{:s}' is not a VMF index.".format(_filename))
+		(magic, version, ntables, size, count, mtime, checksum) = INDEX_HEADER.unpack_from(self.map, 0)
+		if (magic != INDEX_MAGIC or version != INDEX_VERSION):
+			self.close()
+			raise Exception("'{:s}' is not a VMF index.".format(_filename))
+		stat = os.stat(_container)
+		self.container = ContainerReader(_container)
+		if (size != stat.st_size or mtime != stat.st_mtime or
+			count != len(self.container) or checksum != self.container.footer_checksum()):
+			self.close()
+			raise Exception("Index '{:s}' is stale: '{:s}' was modified since it was indexed.".format(
+				_filename, _container))
+		self.count = count
+		# Offset and number of entries of each table
+		self.tables = {}
+		offset = INDEX_HEADER.size
+		for i in range(ntables):
+			(length,) = TABLE_HEADER.unpack_from(self.map, offset)
+			offset += TABLE_HEADER.size
+			code = self.map[offset:offset+length]
+			offset += length
+			(entries,) = TABLE_COUNT.unpack_from(self.map, offset)
+			offset += TABLE_COUNT.size
+			self.tables[code] = (offset, entries)
+			offset += entries * ENTRY.size
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, _type, _value, _traceback):
+		self.close()
+
+	def close(self):
+		if (getattr(self, "container", None) is not None):
+			self.container.close()
+			self.container = None
+		if (self.map is not None):
+			self.map.close()
+			self.map = None
+		self.file.close()
+
+	def fields(self):
+		"""
+			Returns the codes of the indexed fields.
+		"""
+		return self.tables.keys()
+
+	def _table(self, _code):
+		if (_code not in self.tables):
+			raise Exception("Field '{:s}' is not indexed.".format(_code))
+		return self.tables[_code]
+
+	def _bisect(self, _start, _entries, _key, _after):
+		"""
+			Returns the position of the first entry of a table with
+			a key greater than or equal to _key, or greater than
+			_key if _after is set.
+		"""
+		lo = 0
+		hi = _entries
+		unpack = ENTRY.unpack_from
+		data = self.map
+		size = ENTRY.size
+		while (lo < hi):
+			mid = (lo + hi) >> 1
+			(key, n) = unpack(data, _start + mid * size)
+			if (key < _key or (_after and key == _key)):
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+	def range(self, _code, _low=None, _high=None):
+		"""
+			Finds the records whose field is within a range.
+
+			Args:
+				_code: Code of the indexed field.
+				_low: Lowest value, inclusive. Unbounded if None.
+				_high: Highest value, inclusive. Unbounded if None.
+
+			Returns:
+				A sorted list of record numbers.
+		"""
+		(start, entries) = self._table(_code)
+		slot = self.layout.slot_index[_code]
+		first = 0
+		last = entries
+		if (_low is not None):
+			first = self._bisect(start, entries, index_key(slot, _low), False)
+		if (_high is not None):
+			last = self._bisect(start, entries, index_key(slot, _high, True), True)
+		unpack = ENTRY.unpack_from
+		data = self.map
+		size = ENTRY.size
+		found = set(unpack(data, start + i * size)[1] for i in xrange(first, last))
+		return sorted(found)
+
+	def lookup(self, _code, _value):
+		"""
+			Finds the records whose field is equal to a value. A DTG
+			without seconds matches the whole minute.
+
+			Returns:
+				A sorted list of record numbers.
+		"""
+		return self.range(_code, _value, _value)
+
+	def query(self, _conditions):
+		"""
+			Finds the records matching all the conditions given.
+
+			Args:
+				_conditions: Dictionary of field codes and values. A
+						(low, high) tuple selects a range of values,
+						with None for an unbounded side.
+
+			Returns:
+				A sorted list of record numbers.
+		"""
+		result = None
+		for (code, value) in _conditions.items():
+			if (isinstance(value, tuple)):
+				found = self.range(code, value[0], value[1])
+			else:
+				found = self.lookup(code, value)
+			result = set(found) if result is None else result.intersection(found)
+			if (not result):
+				break
+		if (result is None):
+			return range(self.count)
+		return sorted(result)
+
+	def messages(self, _records):
+		"""
+			Decodes the headers of some records.
+
+			Returns:
+				A generator of (record number, Message) tuples.
+		"""
+		for n in _records:
+			yield (n, self.container.message(n))
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import csv
+from itertools import islice
+from Schema import KIND_INT, KIND_ENUM
+from Message import header_layouts
+from Factory import Factory
+from Batch import DEFAULT_CHUNK_SIZE
+from Export import CSV_LIST_SEPARATOR
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Query reading the messages of a SQLite export by default
+DEFAULT_SQL_QUERY = "SELECT * FROM messages"
+#//////////////////////////////////////////////////////////
+
+def parse_mapping(_items):
+	"""
+		Parses column mappings given as "COLUMN=PARAMETER" strings.
+
+		Returns:
+			A dictionary of parameter names by column name.
+	"""
+	mapping = {}
+	for item in (_items or []):
+		(column, sep, param) = item.partition("=")
+		if (not sep or not column or not param):
+			raise Exception("Invalid column mapping '{:s}', expected COLUMN=PARAMETER.".format(item))
+		mapping[column] = param
+	return mapping
+
+def parse_assignments(_items, _layout=None):
+	"""
+		Parses field values given as "FIELD=VALUE" strings. Values
+		are converted as the columns of a dataset.
+
+		Args:
+			_items: list of assignments.
+			_layout: HeaderLayout of the messages. Defaults to the
+					LayoutRegistry of all the versions of the
+					header.
+
+		Returns:
+			A dictionary of parameters.
+	"""
+	row = {}
+	for item in (_items or []):
+		(name, sep, value) = item.partition("=")
+		if (not sep or not name):
+			raise Exception("Invalid field value '{:s}', expected FIELD=VALUE.".format(item))
+		row[name] = value
+	converter = RowConverter(None, _layout)
+	for name in row.keys():
+		if (Factory.param_fields.get(name, name) not in converter.layout.slot_index):
+			raise Exception("Unknown field '{:s}'.".format(name))
+	return converter.convert(row)
+
+# =============================================================================
+# RowConverter Class
+#
+# Description:
+#   Converts the rows of a dataset into message specifications. Columns
+#   are renamed to parameters, and their text is converted according to
+#   the fields of the header: integers are parsed, and the values of
+#   repeated fields and of fields in repeatable groups are split on
+#   CSV_LIST_SEPARATOR. Empty values are absent.
+#
+class RowConverter(object):
+
+	def __init__(self, _mapping=None, _layout=None):
+		"""
+			Args:
+				_mapping: Dictionary of parameter names by column
+						name. Other columns keep their name.
+				_layout: HeaderLayout of the messages. Defaults to
+						the LayoutRegistry of all the versions of
+						the header.
+		"""
+		self.mapping = dict(_mapping or {})
+		self.layout = _layout
+		if (self.layout is None):
+			self.layout = header_layouts()
+		# Converter of each column, by column name
+		self.converters = {}
+
+	def _converter(self, _column):
+		param = self.mapping.get(_column, _column)
+		slot = self.layout.slot_index.get(Factory.param_fields.get(param, param))
+		convert = None
+		if (slot is not None):
+			if (slot.kind == KIND_INT):
+				convert = _to_int
+			elif (slot.kind == KIND_ENUM):
+				convert = _to_enum
+			else:
+				convert = _to_text
+			if (slot.is_repeatable or slot.context is not None):
+				convert = _list_of(convert)
+		converter = (param, convert)
+		self.converters[_column] = converter
+		return converter
+
+	def convert(self, _row):
+		"""
+			Converts a row given as a dictionary.
+
+			Returns:
+				A dictionary of parameters.
+		"""
+		spec = {}
+		converters = self.converters
+		for (column, value) in _row.iteritems():
+			converter = converters.get(column)
+			if (converter is None):
+				converter = self._converter(column)
+			(param, convert) = converter
+			if (value is None or value == ""):
+				continue
+			if (convert is not None):
+				value = convert(value)
+			spec[param] = value
+		return spec
+
+def _to_int(_value):
+	if (isinstance(_value, basestring)):
+		return int(_value, 0)
+	return _value
+
+def _to_enum(_value):
+	# Codes may be given instead of codewords
+	if (isinstance(_value, basestring) and _value.isdigit()):
+		return int(_value)
+	return _value
+
+def _to_text(_value):
+	if (isinstance(_value, unicode)):
+		return _value.encode("ascii")
+	return _value
+
+def _list_of(_convert):
+	def convert(_value):
+		if (not isinstance(_value, basestring)):
+			return [_convert(_value)]
+		return [_convert(v) if v != "" else None for v in _value.split(CSV_LIST_SEPARATOR)]
+	return convert
+
+def read_csv(_input, _chunksize=DEFAULT_CHUNK_SIZE):
+	"""
+		Reads the rows of a CSV file whose first row contains the
+		column names.
+
+		Returns:
+			A generator of lists of at most _chunksize rows, each
+			row being a dictionary.
+	"""
+	reader = csv.DictReader(_input)
+	while (True):
+		chunk = list(islice(reader, _chunksize))
+		if (not chunk):
+			break
+		yield chunk
+
+def read_sqlite(_database, _query=DEFAULT_SQL_QUERY, _chunksize=DEFAULT_CHUNK_SIZE):
+	"""
+		Reads the rows returned by a query on a SQLite database.
+
+		Returns:
+			A generator of lists of at most _chunksize rows, each
+			row being a dictionary.
+	"""
+	import sqlite3
+	connection = sqlite3.connect(_database)
+	try:
+		cursor = connection.execute(_query)
+		columns = [d[0] for d in cursor.description]
+		while (True):
+			rows = cursor.fetchmany(_chunksize)
+			if (not rows):
+				break
+			yield [dict(zip(columns, row)) for row in rows]
+	finally:
+		connection.close()
+
+def ingest(_chunks, _encoder, _mapping=None):
+	"""
+		Encodes the rows of a dataset.
+
+		Args:
+			_chunks: Iterable of lists of rows, as returned by
+					read_csv() or read_sqlite().
+			_encoder: BatchEncoder writing the headers.
+			_mapping: Dictionary of parameter names by column name.
+
+		Returns:
+			A tuple containing the number of headers written and the
+			number of rows skipped because they are invalid.
+	"""
+	converter = RowConverter(_mapping, _encoder.factory.new_message({}).layout)
+	logger = _encoder.factory.logger
+	written = 0
+	skipped = 0
+	rowno = 0
+	for chunk in _chunks:
+		for row in chunk:
+			rowno += 1
+			try:
+				if (_encoder.write(converter.convert(row))):
+					written += 1
+			except Exception as e:
+				skipped += 1
+				logger.print_error("Row {:d}: {:s}".format(rowno, e))
+	return (written, skipped)
@@ -29,31 +29,198 @@ __version__ = '.'.join(__version_info__)
 
 #//////////////////////////////////////////////////////////
 # Imports Statements
+import os
 import sys
-from enum import Enum
-from bitstring import BitArray
-from Fields import *
-from Groups import *
+from zlib import crc32
 from Logger import *
 from Elements import *
+from Bits import BitWriter, DEFAULT_CAPACITY
+from Schema import compile_header, LayoutRegistry, load_layouts, save_layouts
 #//////////////////////////////////////////////////////////
 
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Environment variable naming the file caching the compiled layout
+SCHEMA_CACHE_VARIABLE = "VMFCAT_SCHEMA_CACHE"
+# Modules defining the header. A cached layout is only used if it
+# was compiled from the same source.
+DEFINITION_MODULES = ("Elements", "Codecs", "Fields", "Groups", "Message", "Schema", "Codegen")
+#//////////////////////////////////////////////////////////
+
+# Compiled layouts of the header versions, built on first use.
+_header_layouts = None
+# File caching the compiled layouts. Defaults to the file named by
+# the SCHEMA_CACHE_VARIABLE environment variable.
+_schema_cache = None
+# Definition used when no version is specified, or None for Header.
+_default_definition = None
+
+def set_schema_cache(_filename):
+	"""
+		Sets the file in which the compiled layouts are cached. It
+		must be called before the layouts are first used.
+	"""
+	global _schema_cache
+	_schema_cache = _filename
+
+def definition_key():
+	"""
+		Returns a checksum of the source of the modules and schema
+		files defining the header, and of the definition used by
+		each version, or None if the source cannot be read.
+	"""
+	checksum = 0
+	size = 0
+	folder = os.path.dirname(os.path.abspath(__file__))
+	try:
+		for name in DEFINITION_MODULES:
+			with open(os.path.join(folder, name + ".py"), "rb") as f:
+				source = f.read()
+			checksum = crc32(source, checksum)
+			size += len(source)
+	except IOError:
+		return None
+	default = _default_definition or Header
+	sources = [repr((default.__name__, sorted((version_name, definition.__name__)
+		for (version_name, definition) in HEADER_DEFINITIONS.items())))]
+	sources.extend(definition.source for definition in set([default] + HEADER_DEFINITIONS.values())
+		if getattr(definition, "source", None))
+	for source in sorted(sources):
+		checksum = crc32(source, checksum)
+		size += len(source)
+	return "{:s}/{:d}/{:08x}".format(sys.version.split()[0], size, checksum & 0xFFFFFFFF)
+
+def compile_layouts():
+	"""
+		Compiles the definition of the header of each version. The
+		versions sharing a definition share its compiled layout.
+
+		Returns:
+			A LayoutRegistry object.
+	"""
+	default = _default_definition or Header
+	definitions = {}
+	for definition in [default] + HEADER_DEFINITIONS.values():
+		if (definitions.setdefault(definition.__name__, definition) is not definition):
+			raise Exception("Several header definitions are named '{:s}'.".format(definition.__name__))
+	layouts = dict((name, compile_header(definition().elements))
+		for (name, definition) in definitions.items())
+	version_slot = layouts[default.__name__].slot_index.get(CODE_FLD_VERSION)
+	if (version_slot is None or version_slot.enum is None):
+		raise Exception("The '{:s}' header has no enumerated '{:s}' field.".format(
+			default.__name__, CODE_FLD_VERSION))
+	names = [default.__name__] * (1 << version_slot.size)
+	for (version_name, definition) in HEADER_DEFINITIONS.items():
+		value = version_slot.enum.value_of(version_name)
+		if (value is None or not (0 <= value < len(names))):
+			raise Exception("Unknown VMF version '{}'.".format(version_name))
+		names[value] = definition.__name__
+	return LayoutRegistry(layouts, names, default.__name__)
+
+def register_definition(_definition, _versions=None):
+	"""
+		Uses a header definition for some versions of the header.
+		The layouts are compiled again on their next use.
+
+		Args:
+			_definition: Subclass of Header, or HeaderDefinition
+					object read from a schema file.
+			_versions: Names of the versions using the definition.
+					By default, the definition replaces the header
+					of all the versions, and is used when no version
+					is specified.
+	"""
+	global _header_layouts, _default_definition
+	if (_versions is None):
+		_default_definition = _definition
+		_versions = HEADER_DEFINITIONS.keys()
+	for version_name in _versions:
+		HEADER_DEFINITIONS[version_name] = _definition
+	_header_layouts = None
+
+def header_layouts():
+	"""
+		Returns the registry of the compiled layouts of the header
+		versions. The layouts are compiled once per process.
+
+		If a cache file is set, the layouts are read from the file
+		instead, without loading the modules defining the header.
+		The file is written again when the definitions change.
+	"""
+	global _header_layouts
+	if (_header_layouts is None):
+		filename = _schema_cache or os.environ.get(SCHEMA_CACHE_VARIABLE)
+		key = definition_key() if filename else None
+		registry = None
+		if (key):
+			registry = load_layouts(filename, key)
+		if (registry is None):
+			registry = compile_layouts()
+			if (key):
+				save_layouts(registry, filename, key)
+		_header_layouts = registry
+	return _header_layouts
+
+def header_layout(_version=None):
+	"""
+		Returns the compiled layout of the application header.
+
+		Args:
+			_version: Name or value of the version of the header.
+					The layout of the default definition is
+					returned if it is not provided.
+	"""
+	return header_layouts().layout(_version)
+
 class Message(object):
 
-	def __init__(self, _logger=None):
-		self.header = Header()
+	def __init__(self, _logger=None, _layout=None):
+		self.layout = _layout
+		if (_layout == None):
+			self.layout = header_layout()
+		self.values = self.layout.new_values()
 		self.data = None
 		self.logger = _logger
 		if (_logger == None):
 			self.logger = Logger(sys.stdout)
 
+	@property
+	def header(self):
+		"""
+			Header object graph of the message, built from its
+			current values each time it is requested. It is a view
+			of the values: changes made to it are not encoded, and
+			messages are always encoded from their values.
+		"""
+		header = Header()
+		header.load_values(self.values)
+		return header
+
 	def get_bit_array(self):
-		return self.header.get_bit_array()
+		return self.layout.encode(self.values)
+
+	def write_to(self, _writer):
+		"""
+			Writes the header of the message to a BitWriter.
+		"""
+		self.layout.write(self.values, _writer)
+		return _writer
 
 		
 class Header(object):
 	
-	def __init__(self):
+	def __init__(self, _elements=None):
+		if (_elements is not None):
+			# Elements of a definition read from a schema file
+			self.elements = _elements
+			return
+		# The definitions are only loaded when the header is built,
+		# as compiled layouts can be read from a cache instead.
+		from Fields import (Field, dtg_field, version, data_compression,
+			umf, operation, precedence, classification, rc_codes,
+			fad_codes, cantco_reasons, cantpro_reasons, ENABLE_FUTURE_GRP)
+		from Groups import Group
 		self.elements = {
 			CODE_FLD_VERSION    : Field(
 						_name="Version",
@@ -78,7 +245,7 @@ class Header(object):
 						_size=448, 
 						_groupcode=CODE_GRP_ORIGIN_ADDR,
 						_string=True,
-						_index=0),
+						_index=1),
 			CODE_FLD_RCPT_URN     : Field(
 						_name="Recipient URN", 
 						_size=24, 
@@ -89,7 +256,7 @@ class Header(object):
 						_size=448, 
 						_groupcode=CODE_GRP_RCPT_ADDR,
 						_string=True,
-						_index=0),
+						_index=1),
 			CODE_FLD_INFO_URN     : Field(
 						_name="Information URN", 
 						_size=24, 
@@ -100,7 +267,7 @@ class Header(object):
 						_size=448, 
 						_groupcode=CODE_GRP_INFO_ADDR,
 						_string=True,
-						_index=0),
+						_index=1),
 			CODE_FLD_UMF           : Field(
 						_name="UMF", 
 						_size=4, 
@@ -166,6 +333,7 @@ class Header(object):
 						_name="Control/Release Marking",
 						_size=9,
 						_repeatable=True,
+						_max_repeat=16,
 						_groupcode=CODE_GRP_MSG_HAND,
 						_index=9),
 			CODE_FLD_ORIG_DTG	: dtg_field(
@@ -222,6 +390,7 @@ class Header(object):
 						_name="Reply Amplification",
 						_size=350,
 						_groupcode=CODE_GRP_RESPONSE,
+						_string=True,
 						_index=16),
 			"ref_urn"       : Field(
 						_name="Reference Message URN",
@@ -232,11 +401,12 @@ class Header(object):
 						_name="Reference Message Unit Name",
 						_size=448,
 						_groupcode=CODE_GRP_REF,
-						_index=0),
+						_string=True,
+						_index=1),
 			"refdtg"        : dtg_field(
 						_name="Reference Message DTG",
 						_groupcode=CODE_GRP_REF,
-						_index=1),
+						_index=2),
 			"secparam"      : Field(
 						_name="Security Parameters",
 						_size=4,
@@ -446,6 +616,32 @@ class Header(object):
 					self.elements[name] = _elem
 					
 					
+	def load_values(self, _values):
+		"""
+			Sets the fields of the header from a HeaderValues
+			object and structures the fields and groups.
+		"""
+		for (code, value) in _values.items():
+			self.elements[code].enable_and_set(value)
+		# Absent fields are kept, as their FPI is encoded
+		for field in self.fields().itervalues():
+			self.elements[field.grp_code].append_field(field)
+
+		groups = self.groups()
+		for (code, group) in groups.iteritems():
+			parent_group = group.parent_group
+			if (not parent_group is None):
+				self.elements[parent_group].fields.append(group)
+		# Groups containing a present field are present, as are
+		# all the groups containing them.
+		for group in groups.itervalues():
+			if (group.pi == PRESENT):
+				parent_group = group.parent_group
+				while (not parent_group is None):
+					self.elements[parent_group].enable()
+					parent_group = self.elements[parent_group].parent_group
+			group.fields.sort()
+
 	def remove_element(self, _name):
 		del self.elements[_name]
 		
@@ -457,6 +653,7 @@ class Header(object):
 		Returns a dictionary of the header elements which are
 		groups.
 		"""
+		from Groups import Group
 		g = {}
 		for (key, value) in self.elements.iteritems():
 			if isinstance(value, Group):
@@ -468,6 +665,7 @@ class Header(object):
 		Returns a dictionary of the header elements which are
 		fields.
 		"""
+		from Fields import Field
 		f = {}
 		for (key, value) in self.elements.iteritems():
 			if isinstance(value, Field):
@@ -486,9 +684,29 @@ class Header(object):
 		return self.elements.itervalues()
 
 	def get_bit_array(self):
+		return self.write_to(BitWriter(DEFAULT_CAPACITY)).bitarray()
+
+	def write_to(self, _writer):
+		"""
+			Writes the whole header to a single BitWriter, which
+			is threaded through every group and field.
+		"""
 		root = self.elements[CODE_GRP_HEADER]
-		root.fields.sort()
 		if (root):
-			return root.get_bit_array()
+			root.fields.sort()
+			root.write_to(_writer)
+			return _writer
 		else:
 			raise Exception("No root group from in message.")
+
+# Definition of the header of each version of the standard, by name
+# of the version. Versions which are not listed use Header. A version
+# with a different header is defined by a subclass of Header changing
+# its elements.
+HEADER_DEFINITIONS = {
+	"std47001"			: Header,
+	"std47001b"			: Header,
+	"std47001c"			: Header,
+	"std47001d"			: Header,
+	"std47001d_change"	: Header
+}
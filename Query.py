@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import re
+import operator
+from Schema import KIND_INT, KIND_ENUM, KIND_STRING, KIND_DTG
+from Bits import BitReader
+from Message import header_layouts
+from Factory import Factory
+from Batch import frame, FRAMING_LENGTH, FRAMING_RAW, FRAMING_CONTAINER
+from Capture import CaptureReader
+from Container import ContainerReader, ContainerWriter
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Comparison operators of filter expressions
+OPERATORS = {
+	"=="	: operator.eq,
+	"!="	: operator.ne,
+	"<"		: operator.lt,
+	"<="	: operator.le,
+	">"		: operator.gt,
+	">="	: operator.ge
+}
+
+KEYWORDS = ("and", "or", "not")
+
+# Tokens of filter expressions: parentheses, operators, quoted
+# strings, and words (field names, codewords and numbers).
+TOKEN_RE = re.compile(r"""\s*(?:
+	(?P<paren>[()])|
+	(?P<op>==|!=|<=|>=|<|>)|
+	(?P<string>"[^"]*"|'[^']*')|
+	(?P<word>[\w\-.:]+))""", re.VERBOSE)
+#//////////////////////////////////////////////////////////
+
+def tokenize(_expression):
+	"""
+		Splits a filter expression into (type, text) tokens.
+	"""
+	tokens = []
+	pos = 0
+	expression = _expression.rstrip()
+	while (pos < len(expression)):
+		match = TOKEN_RE.match(expression, pos)
+		if (match is None or match.end() == pos):
+			raise Exception("Invalid expression at position {:d}: {:s}".format(pos, _expression))
+		kind = match.lastgroup
+		text = match.group(kind)
+		if (kind == "string"):
+			text = text[1:-1]
+		elif (kind == "word" and text.lower() in KEYWORDS):
+			kind = text = text.lower()
+		tokens.append((kind, text))
+		pos = match.end()
+	return tokens
+
+# =============================================================================
+# Where Class
+#
+# Description:
+#   Filter expression compiled into a closure over the slot values of
+#   a header. Expressions combine comparisons of fields with literals
+#   using and, or, not and parentheses, e.g.
+#
+#       fad == firesp and msgprecedence >= flash and classification != unclass
+#
+#   Codewords of enumerated fields are resolved to their values when
+#   the expression is compiled, so that comparisons are made between
+#   integers. A field given alone tests if the field is present. A
+#   comparison with a repeated field matches if any of its values
+#   does, and absent fields only match "!=".
+#
+class Where(object):
+
+	def __init__(self, _expression, _layout=None):
+		"""
+			Compiles a filter expression.
+
+			Args:
+				_expression: Filter expression.
+				_layout: HeaderLayout of the headers to filter.
+						Defaults to the LayoutRegistry of all the
+						versions of the header.
+		"""
+		self.expression = _expression
+		self.layout = _layout
+		if (self.layout is None):
+			self.layout = header_layouts()
+		self.codes = []
+		self.tokens = tokenize(_expression)
+		self.pos = 0
+		self.match = self._parse_or()
+		if (self.pos < len(self.tokens)):
+			raise Exception("Unexpected '{:s}' in expression: {:s}".format(
+				self.tokens[self.pos][1], _expression))
+		del self.tokens
+
+	def __repr__(self):
+		return "<Where: {:s}>".format(self.expression)
+
+	def __call__(self, _values):
+		"""
+			Indicates if a HeaderValues object matches the filter.
+		"""
+		return self.match(self.layout.values_of(_values))
+
+	def _peek(self):
+		if (self.pos < len(self.tokens)):
+			return self.tokens[self.pos]
+		return (None, None)
+
+	def _next(self):
+		token = self._peek()
+		if (token[0] is None):
+			raise Exception("Unexpected end of expression: {:s}".format(self.expression))
+		self.pos += 1
+		return token
+
+	def _parse_or(self):
+		tests = [self._parse_and()]
+		while (self._peek()[0] == "or"):
+			self.pos += 1
+			tests.append(self._parse_and())
+		if (len(tests) == 1):
+			return tests[0]
+		tests = tuple(tests)
+		def match_any(_values):
+			for test in tests:
+				if (test(_values)):
+					return True
+			return False
+		return match_any
+
+	def _parse_and(self):
+		tests = [self._parse_not()]
+		while (self._peek()[0] == "and"):
+			self.pos += 1
+			tests.append(self._parse_not())
+		if (len(tests) == 1):
+			return tests[0]
+		if (len(tests) == 2):
+			(first, second) = tests
+			return lambda _values: first(_values) and second(_values)
+		tests = tuple(tests)
+		def match_all(_values):
+			for test in tests:
+				if (not test(_values)):
+					return False
+			return True
+		return match_all
+
+	def _parse_not(self):
+		if (self._peek()[0] == "not"):
+			self.pos += 1
+			test = self._parse_not()
+			return lambda _values: not test(_values)
+		return self._parse_atom()
+
+	def _parse_atom(self):
+		(kind, text) = self._next()
+		if (kind == "paren" and text == "("):
+			test = self._parse_or()
+			if (self._next() != ("paren", ")")):
+				raise Exception("Missing ')' in expression: {:s}".format(self.expression))
+			return test
+		if (kind != "word"):
+			raise Exception("Expected a field name instead of '{:s}': {:s}".format(text, self.expression))
+		slot = self._slot(text)
+		if (self._peek()[0] != "op"):
+			index = slot.slot
+			return lambda _values: _values[index] is not None
+		op = self._next()[1]
+		(kind, literal) = self._next()
+		if (kind not in ("word", "string")):
+			raise Exception("Expected a value instead of '{:s}': {:s}".format(literal, self.expression))
+		return self._compare(slot, op, literal)
+
+	def _slot(self, _name):
+		code = Factory.param_fields.get(_name, _name)
+		slot = self.layout.slot_index.get(code)
+		if (slot is None):
+			raise Exception("Unknown field '{:s}' in expression: {:s}".format(_name, self.expression))
+		if (code not in self.codes):
+			self.codes.append(code)
+		return slot
+
+	def _compare(self, _slot, _op, _literal):
+		"""
+			Compiles the comparison of a field with a literal.
+		"""
+		compare = OPERATORS[_op]
+		convert = None
+		kind = _slot.kind
+		try:
+			if (kind == KIND_ENUM):
+				convert = _slot.enum.value_of
+				value = convert(_literal)
+				if (value is None):
+					value = int(_literal, 0)
+			elif (kind == KIND_DTG):
+				# Bounds without seconds cover the whole minute
+				upper = _op in ("<=", ">")
+				sort_key = _slot.codec.sort_key
+				convert = sort_key
+				value = sort_key(_literal, upper)
+			elif (kind == KIND_INT):
+				value = int(_literal, 0)
+			else:
+				value = _literal
+		except ValueError:
+			raise Exception("Invalid value '{:s}' for field '{:s}'.".format(_literal, _slot.code))
+		absent = (_op == "!=")
+		index = _slot.slot
+
+		if (convert is None):
+			def test(_values):
+				v = _values[index]
+				if (v is None):
+					return absent
+				if (isinstance(v, list)):
+					return any(x is not None and compare(x, value) for x in v)
+				return compare(v, value)
+		else:
+			def test(_values):
+				v = _values[index]
+				if (v is None):
+					return absent
+				if (isinstance(v, list)):
+					return any(x is not None and compare(convert(x), value) for x in v)
+				return compare(convert(v), value)
+		return test
+
+def compile_where(_expression, _layout=None):
+	"""
+		Compiles a filter expression into a Where object, which can
+		be called with HeaderValues objects. Its match attribute
+		tests a list of slot values directly.
+	"""
+	return Where(_expression, _layout)
+
+def filter_records(_filename, _framing=FRAMING_LENGTH, _where=None, _fields=()):
+	"""
+		Reads the headers of a capture or container which match a
+		filter. Only the fields used by the filter and the fields
+		requested are decoded from framed records; headers of raw
+		captures are decoded entirely to find where they end.
+
+		Args:
+			_filename: Path of the capture or container.
+			_framing: FRAMING_LENGTH, FRAMING_RAW or FRAMING_CONTAINER.
+			_where: Where object, or None to read all the headers.
+			_fields: Codes of other fields to decode.
+
+		Returns:
+			A generator of (header bytes, values) tuples, where values
+			is the list of slot values decoded, in the order of the
+			slots of the LayoutRegistry.
+	"""
+	# Headers are decoded with the layout of their version
+	layouts = header_layouts()
+	codes = list(_fields)
+	if (_where is not None):
+		codes.extend(code for code in _where.codes if code not in codes)
+	match = _where.match if _where is not None else None
+	if (_framing == FRAMING_CONTAINER):
+		with ContainerReader(_filename) as container:
+			for (n, data) in container.records():
+				values = layouts.read_slots(BitReader(data), codes)
+				if (match is None or match(values)):
+					yield (data, values)
+		return
+	with CaptureReader(_filename, _framing) as capture:
+		data = capture.data
+		for (offset, reader) in capture.records():
+			start = reader.pos >> 3
+			if (_framing == FRAMING_RAW):
+				values = layouts.values_of(layouts.decode(reader))
+				end = (reader.pos + 7) >> 3
+			else:
+				end = reader.end >> 3
+				values = layouts.read_slots(reader, codes)
+			if (match is None or match(values)):
+				header = data[start:end]
+				if (isinstance(header, memoryview)):
+					header = header.tobytes()
+				yield (header, values)
+
+def filter_capture(_filename, _output, _framing=FRAMING_LENGTH, _where=None):
+	"""
+		Copies the headers of a capture or container which match a
+		filter to an output file, using the same framing.
+
+		Returns:
+			The number of headers copied.
+	"""
+	count = 0
+	if (_framing == FRAMING_CONTAINER):
+		with ContainerWriter(_output) as writer:
+			for (data, values) in filter_records(_filename, _framing, _where):
+				writer.append(data)
+				count += 1
+		return count
+	for (data, values) in filter_records(_filename, _framing, _where):
+		_output.write(frame(data, _framing))
+		count += 1
+	return count
@@ -0,0 +1,1155 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import marshal
+from collections import namedtuple
+from Bits import BitWriter, BitReader, DEFAULT_CAPACITY
+from Codecs import *
+from Elements import *
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Kinds of values a field slot can hold
+KIND_INT	= 0
+KIND_ENUM	= 1
+KIND_STRING	= 2
+KIND_DTG	= 3
+
+# Version of the layout data written to cache files
+LAYOUT_FORMAT	= 4
+
+# Functions generated for each layout
+GENERATED_FUNCTIONS = ("encode", "decode")
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# Layout nodes
+#
+# Description:
+#   Immutable descriptions of the fields and groups of the header,
+#   produced once by compile_header().
+#
+#   The context of a field or group is its innermost repeatable
+#   ancestor group, or None. Fields and groups with a context hold
+#   one value per instance of that group.
+#
+class FieldSlot(namedtuple("FieldSlot", ["code", "name", "slot", "index",
+	"size", "kind", "is_indicator", "is_repeatable", "max_repeat", "enum",
+	"codec", "has_extension", "context"])):
+	__slots__ = ()
+	is_group = False
+
+class GroupNode(namedtuple("GroupNode", ["code", "name", "gid", "index",
+	"is_root", "is_repeatable", "max_repeat", "children", "slots",
+	"context", "local_slots", "subgroups"])):
+	__slots__ = ()
+	is_group = True
+
+# =============================================================================
+# Instances Class
+#
+# Description:
+#   List of the values of a field, one per instance of the repeatable
+#   group containing it. Missing trailing instances are absent.
+#
+class Instances(list):
+	__slots__ = ()
+
+	def __repr__(self):
+		return "Instances({:s})".format(list.__repr__(self))
+
+# =============================================================================
+# HeaderLayout Class
+#
+# Description:
+#   Precomputed plan of the application header. The layout holds the
+#   ordered field slots, the nesting of groups, their sizes and the
+#   enumerator tables. Headers are encoded and decoded by functions
+#   generated from the plan (see Codegen.py); single fields and groups
+#   are encoded, and selected fields decoded, by walking the plan
+#   against a HeaderValues store.
+#
+class HeaderLayout(object):
+
+	def __init__(self, _root, _slots, _groups, _compiled=None):
+		self.root = _root
+		self.slots = tuple(_slots)
+		self.groups = tuple(_groups)
+		self.slot_index = dict((s.code, s) for s in self.slots)
+		self.group_index = dict((g.code, g) for g in self.groups)
+		# Compiled code of the generated functions by name, and
+		# the functions themselves once bound to the layout.
+		self.compiled = dict(_compiled or {})
+		self.encoder = None
+		self.decoder = None
+
+	def __repr__(self):
+		return "<HeaderLayout: {:d} fields, {:d} groups>".format(
+			len(self.slots), len(self.groups))
+
+	def __contains__(self, _code):
+		return _code in self.slot_index or _code in self.group_index
+
+	def dump(self):
+		"""
+			Returns the layout as tuples, lists and dictionaries of
+			strings and integers, which can be serialized with
+			marshal. Nodes refer to each other by slot and group
+			numbers. Codecs are not included as they are given by
+			the kind and size of the slots.
+		"""
+		tables = {}
+		slots = []
+		for s in self.slots:
+			enum = None
+			if (s.enum is not None):
+				enum = s.enum.name
+				tables[enum] = (s.enum.by_name, s.enum.by_value)
+			slots.append((s.code, s.name, s.index, s.size, s.kind,
+				s.is_indicator, s.is_repeatable, s.max_repeat, enum,
+				s.has_extension, s.context))
+		groups = []
+		for g in self.groups:
+			children = tuple((c.is_group, c.gid if c.is_group else c.slot)
+				for c in g.children)
+			groups.append((g.code, g.name, g.index, g.is_root,
+				g.is_repeatable, g.max_repeat, children, g.slots,
+				g.context, g.local_slots, tuple(c.gid for c in g.subgroups)))
+		return (self.root.gid, slots, groups, tables)
+
+	@classmethod
+	def load(cls, _data, _compiled=None):
+		"""
+			Rebuilds a layout from the data returned by dump().
+
+			Args:
+				_data: Data returned by dump().
+				_compiled: Dictionary of the code returned by
+						compile() by function name. Missing code is
+						generated again when needed.
+		"""
+		(root, slot_data, group_data, table_data) = _data
+		tables = dict((name, EnumTable(name, by_name, by_value))
+			for (name, (by_name, by_value)) in table_data.items())
+		slots = []
+		for (code, name, index, size, kind, is_indicator, is_repeatable,
+			max_repeat, enum, has_extension, context) in slot_data:
+			codec = None
+			if (kind == KIND_STRING):
+				codec = string_codec(size)
+			elif (kind == KIND_DTG):
+				codec = dtg_codec(has_extension)
+			slots.append(FieldSlot(
+				code=code,
+				name=name,
+				slot=len(slots),
+				index=index,
+				size=size,
+				kind=kind,
+				is_indicator=is_indicator,
+				is_repeatable=is_repeatable,
+				max_repeat=max_repeat,
+				enum=tables.get(enum),
+				codec=codec,
+				has_extension=has_extension,
+				context=context))
+		# Groups are numbered before the groups they contain, so
+		# the nodes are rebuilt from the last one.
+		groups = [None] * len(group_data)
+		for gid in range(len(group_data) - 1, -1, -1):
+			(code, name, index, is_root, is_repeatable, max_repeat,
+				children, group_slots, context, local_slots,
+				subgroups) = group_data[gid]
+			groups[gid] = GroupNode(
+				code=code,
+				name=name,
+				gid=gid,
+				index=index,
+				is_root=is_root,
+				is_repeatable=is_repeatable,
+				max_repeat=max_repeat,
+				children=tuple(groups[i] if is_group else slots[i]
+					for (is_group, i) in children),
+				slots=group_slots,
+				context=context,
+				local_slots=local_slots,
+				subgroups=tuple(groups[i] for i in subgroups))
+		return cls(groups[root], slots, groups, _compiled)
+
+	def compile(self, _name):
+		"""
+			Returns the compiled code of a function generated for
+			the layout. The code is generated on first use, unless
+			it was read from the layout cache.
+
+			Args:
+				_name: One of GENERATED_FUNCTIONS.
+		"""
+		code = self.compiled.get(_name)
+		if (code is None):
+			from Codegen import compile_function
+			code = self.compiled[_name] = compile_function(self, _name)
+		return code
+
+	def generate(self, _name):
+		"""
+			Returns a function generated for the layout, see
+			Codegen.py.
+		"""
+		from Codegen import bind_function
+		return bind_function(self, self.compile(_name), _name)
+
+	def node(self, _code):
+		"""
+			Returns the field slot or group node with the given code.
+		"""
+		if (_code in self.slot_index):
+			return self.slot_index[_code]
+		return self.group_index[_code]
+
+	def new_values(self):
+		"""
+			Creates an empty value store for this layout.
+		"""
+		return HeaderValues(self)
+
+	def encode(self, _values, _code=None):
+		"""
+			Encodes the values of a message.
+
+			Args:
+				_values: HeaderValues object to encode.
+				_code: Code of the field or group to encode. The
+						entire header is encoded by default.
+
+			Returns:
+				A BitArray containing the encoded element.
+		"""
+		return self.write(_values, BitWriter(DEFAULT_CAPACITY), _code).bitarray()
+
+	def encode_bytes(self, _values):
+		"""
+			Encodes the values of a message into a string of bytes,
+			padded with zero bits to the next byte boundary.
+		"""
+		return self.write(_values, BitWriter(DEFAULT_CAPACITY)).tobytes()
+
+	def write(self, _values, _writer, _code=None):
+		"""
+			Writes the values of a message to a BitWriter.
+
+			Returns:
+				The BitWriter object.
+		"""
+		if (_code is None or _code == self.root.code):
+			if (self.encoder is None):
+				self.encoder = self.generate("encode")
+			self.encoder(_values.values, _values.counts, _writer)
+			return _writer
+		node = self.node(_code)
+		values = _values.values
+		if (node.is_group):
+			cursors = [0] * len(self.groups)
+			self._encode_group(node, 0, values, _values.counts, cursors, _writer)
+		else:
+			self._encode_field(node, self.value_at(values, node, 0), _writer)
+		return _writer
+
+	def values_of(self, _values):
+		"""
+			Returns the slot values of a HeaderValues object. See
+			LayoutRegistry.values_of().
+		"""
+		return _values.values
+
+	def value_at(self, _values, _slot, _idx):
+		"""
+			Returns the value of a field for the given instance of
+			its context.
+		"""
+		value = _values[_slot.slot]
+		if (isinstance(value, Instances)):
+			if (_idx < len(value)):
+				return value[_idx]
+			return None
+		if (_idx):
+			return None
+		return value
+
+	def count(self, _group, _idx, _values, _counts):
+		"""
+			Returns the number of instances of a group within the
+			given instance of its context. Unless they were set
+			explicitly, all the instances of a repeatable group
+			belong to the first instance of its context.
+		"""
+		counts = _counts[_group.gid]
+		if (counts is not None):
+			if (_idx < len(counts)):
+				return counts[_idx]
+			return 0
+		if (not _group.is_repeatable):
+			return 1 if self.is_present(_group, _idx, _values, _counts) else 0
+		if (_idx):
+			return 0
+		n = 0
+		for slot in _group.local_slots:
+			value = _values[slot]
+			if (isinstance(value, Instances)):
+				while (value and value[-1] is None):
+					value = value[:-1]
+				n = max(n, len(value))
+			elif (value is not None):
+				n = max(n, 1)
+		if (n == 0):
+			for sub in _group.subgroups:
+				if (self.count(sub, 0, _values, _counts)):
+					return 1
+		return n
+
+	def is_present(self, _group, _idx, _values, _counts):
+		"""
+			Indicates if a non-repeatable group is present within
+			the given instance of its context, i.e. if one of its
+			fields is present.
+		"""
+		slots = self.slots
+		for slot in _group.local_slots:
+			if (self.value_at(_values, slots[slot], _idx) is not None):
+				return True
+		for sub in _group.subgroups:
+			if (self.count(sub, _idx, _values, _counts)):
+				return True
+		return False
+
+	def _encode_group(self, _group, _idx, _values, _counts, _cursors, _writer):
+		if (_group.is_root):
+			self._encode_children(_group, _idx, _values, _counts, _cursors, _writer)
+			return
+
+		n = self.count(_group, _idx, _values, _counts)
+		if (n == 0):
+			_writer.write_bit(ABSENT)
+			return
+		_writer.write_bit(PRESENT)
+		if (not _group.is_repeatable):
+			self._encode_children(_group, _idx, _values, _counts, _cursors, _writer)
+			return
+
+		if (n > _group.max_repeat):
+			raise Exception("Group '{:s}' is repeated {:d} times, maximum is {:d}.".format(
+				_group.name, n, _group.max_repeat))
+		# Instances of a repeatable group are numbered in the
+		# order they appear in the message.
+		base = _cursors[_group.gid]
+		_cursors[_group.gid] = base + n
+		last = n - 1
+		for i in range(n):
+			# The GRI indicates if another instance follows
+			_writer.write_bit(PRESENT if i < last else ABSENT)
+			self._encode_children(_group, base + i, _values, _counts, _cursors, _writer)
+
+	def _encode_children(self, _group, _idx, _values, _counts, _cursors, _writer):
+		for node in _group.children:
+			if (node.is_group):
+				self._encode_group(node, _idx, _values, _counts, _cursors, _writer)
+			else:
+				value = _values[node.slot]
+				if (isinstance(value, Instances)):
+					value = value[_idx] if _idx < len(value) else None
+				elif (_idx):
+					value = None
+				self._encode_field(node, value, _writer)
+
+	def _encode_field(self, _slot, _value, _writer):
+		# Fields without FPI only contain their value.
+		if (_slot.is_indicator):
+			if (_value is None):
+				_value = 0
+			self.write_value(_slot, _value, _writer)
+			return
+
+		if (_value is None):
+			_writer.write_bit(ABSENT)
+			return
+		_writer.write_bit(PRESENT)
+
+		if (_slot.is_repeatable):
+			if (not isinstance(_value, (list, tuple))):
+				_value = [_value]
+			if (_slot.max_repeat and len(_value) > _slot.max_repeat):
+				raise Exception("Field '{:s}' is repeated {:d} times, maximum is {:d}.".format(
+					_slot.name, len(_value), _slot.max_repeat))
+			last = len(_value) - 1
+			for (i, item) in enumerate(_value):
+				# The FRI indicates if another occurrence follows
+				_writer.write_bit(PRESENT if i < last else ABSENT)
+				self.write_value(_slot, item, _writer)
+		else:
+			self.write_value(_slot, _value, _writer)
+
+	def write_value(self, _slot, _value, _writer):
+		"""
+			Writes the value of a field to a BitWriter.
+		"""
+		kind = _slot.kind
+		if (kind == KIND_STRING):
+			(value, size) = _slot.codec.pack(_value)
+			_writer.write(value, size)
+			return
+		if (kind == KIND_DTG):
+			(value, size) = _slot.codec.pack(_value)
+			_writer.write(value, size)
+			return
+		if (kind == KIND_ENUM):
+			value = _slot.enum.value_of(_value)
+			if (value is None):
+				raise Exception("Unknown value '{:s}' for field '{:s}'.".format(_value, _slot.name))
+			_value = value
+		_value = int(_value)
+		if (_value < 0 or _value >> _slot.size):
+			raise Exception("Value {:d} does not fit in field '{:s}' ({:d} bits).".format(
+				_value, _slot.name, _slot.size))
+		_writer.write(_value, _slot.size)
+
+	def decode(self, _reader):
+		"""
+			Decodes a header.
+
+			Args:
+				_reader: BitReader positioned at the start of the
+						header. A BitStream is also accepted, in
+						which case its position is moved past the
+						header.
+
+			Returns:
+				A HeaderValues object containing the decoded fields.
+		"""
+		if (self.decoder is None):
+			self.decoder = self.generate("decode")
+		values = HeaderValues(self)
+		if (isinstance(_reader, BitReader)):
+			self.decoder(_reader, values.values, values.counts)
+		else:
+			reader = BitReader.from_bits(_reader)
+			start = reader.pos
+			self.decoder(reader, values.values, values.counts)
+			_reader.pos += reader.pos - start
+		return values
+
+	def _store_value(self, _values, _slot, _idx, _value):
+		if (_idx == 0):
+			_values[_slot] = _value
+		elif (_value is not None):
+			# Values of the following instances are stored
+			# in a list, one entry per instance.
+			instances = _values[_slot]
+			if (not isinstance(instances, Instances)):
+				instances = _values[_slot] = Instances([instances])
+			while (len(instances) < _idx):
+				instances.append(None)
+			instances.append(_value)
+
+	def _decode_field(self, _slot, _reader):
+		if (_slot.is_indicator):
+			return self.read_value(_slot, _reader)
+		if (_reader.read(1) == ABSENT):
+			return None
+		if (not _slot.is_repeatable):
+			return self.read_value(_slot, _reader)
+		items = []
+		more = PRESENT
+		while (more):
+			if (_slot.max_repeat and len(items) == _slot.max_repeat):
+				raise Exception("Field '{:s}' is repeated more than {:d} times.".format(
+					_slot.name, _slot.max_repeat))
+			more = _reader.read(1)
+			items.append(self.read_value(_slot, _reader))
+		return items
+
+	def read_value(self, _slot, _reader):
+		"""
+			Reads the value of a field from a BitReader.
+		"""
+		kind = _slot.kind
+		if (kind == KIND_STRING):
+			chars = []
+			count = 0
+			while (count + 7 <= _slot.size):
+				c = _reader.read(7)
+				count += 7
+				if (c == TERMINATOR):
+					break
+				chars.append(CODE_CHARS[c])
+			return ''.join(chars)
+		if (kind == KIND_DTG):
+			v = _reader.read(33)
+			ext = None
+			if (_slot.has_extension and _reader.read(1)):
+				ext = _reader.read(DTG_EXT_SIZE)
+			return _slot.codec.format(v >> 26, (v >> 22) & 0xF, (v >> 17) & 0x1F,
+				(v >> 12) & 0x1F, (v >> 6) & 0x3F, v & 0x3F, ext)
+		value = _reader.read(_slot.size)
+		if (kind == KIND_ENUM):
+			name = _slot.enum.name_of(value)
+			if (name is not None):
+				return name
+		return value
+
+	def skip_value(self, _slot, _reader):
+		"""
+			Moves a BitReader past the value of a field without
+			decoding it. Only strings need to be scanned for their
+			terminator; other values have a fixed width.
+		"""
+		kind = _slot.kind
+		if (kind == KIND_STRING):
+			count = 0
+			while (count + 7 <= _slot.size):
+				count += 7
+				if (_reader.read(7) == TERMINATOR):
+					break
+		elif (kind == KIND_DTG):
+			_reader.skip(33)
+			if (_slot.has_extension and _reader.read(1)):
+				_reader.skip(DTG_EXT_SIZE)
+		else:
+			_reader.skip(_slot.size)
+
+	def read_fields(self, _reader, _codes):
+		"""
+			Decodes only some fields of a header.
+
+			The header is walked up to the last requested field.
+			The values of the other fields are skipped without
+			being decoded, and the rest of the header is not read.
+
+			Args:
+				_reader: BitReader positioned at the start of the
+						header. A BitStream is also accepted, in
+						which case its position is moved to the end
+						of the decoded part.
+				_codes: Codes of the fields to decode.
+
+			Returns:
+				A dictionary containing the value of each requested
+				field, or None if the field is absent.
+		"""
+		values = self.read_slots(_reader, _codes)
+		return dict((code, values[self.slot_index[code].slot]) for code in _codes)
+
+	def read_slots(self, _reader, _codes):
+		"""
+			Decodes only some fields of a header, like read_fields().
+
+			Returns:
+				A list of the values of the slots of the layout, in
+				which only the requested fields are set.
+		"""
+		wanted = set()
+		for code in _codes:
+			slot = self.slot_index.get(code)
+			if (slot is None):
+				raise Exception("Unknown field '{:s}'.".format(code))
+			wanted.add(slot.slot)
+		values = [None] * len(self.slots)
+		if (wanted):
+			last = max(wanted)
+			cursors = [0] * len(self.groups)
+			if (isinstance(_reader, BitReader)):
+				self._project_group(self.root, 0, _reader, values, wanted, last, cursors, True)
+			else:
+				reader = BitReader.from_bits(_reader)
+				start = reader.pos
+				self._project_group(self.root, 0, reader, values, wanted, last, cursors, True)
+				_reader.pos += reader.pos - start
+		return values
+
+	def _project_group(self, _group, _idx, _reader, _values, _wanted, _last, _cursors, _final):
+		"""
+			Walks a group for read_fields(). Returns True once the
+			last requested field has been decoded.
+
+			_final indicates if the walk is within the last instance
+			of all the enclosing repeatable groups, i.e. if nothing
+			else can follow the last requested field.
+		"""
+		if (_group.is_root):
+			return self._project_children(_group, _idx, _reader, _values, _wanted, _last, _cursors, _final)
+		if (_reader.read(1) == ABSENT):
+			return False
+		if (not _group.is_repeatable):
+			return self._project_children(_group, _idx, _reader, _values, _wanted, _last, _cursors, _final)
+
+		base = _cursors[_group.gid]
+		n = 0
+		more = PRESENT
+		while (more):
+			if (n == _group.max_repeat):
+				raise Exception("Group '{:s}' is repeated more than {:d} times.".format(
+					_group.name, _group.max_repeat))
+			more = _reader.read(1)
+			if (self._project_children(_group, base + n, _reader, _values,
+				_wanted, _last, _cursors, _final and not more)):
+				return True
+			n += 1
+		_cursors[_group.gid] = base + n
+		return False
+
+	def _project_children(self, _group, _idx, _reader, _values, _wanted, _last, _cursors, _final):
+		for node in _group.children:
+			if (node.is_group):
+				if (self._project_group(node, _idx, _reader, _values, _wanted, _last, _cursors, _final)):
+					return True
+				if (not node.slots):
+					continue
+				end = node.slots[-1]
+			else:
+				end = node.slot
+				if (end in _wanted):
+					self._store_value(_values, end, _idx, self._decode_field(node, _reader))
+				else:
+					self._skip_field(node, _reader)
+			# Other instances of a repeatable group may follow, so
+			# the walk stops only within the last instance.
+			if (end >= _last and _final):
+				return True
+		return False
+
+	def _skip_field(self, _slot, _reader):
+		if (_slot.is_indicator):
+			self.skip_value(_slot, _reader)
+			return
+		if (_reader.read(1) == ABSENT):
+			return
+		if (not _slot.is_repeatable):
+			self.skip_value(_slot, _reader)
+			return
+		more = PRESENT
+		while (more):
+			more = _reader.read(1)
+			self.skip_value(_slot, _reader)
+
+# =============================================================================
+# HeaderValues Class
+#
+# Description:
+#   Lightweight per-message store of field values, indexed by the
+#   slots of a HeaderLayout. A value of None means the field is
+#   absent.
+#
+class HeaderValues(object):
+	__slots__ = ("layout", "values", "counts")
+
+	def __init__(self, _layout):
+		self.layout = _layout
+		self.values = [None] * len(_layout.slots)
+		# Number of instances of each group within each instance
+		# of its context, or None to derive them from the values.
+		self.counts = [None] * len(_layout.groups)
+
+	def __repr__(self):
+		return "<HeaderValues: {:s}>".format(dict(self.items()))
+
+	def __contains__(self, _code):
+		slot = self.layout.slot_index.get(_code)
+		return slot is not None and self.values[slot.slot] is not None
+
+	def __getitem__(self, _code):
+		return self.values[self.layout.slot_index[_code].slot]
+
+	def __setitem__(self, _code, _value):
+		self.set(_code, _value)
+
+	def __delitem__(self, _code):
+		self.set(_code, None)
+
+	def get(self, _code, _default=None):
+		slot = self.layout.slot_index.get(_code)
+		if (slot is None or self.values[slot.slot] is None):
+			return _default
+		return self.values[slot.slot]
+
+	def set(self, _code, _value):
+		"""
+			Sets the value of a field. Setting None or False marks
+			the field as absent.
+
+			Fields contained in a repeatable group accept a list
+			of values, one per instance of the group. Repeatable
+			fields accept a list of occurrences; an Instances list
+			of such lists sets the occurrences of each instance.
+		"""
+		slot = self.layout.slot_index[_code]
+		if (_value is False):
+			_value = None
+		if (isinstance(_value, (list, tuple)) and not isinstance(_value, Instances)):
+			if (slot.is_repeatable):
+				_value = list(_value)
+			elif (slot.context is not None):
+				_value = Instances(_value)
+			elif (len(_value) == 1):
+				_value = _value[0]
+			else:
+				raise Exception("Field '{:s}' is not repeatable.".format(slot.name))
+		self.values[slot.slot] = _value
+		# Instances counts are derived again from the values.
+		context = slot.context
+		while (context is not None):
+			self.counts[context] = None
+			context = self.layout.groups[context].context
+
+	def set_count(self, _code, _counts):
+		"""
+			Sets the number of instances of a repeatable group.
+
+			Args:
+				_code: Code of the group.
+				_counts: Number of instances, or list of the number
+						of instances within each instance of the
+						context of the group.
+		"""
+		if (isinstance(_counts, int)):
+			_counts = [_counts]
+		self.counts[self.layout.group_index[_code].gid] = list(_counts)
+
+	def update(self, _params):
+		"""
+			Sets the fields from a dictionary or a namespace. Keys
+			which are not fields of the header are ignored.
+		"""
+		if (not isinstance(_params, dict)):
+			_params = _params.__dict__
+		slot_index = self.layout.slot_index
+		for (code, value) in _params.items():
+			if (value is not None and code in slot_index):
+				self.set(code, value)
+
+	def items(self):
+		"""
+			Returns a list of (code, value) tuples of the fields
+			present in the message.
+		"""
+		return [(s.code, self.values[s.slot]) for s in self.layout.slots
+			if self.values[s.slot] is not None]
+
+# =============================================================================
+# Schema compiler
+#
+def compile_header(_elements):
+	"""
+		Compiles the definition of a header into a HeaderLayout.
+
+		Args:
+			_elements: dictionary of Field and Group objects, as
+					defined in Header.elements.
+
+		Returns:
+			A HeaderLayout object.
+	"""
+	from Fields import dtg_field, enum_table
+	from Groups import Group
+	children = {}
+	root_code = None
+	for (code, elem) in _elements.items():
+		if (isinstance(elem, Group)):
+			if (elem.is_root):
+				root_code = code
+				continue
+			parent = elem.parent_group
+		else:
+			parent = elem.grp_code
+		children.setdefault(parent, []).append((elem.index, code))
+	if (root_code is None):
+		raise Exception("No root group from in message.")
+
+	slots = []
+	groups = []
+
+	def compile_group(_code, _context):
+		group = _elements[_code]
+		gid = len(groups)
+		groups.append(None)
+		# Context of the fields and groups contained in this group
+		context = gid if group.is_repeatable else _context
+		nodes = []
+		first_slot = len(slots)
+		for (index, code) in sorted(children.get(_code, [])):
+			elem = _elements[code]
+			if (isinstance(elem, Group)):
+				nodes.append(compile_group(code, context))
+			else:
+				nodes.append(compile_field(code, elem, context))
+		local_slots = []
+		subgroups = []
+		pending = list(nodes)
+		while (pending):
+			node = pending.pop(0)
+			if (not node.is_group):
+				local_slots.append(node.slot)
+			elif (node.is_repeatable):
+				subgroups.append(node)
+			else:
+				pending.extend(node.children)
+		node = GroupNode(
+			code=_code,
+			name=group.name,
+			gid=gid,
+			index=group.index,
+			is_root=group.is_root,
+			is_repeatable=group.is_repeatable,
+			max_repeat=group.max_repeat,
+			children=tuple(nodes),
+			slots=tuple(range(first_slot, len(slots))),
+			context=_context,
+			local_slots=tuple(sorted(local_slots)),
+			subgroups=tuple(subgroups))
+		groups[gid] = node
+		return node
+
+	def compile_field(_code, _field, _context):
+		enum = None
+		codec = None
+		if (isinstance(_field, dtg_field)):
+			kind = KIND_DTG
+			codec = dtg_codec(_field.has_extension)
+		elif (_field.is_string):
+			kind = KIND_STRING
+			codec = string_codec(_field.size)
+		elif (_field.enumerator):
+			kind = KIND_ENUM
+			enum = enum_table(_field.enumerator)
+		else:
+			kind = KIND_INT
+		slot = FieldSlot(
+			code=_code,
+			name=_field.name,
+			slot=len(slots),
+			index=_field.index,
+			size=_field.size,
+			kind=kind,
+			is_indicator=_field.is_indicator,
+			is_repeatable=_field.is_repeatable,
+			max_repeat=_field.max_repeat,
+			enum=enum,
+			codec=codec,
+			has_extension=getattr(_field, "has_extension", False),
+			context=_context)
+		slots.append(slot)
+		return slot
+
+	root = compile_group(root_code, None)
+	return HeaderLayout(root, slots, groups)
+
+# =============================================================================
+# LayoutRegistry Class
+#
+# Description:
+#   Compiled layouts of the header, one per value of the Version field.
+#   The Version field is the first field of every header, so decoders
+#   select the layout of a message by looking up its first 4 bits in
+#   a dispatch table.
+#
+#   The registry numbers the fields of all its layouts: the fields of
+#   the default layout keep their slot, and the fields added by the
+#   other layouts follow. Layouts may add, remove or reorder fields;
+#   fields are matched by code, so a code must name the same kind of
+#   field in every layout. Filters, projections and exports refer to
+#   these slots, and read_slots() and values_of() return the values of
+#   any header in this order, so that headers of different versions
+#   can be filtered and projected alike.
+#
+class LayoutRegistry(object):
+
+	def __init__(self, _layouts, _names, _default):
+		"""
+			Creates a registry.
+
+			Args:
+				_layouts: dictionary of the compiled layouts, by
+						name of their definition.
+				_names: Name of the definition of each value of the
+						Version field.
+				_default: Name of the definition used when no
+						version is specified.
+		"""
+		self.layouts = dict(_layouts)
+		self.names = tuple(_names)
+		self.default_name = _default
+		self.default = self.layouts[_default]
+		self.version_slot = self.default.slot_index[CODE_FLD_VERSION]
+		if (len(self.names) != 1 << self.version_slot.size):
+			raise Exception("Expected a definition for each of the {:d} versions.".format(
+				1 << self.version_slot.size))
+		for (name, layout) in self.layouts.items():
+			# The layout of a header is selected by its first bits
+			first = layout.slots[0] if layout.slots else None
+			if (first is None or first.code != CODE_FLD_VERSION or first.size != self.version_slot.size):
+				raise Exception("The '{:s}' definition does not start with the '{:s}' field.".format(
+					name, CODE_FLD_VERSION))
+		# Layout of each value of the Version field
+		self.table = tuple(self.layouts[name] for name in self.names)
+
+		# Fields of all the layouts
+		slots = []
+		slot_index = {}
+		origins = {}
+		names = [_default] + sorted(name for name in self.layouts if name != _default)
+		for name in names:
+			for slot in self.layouts[name].slots:
+				known = slot_index.get(slot.code)
+				if (known is None):
+					slot = slot_index[slot.code] = slot._replace(slot=len(slots))
+					slots.append(slot)
+					origins[slot.code] = name
+				elif (known.kind != slot.kind or known.is_repeatable != slot.is_repeatable):
+					raise Exception("Field '{:s}' is defined differently in the '{:s}' and '{:s}' definitions.".format(
+						slot.code, origins[slot.code], name))
+		self.slots = tuple(slots)
+		self.slot_index = slot_index
+		# Groups of all the layouts, with the slots of the fields
+		# they contain in any layout.
+		groups = {}
+		group_slots = {}
+		for name in names:
+			layout = self.layouts[name]
+			for group in layout.groups:
+				groups.setdefault(group.code, group)
+				group_slots.setdefault(group.code, set()).update(
+					slot_index[layout.slots[s].code].slot for s in group.slots)
+		for code in groups:
+			if (code in slot_index):
+				raise Exception("Code '{:s}' is used by a group and a field.".format(code))
+		self.group_index = dict((code, group._replace(slots=tuple(sorted(group_slots[code]))))
+			for (code, group) in groups.items())
+		# Slot of each field of the registry in each layout, by
+		# layout and by value of the Version field.
+		self.layout_maps = dict((layout, self._mapping(layout))
+			for layout in self.layouts.values())
+		self.maps = tuple(self.layout_maps[layout] for layout in self.table)
+
+	def __repr__(self):
+		return "<LayoutRegistry: {:d} layouts>".format(len(self.layouts))
+
+	def layout(self, _version=None):
+		"""
+			Returns the layout of a version, given by its name or
+			value. The default layout is returned if no version is
+			given.
+		"""
+		if (_version is None):
+			return self.default
+		value = self.version_slot.enum.value_of(_version)
+		if (value is None or not (0 <= value < len(self.table))):
+			raise Exception("Unknown VMF version '{}'.".format(_version))
+		return self.table[value]
+
+	def decode(self, _reader):
+		"""
+			Decodes a header with the layout of its version.
+
+			Args:
+				_reader: BitReader positioned at the start of the
+						header. A BitStream is also accepted, in
+						which case its position is moved past the
+						header.
+
+			Returns:
+				A HeaderValues object, whose layout is the one of
+				the version of the header.
+		"""
+		if (isinstance(_reader, BitReader)):
+			return self.table[_reader.peek(self.version_slot.size)].decode(_reader)
+		reader = BitReader.from_bits(_reader)
+		start = reader.pos
+		values = self.decode(reader)
+		_reader.pos += reader.pos - start
+		return values
+
+	def values_of(self, _values):
+		"""
+			Returns the slot values of a HeaderValues object in the
+			order of the slots of the registry. Fields which are not
+			defined by the layout of the header are None.
+		"""
+		mapping = self.layout_maps.get(_values.layout, False)
+		if (mapping is False):
+			mapping = self._mapping(_values.layout)
+		if (mapping is None):
+			return _values.values
+		return self._map_values(_values.values, mapping)
+
+	def _mapping(self, _layout):
+		"""
+			Returns the slot of each field of the registry in a
+			layout, or None if the layout defines all the fields in
+			the same order.
+		"""
+		mapping = tuple(_layout.slot_index[s.code].slot if s.code in _layout.slot_index else None
+			for s in self.slots)
+		if (mapping == tuple(range(len(_layout.slots)))):
+			return None
+		return mapping
+
+	def _map_values(self, _values, _mapping):
+		return [None if s is None else _values[s] for s in _mapping]
+
+	def value_at(self, _values, _slot, _idx):
+		"""
+			Returns the value of a field for the given instance of
+			its context. See HeaderLayout.value_at().
+		"""
+		return self.default.value_at(_values, _slot, _idx)
+
+	def _check_codes(self, _codes):
+		for code in _codes:
+			if (code not in self.slot_index):
+				raise Exception("Unknown field '{:s}'.".format(code))
+
+	def read_slots(self, _reader, _codes):
+		"""
+			Decodes some fields of a header with the layout of its
+			version. See HeaderLayout.read_slots().
+
+			Returns:
+				A list of the values of the slots of the registry, in
+				which only the requested fields are set. Fields which
+				are not defined by the layout of the header are None.
+		"""
+		self._check_codes(_codes)
+		if (isinstance(_reader, BitReader)):
+			version = _reader.peek(self.version_slot.size)
+		else:
+			version = BitReader.from_bits(_reader).read(self.version_slot.size)
+		layout = self.table[version]
+		mapping = self.maps[version]
+		if (mapping is None):
+			return layout.read_slots(_reader, _codes)
+		values = layout.read_slots(_reader, [c for c in _codes if c in layout.slot_index])
+		return self._map_values(values, mapping)
+
+	def read_fields(self, _reader, _codes):
+		"""
+			Decodes some fields of a header with the layout of its
+			version. See HeaderLayout.read_fields(). Fields which are
+			not defined by the layout of the header are None.
+		"""
+		self._check_codes(_codes)
+		if (isinstance(_reader, BitReader)):
+			layout = self.table[_reader.peek(self.version_slot.size)]
+		else:
+			layout = self.layout_of(_reader)
+		values = layout.read_fields(_reader, [c for c in _codes if c in layout.slot_index])
+		for code in _codes:
+			values.setdefault(code, None)
+		return values
+
+	def layout_of(self, _bits):
+		"""
+			Returns the layout of the header starting at the current
+			position of a bitstring object.
+		"""
+		return self.table[BitReader.from_bits(_bits).read(self.version_slot.size)]
+
+	def dump(self):
+		"""
+			Returns the registry as data which can be serialized
+			with marshal. See HeaderLayout.dump(). The compiled code
+			of the generated functions of each layout is included,
+			so that it is not generated again by other runs.
+		"""
+		layouts = dict((name, layout.dump()) for (name, layout) in self.layouts.items())
+		codes = dict((name, dict((f, layout.compile(f)) for f in GENERATED_FUNCTIONS))
+			for (name, layout) in self.layouts.items())
+		return (layouts, codes, self.names, self.default_name)
+
+	@classmethod
+	def load(cls, _data):
+		"""
+			Rebuilds a registry from the data returned by dump().
+		"""
+		(layouts, codes, names, default) = _data
+		return cls(dict((name, HeaderLayout.load(data, codes.get(name)))
+			for (name, data) in layouts.items()), names, default)
+
+# =============================================================================
+# Layout cache
+#
+def save_layouts(_registry, _filename, _key):
+	"""
+		Writes compiled layouts to a cache file. The file is
+		replaced at once, so that concurrent processes never read
+		a partial cache.
+
+		Args:
+			_registry: LayoutRegistry object to store.
+			_filename: Name of the cache file.
+			_key: String identifying the definitions the layouts
+					were compiled from.
+
+		Returns:
+			True if the cache was written. Errors are ignored, as
+			the layouts can be compiled again.
+	"""
+	data = marshal.dumps((LAYOUT_FORMAT, _key, _registry.dump()))
+	tmpname = "{:s}.{:d}.tmp".format(_filename, os.getpid())
+	try:
+		with open(tmpname, "wb") as f:
+			f.write(data)
+		os.rename(tmpname, _filename)
+	except (IOError, OSError):
+		try:
+			os.remove(tmpname)
+		except OSError:
+			pass
+		return False
+	return True
+
+def load_layouts(_filename, _key):
+	"""
+		Reads compiled layouts from a cache file.
+
+		Returns:
+			A LayoutRegistry object, or None if the file does not
+			exist, cannot be read or was written for other
+			definitions than _key.
+	"""
+	try:
+		with open(_filename, "rb") as f:
+			(version, key, data) = marshal.loads(f.read())
+		if (version != LAYOUT_FORMAT or key != _key):
+			return None
+		return LayoutRegistry.load(data)
+	except (IOError, EOFError, ValueError, TypeError, IndexError, KeyError):
+		return None
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import json
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from Codecs import NO_STATEMENT, dtg_codec
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+#
+# A template is a parameter file as written by the "save" command of
+# the shell, in which a value can be replaced by a directive expanding
+# to several values:
+#
+#   {"$range": [first, last]}            integers from first to last,
+#   {"$range": [first, last, step]}      inclusive, by step.
+#   {"$each": [value, ...]}              each value of the list.
+#   {"$dtg": {"start": DTG, "count": N,  N date time groups, every
+#             "step": seconds}}          "step" seconds (60 by default).
+#
+# Messages are generated for every combination of the expanded values,
+# the last parameter of the file varying first.
+RANGE_DIRECTIVE	= "$range"
+EACH_DIRECTIVE	= "$each"
+DTG_DIRECTIVE	= "$dtg"
+DEFAULT_DTG_STEP = 60
+#//////////////////////////////////////////////////////////
+
+def _range_values(_args):
+	if (not isinstance(_args, list) or len(_args) not in (2, 3)):
+		raise Exception("{:s} expects [first, last] or [first, last, step].".format(RANGE_DIRECTIVE))
+	(first, last) = (int(_args[0]), int(_args[1]))
+	step = int(_args[2]) if len(_args) == 3 else (1 if last >= first else -1)
+	if (step == 0 or (last - first) * step < 0):
+		raise Exception("Invalid {:s}: {}.".format(RANGE_DIRECTIVE, _args))
+	return lambda: xrange(first, last + (1 if step > 0 else -1), step)
+
+def _each_values(_args):
+	if (not isinstance(_args, list) or not _args):
+		raise Exception("{:s} expects a list of values.".format(EACH_DIRECTIVE))
+	values = tuple(_args)
+	return lambda: iter(values)
+
+def _dtg_values(_args):
+	if (not isinstance(_args, dict) or "start" not in _args or "count" not in _args):
+		raise Exception("{:s} expects {{\"start\": DTG, \"count\": N[, \"step\": seconds]}}.".format(DTG_DIRECTIVE))
+	(year, month, day, hour, minute, second, ext) = dtg_codec().parse(_args["start"])
+	count = int(_args["count"])
+	step = int(_args.get("step", DEFAULT_DTG_STEP))
+	seconds = (second != NO_STATEMENT) or (step % 60 != 0)
+	start = datetime(year, month, day, hour, minute, 0 if second == NO_STATEMENT else second)
+	delta = timedelta(seconds=step)
+	fmt = "%Y-%m-%d %H:%M:%S" if seconds else "%Y-%m-%d %H:%M"
+	suffix = " {:d}".format(ext) if ext is not None else ""
+	def values():
+		current = start
+		for i in xrange(count):
+			yield current.strftime(fmt) + suffix
+			current += delta
+	return values
+
+DIRECTIVES = {
+	RANGE_DIRECTIVE	: _range_values,
+	EACH_DIRECTIVE	: _each_values,
+	DTG_DIRECTIVE	: _dtg_values
+}
+
+# =============================================================================
+# Template Class
+#
+# Description:
+#   Parameter file whose values may expand to several values. The
+#   messages are generated lazily: only the current combination of
+#   values is held in memory, whatever the size of the product.
+#
+class Template(object):
+
+	def __init__(self, _params):
+		"""
+			Args:
+				_params: Dictionary of parameters and directives.
+						Use an OrderedDict to control which
+						parameters vary first.
+		"""
+		self.fixed = {}
+		# (parameter, function returning an iterator of values)
+		self.axes = []
+		for (param, value) in _params.items():
+			if (value is None):
+				continue
+			if (isinstance(value, dict) and len(value) == 1 and value.keys()[0] in DIRECTIVES):
+				(directive, args) = value.items()[0]
+				self.axes.append((param, DIRECTIVES[directive](args)))
+			else:
+				self.fixed[param] = value
+
+	@classmethod
+	def load(cls, _file):
+		"""
+			Loads a template from a file object or a path.
+		"""
+		if (isinstance(_file, basestring)):
+			with open(_file, "r") as f:
+				return cls(json.load(f, object_pairs_hook=OrderedDict))
+		return cls(json.load(_file, object_pairs_hook=OrderedDict))
+
+	def __len__(self):
+		count = 1
+		for (param, values) in self.axes:
+			count *= sum(1 for v in values())
+		return count
+
+	def __iter__(self):
+		return self.expand()
+
+	def expand(self):
+		"""
+			Generates the parameters of each message.
+
+			Returns:
+				A generator of dictionaries.
+		"""
+		spec = dict(self.fixed)
+		if (not self.axes):
+			yield dict(spec)
+			return
+		for item in self._expand(spec, 0):
+			yield item
+
+	def _expand(self, _spec, _axis):
+		(param, values) = self.axes[_axis]
+		last = (_axis == len(self.axes) - 1)
+		for value in values():
+			_spec[param] = value
+			if (last):
+				yield dict(_spec)
+			else:
+				for item in self._expand(_spec, _axis + 1):
+					yield item
@@ -39,12 +39,7 @@ __version__ = '.'.join(__version_info__)
 # Imports Statements
 import re
 import sys
-import json
-import argparse
-import traceback
-from Factory import *
 from Logger import *
-from bitstring import *
 #//////////////////////////////////////////////////////////
 
 
@@ -237,7 +232,7 @@ class Params:
 			},
 	  "secparam"       	: {
 			"cmd"       : "secparam",
-			"choices"   : ['auth', 'undef'],
+			"choices"   : [],
 			"help"      : """Indicate the identities of the parameters and algorithms that enable security processing."""			
 			},		
 	  "keymatlen"       	: {
@@ -311,340 +306,480 @@ class Params:
 #//////////////////////////////////////////////////////////////////////////////
 # Argument Parser Declaration
 #
-usage = "%(prog)s [options] data"
-parser = argparse.ArgumentParser(usage=usage,
-    prog="vmfcat",
-    version="%(prog)s "+__version__,
-    description="Allows crafting of Variable Message Format (VMF) messages.")
-
-io_options = parser.add_argument_group(
-    "Input/Output Options", "Types of I/O supported.")
-io_options.add_argument("-d", "--debug",
-    dest=Params.parameters['debug']['cmd'],
-    action="store_true",
-    help=Params.parameters['debug']['help'])
-io_options.add_argument("-i", "--interactive",
-    dest="interactive",
-    action="store_true",
-    help="Create and send VMF messages interactively.")
-io_options.add_argument("-of", "--ofile",
-    dest="outputfile",
-    nargs="?",
-    type=argparse.FileType('w'),
-        default=sys.stdout,
-        help="File to output the results. STDOUT by default.")
-io_options.add_argument("--data",
-    dest=Params.parameters['data']['cmd'],
-    help=Params.parameters['data']['help'])
-# =============================================================================
-# Application Header Arguments
-header_options = parser.add_argument_group(
-    "Application Header", "Flags and Fields of the application header.")
-header_options.add_argument("--vmf-version",
-    dest=Params.parameters["vmfversion"]["cmd"],
-    action="store",
-    choices=Params.parameters["vmfversion"]["choices"],
-        default="std47001c",
-        help=Params.parameters["vmfversion"]["help"])
-header_options.add_argument("--compress",
-    dest=Params.parameters["compress"]["cmd"],
-    action="store",
-    choices=Params.parameters["compress"]["choices"],
-    help=Params.parameters["compress"]["help"])
-header_options.add_argument("--header-size",
-    dest=Params.parameters["headersize"]["cmd"],
-    action="store",
-    type=int,
-    help=Params.parameters["headersize"]["help"])
+# The parser declares every option of the header and is only built
+# when the command line is parsed, so that importing this module
+# stays cheap.
+_parser = None
 
-# =============================================================================
-# Originator Address Group Arguments
-orig_addr_options = parser.add_argument_group(
-    "Originator Address Group", "Fields of the originator address group.")
-orig_addr_options.add_argument("--orig-urn",
-    dest=Params.parameters["originator_urn"]["cmd"],
-    metavar="URN",
-    type=int,
-    action="store",
-    help=Params.parameters["originator_urn"]["help"])
-orig_addr_options.add_argument("--orig-unit",
-    dest=Params.parameters["originator_unitname"]["cmd"],
-    metavar="STRING",
-    action="store",
-    help=Params.parameters["originator_unitname"]["help"])
-# =============================================================================
+def build_parser():
+	"""
+		Returns the parser of the command line arguments. The parser
+		is built on the first call only.
 
-# =============================================================================
-# Recipient Address Group Arguments
-recp_addr_options = parser.add_argument_group(
-    "Recipient Address Group", "Fields of the recipient address group.")
-recp_addr_options.add_argument("--rcpt-urns",
-    nargs="+",
-    dest=Params.parameters['rcpt_urns']['cmd'],
-    metavar="URNs",
-    help=Params.parameters['rcpt_urns']['help'])
-recp_addr_options.add_argument("--rcpt-unitnames",
-    nargs="+",
-    dest=Params.parameters['rcpt_unitnames']['cmd'],
-    metavar="UNITNAMES",
-    help=Params.parameters['rcpt_unitnames']['help'])
-# =============================================================================
+		The defaults of the analysis, index and ingest options are
+		left to their modules, which are only imported by the mode
+		using them.
+	"""
+	global _parser
+	if (_parser is not None):
+		return _parser
+	import argparse
+	from Constants import FRAMINGS, FRAMING_LENGTH, DEFAULT_CHUNK_SIZE, OUTPUT_FORMATS
+
+	usage = "%(prog)s [options] data"
+	parser = argparse.ArgumentParser(usage=usage,
+	    prog="vmfcat",
+	    version="%(prog)s "+__version__,
+	    description="Allows crafting of Variable Message Format (VMF) messages.")
+
+	io_options = parser.add_argument_group(
+	    "Input/Output Options", "Types of I/O supported.")
+	io_options.add_argument("-d", "--debug",
+	    dest=Params.parameters['debug']['cmd'],
+	    action="store_true",
+	    help=Params.parameters['debug']['help'])
+	io_options.add_argument("-i", "--interactive",
+	    dest="interactive",
+	    action="store_true",
+	    help="Create and send VMF messages interactively.")
+	io_options.add_argument("-of", "--ofile",
+	    dest="outputfile",
+	    nargs="?",
+	    type=argparse.FileType('w'),
+	        default=sys.stdout,
+	        help="File to output the results. STDOUT by default.")
+	io_options.add_argument("--data",
+	    dest=Params.parameters['data']['cmd'],
+	    help=Params.parameters['data']['help'])
+	io_options.add_argument("-b", "--batch",
+	    dest="batch",
+	    type=argparse.FileType('r'),
+	    metavar="SPECFILE",
+	    help="Encode the messages described in a file, one JSON object per line, using the parameter names as keys. Use - for STDIN. Options given on the command line apply to all messages.")
+	io_options.add_argument("-t", "--template",
+	    dest="template",
+	    type=argparse.FileType('r'),
+	    metavar="TEMPLATEFILE",
+	    help="Encode every combination of the values of a parameter file saved by the shell, in which values may be replaced by {\"$range\": [first, last, step]}, {\"$each\": [...]} or {\"$dtg\": {\"start\": DTG, \"count\": N, \"step\": seconds}}.")
+	io_options.add_argument("--from-csv",
+	    dest="fromcsv",
+	    type=argparse.FileType('r'),
+	    metavar="CSVFILE",
+	    help="Encode a message for each row of a CSV file whose first row contains parameter names. Values of repeated fields are separated by semicolons.")
+	io_options.add_argument("--from-sqlite",
+	    dest="fromsqlite",
+	    metavar="DATABASE",
+	    help="Encode a message for each row returned by --sql on a SQLite database.")
+	io_options.add_argument("--sql",
+	    dest="sql",
+	    metavar="QUERY",
+	    help="Query selecting the rows of --from-sqlite. Defaults to \"SELECT * FROM messages\".")
+	io_options.add_argument("--map",
+	    dest="mapping",
+	    nargs="+",
+	    metavar="COLUMN=PARAMETER",
+	    help="Parameters set by the columns of --from-csv and --from-sqlite, when the columns are not named after them.")
+	io_options.add_argument("--framing",
+	    dest="framing",
+	    choices=FRAMINGS,
+	    default=FRAMING_LENGTH,
+	    help="Framing of the headers written to the output file: prefixed by their 32-bit length, concatenated, one hexadecimal line per header or in an indexed container. Defaults to length.")
+	io_options.add_argument("-j", "--workers",
+	    dest="workers",
+	    type=int,
+	    default=1,
+	    help="Number of processes encoding a batch. Use 0 for one process per processor. Defaults to 1.")
+	io_options.add_argument("--chunk-size",
+	    dest="chunksize",
+	    type=int,
+	    default=DEFAULT_CHUNK_SIZE,
+	    help="Number of messages of a batch sent at once to each process. Defaults to {:d}.".format(DEFAULT_CHUNK_SIZE))
+	io_options.add_argument("-a", "--analyze",
+	    dest="analyze",
+	    metavar="CAPTUREFILE",
+	    help="Count the values of some fields in a capture file of length-prefixed headers. The counts are written to the output file as JSON.")
+	io_options.add_argument("--count",
+	    dest="countfields",
+	    nargs="+",
+	    metavar="FIELD",
+	    help="Fields counted by --analyze. Defaults to fad, msgnumber, msgprecedence, originator_urn.")
+	io_options.add_argument("--decode",
+	    dest="decode",
+	    metavar="CAPTUREFILE",
+	    help="Read the headers of a capture file or container written with --framing, and copy those matching --where to the output file.")
+	io_options.add_argument("--fields",
+	    dest="fields",
+	    nargs="+",
+	    metavar="FIELD",
+	    help="Fields written by --decode, one row per header. All the fields by default when --format is given.")
+	io_options.add_argument("--format",
+	    dest="format",
+	    choices=OUTPUT_FORMATS,
+	    help="Format of the rows written by --decode. Defaults to jsonl when --fields is given, otherwise the headers are copied.")
+	io_options.add_argument("--sqlite",
+	    dest="sqlite",
+	    metavar="DATABASE",
+	    help="Load the headers read by --decode into a SQLite database instead of writing them to the output file.")
+	io_options.add_argument("-w", "--where",
+	    dest="where",
+	    metavar="EXPRESSION",
+	    help="Only output messages matching an expression over header fields, e.g. \"fad == firesp and msgprecedence >= flash\". Applies to --batch and --decode.")
+	io_options.add_argument("--build-index",
+	    dest="buildindex",
+	    metavar="CONTAINER",
+	    help="Index the records of a container by fad, msgnumber, originator_urn, rcpt_urns, originatordtg. The index is written next to the container.")
+	io_options.add_argument("--schema-cache",
+	    dest="schemacache",
+	    metavar="CACHEFILE",
+	    help="Read the compiled header layout from a file, which is written when missing or outdated. Defaults to the file named by the VMFCAT_SCHEMA_CACHE environment variable.")
+	io_options.add_argument("--schema",
+	    dest="schema",
+	    metavar="SCHEMAFILE",
+	    type=argparse.FileType('r'),
+	    help="Read the header definition from a JSON schema file. The header is used by the versions listed in the file, or by all the versions.")
+	io_options.add_argument("--dump-schema",
+	    dest="dumpschema",
+	    action="store_true",
+	    help="Write the header definition as a JSON schema file and exit. Writes the definition read with --schema if provided.")
+	# =============================================================================
+	# Application Header Arguments
+	header_options = parser.add_argument_group(
+	    "Application Header", "Flags and Fields of the application header.")
+	header_options.add_argument("--vmf-version",
+	    dest=Params.parameters["vmfversion"]["cmd"],
+	    action="store",
+	    choices=Params.parameters["vmfversion"]["choices"],
+	        default="std47001c",
+	        help=Params.parameters["vmfversion"]["help"])
+	header_options.add_argument("--compress",
+	    dest=Params.parameters["compress"]["cmd"],
+	    action="store",
+	    choices=Params.parameters["compress"]["choices"],
+	    help=Params.parameters["compress"]["help"])
+	header_options.add_argument("--header-size",
+	    dest=Params.parameters["headersize"]["cmd"],
+	    action="store",
+	    type=int,
+	    help=Params.parameters["headersize"]["help"])
+	header_options.add_argument("--set",
+	    dest="assignments",
+	    metavar="FIELD=VALUE",
+	    nargs="+",
+	    help="Set header fields by code, including the fields added by a schema file. Values of repeated fields are separated by ';'.")
+
+	# =============================================================================
+	# Originator Address Group Arguments
+	orig_addr_options = parser.add_argument_group(
+	    "Originator Address Group", "Fields of the originator address group.")
+	orig_addr_options.add_argument("--orig-urn",
+	    dest=Params.parameters["originator_urn"]["cmd"],
+	    metavar="URN",
+	    type=int,
+	    action="store",
+	    help=Params.parameters["originator_urn"]["help"])
+	orig_addr_options.add_argument("--orig-unit",
+	    dest=Params.parameters["originator_unitname"]["cmd"],
+	    metavar="STRING",
+	    action="store",
+	    help=Params.parameters["originator_unitname"]["help"])
+	# =============================================================================
+
+	# =============================================================================
+	# Recipient Address Group Arguments
+	recp_addr_options = parser.add_argument_group(
+	    "Recipient Address Group", "Fields of the recipient address group.")
+	recp_addr_options.add_argument("--rcpt-urns",
+	    nargs="+",
+	    dest=Params.parameters['rcpt_urns']['cmd'],
+	    metavar="URNs",
+	    help=Params.parameters['rcpt_urns']['help'])
+	recp_addr_options.add_argument("--rcpt-unitnames",
+	    nargs="+",
+	    dest=Params.parameters['rcpt_unitnames']['cmd'],
+	    metavar="UNITNAMES",
+	    help=Params.parameters['rcpt_unitnames']['help'])
+	# =============================================================================
+
+	# =============================================================================
+	# Information Address Group Arguments
+	info_addr_options = parser.add_argument_group(
+	    "Information Address Group", "Fields of the information address group.")
+	info_addr_options.add_argument("--info-urns",
+	    dest=Params.parameters["info_urns"]["cmd"],
+	    metavar="URNs",
+	    nargs="+",
+	    action="store",
+	    help=Params.parameters["info_urns"]["help"])
+	info_addr_options.add_argument("--info-units",
+	    dest="info_unitnames",
+	    metavar="UNITNAMES",
+	    action="store",
+	    help="Specify the name of the unit of the reference message.")
+	# =============================================================================
+
+	# =============================================================================
+	# Message Handling Group Arguments
+	msg_handling_options = parser.add_argument_group(
+	    "Message Handling Group", "Fields of the message handling group.")
+	msg_handling_options.add_argument("--umf",
+	    dest=Params.parameters["umf"]["cmd"],
+	    action="store",
+	    choices=Params.parameters["umf"]["choices"],
+	    help=Params.parameters["umf"]["help"])
+	msg_handling_options.add_argument("--msg-version",
+	    dest=Params.parameters["messagevers"]["cmd"],
+	    action="store",
+	    metavar="VERSION",
+	    type=int,
+	    help=Params.parameters["messagevers"]["help"])
+	msg_handling_options.add_argument("--fad",
+	    dest=Params.parameters["fad"]["cmd"],
+	    action="store",
+	    choices=Params.parameters["fad"]["choices"],
+	    help=Params.parameters["fad"]["help"])
+	msg_handling_options.add_argument("--msg-number",
+	    dest=Params.parameters["msgnumber"]["cmd"],
+	    action="store",
+	    type=int,
+	    metavar="1-127",
+	    help=Params.parameters["msgnumber"]["help"])
+	msg_handling_options.add_argument("--msg-subtype",
+	    dest=Params.parameters["msgsubtype"]["cmd"],
+	    action="store",
+	    type=int,
+	    metavar="1-127",
+	    help=Params.parameters["msgsubtype"]["help"])
+	msg_handling_options.add_argument("--filename",
+	    dest=Params.parameters["filename"]["cmd"],
+	    action="store",
+	    help=Params.parameters["filename"]["help"])
+	msg_handling_options.add_argument("--msg-size",
+	    dest=Params.parameters["msgsize"]["cmd"],
+	    action="store",
+	    type=int,
+	    metavar="SIZE",
+	    help=Params.parameters["msgsize"]["help"])
+
+	msg_handling_options.add_argument("--opind",
+	    dest=Params.parameters["opind"]["cmd"],
+	    action="store",
+	    choices=Params.parameters["opind"]["choices"],
+	    help=Params.parameters["opind"]["help"])
+
+	msg_handling_options.add_argument("--retrans",
+	    dest=Params.parameters["retransmission"]["cmd"],
+	    action="store_true",
+	    help=Params.parameters["retransmission"]["help"])
+
+	msg_handling_options.add_argument("--msg-prec",
+	    dest=Params.parameters["msgprecedence"]["cmd"],
+	    action="store",
+	    choices=Params.parameters["msgprecedence"]["choices"],
+	    help=Params.parameters["msgprecedence"]["help"])
+
+	msg_handling_options.add_argument("--class",
+	    dest=Params.parameters["classification"]["cmd"],
+	    action="store",
+	    nargs="+",
+	    choices=Params.parameters["classification"]["choices"],
+	    help=Params.parameters["classification"]["cmd"])
+
+	msg_handling_options.add_argument("--release",
+	    dest=Params.parameters["releasemark"]["cmd"],
+	    action="store",
+	    nargs="+",
+	    type=int,
+	    metavar="COUNTRIES",
+	    help=Params.parameters["releasemark"]["help"])
+
+	msg_handling_options.add_argument("--orig-dtg",
+	    dest=Params.parameters["originatordtg"]["cmd"],
+	    action="store",
+	    metavar="YYYY-MM-DD HH:mm[:ss] [extension]",
+	    help=Params.parameters["originatordtg"]["cmd"])
+	msg_handling_options.add_argument("--perish-dtg",
+	    dest=Params.parameters["perishdtg"]["cmd"],
+	    action="store",
+	    metavar="YYYY-MM-DD HH:mm[:ss]",
+	    help=Params.parameters["perishdtg"]["cmd"])
+
+	# =====================================================================================
+
+	# =====================================================================================
+	# Acknowledge Request Group Arguments
+	ack_options = parser.add_argument_group(
+	    "Acknowledgement Request Group", "Options to request acknowledgement and replies.")
+	ack_options.add_argument("--ack-machine",
+	    dest=Params.parameters["ackmachine"]["cmd"],
+	    action="store_true",
+	    help=Params.parameters["ackmachine"]["help"])
+	ack_options.add_argument("--ack-op",
+	     dest=Params.parameters["ackop"]["cmd"],
+	    action="store_true",
+	    help=Params.parameters["ackop"]["help"])
+	ack_options.add_argument("--reply",
+	    dest=Params.parameters["reply"]["cmd"],
+	    action="store_true",
+	    help=Params.parameters["reply"]["help"])
+	# =====================================================================================
+
+	# =====================================================================================
+	# Response Data Group Arguments
+	#
+	resp_options = parser.add_argument_group(
+	    "Response Data Options", "Fields for the response data group.")
+	resp_options.add_argument("--ack-dtg", 
+		dest=Params.parameters["ackdtg"]["cmd"],
+		help=Params.parameters["ackdtg"]["help"],
+	    action="store", 
+	    metavar="YYYY-MM-DD HH:mm[:ss] [extension]")
+	resp_options.add_argument("--rc",
+		dest=Params.parameters["rc"]["cmd"],
+	    help=Params.parameters["rc"]["help"],
+		choices=Params.parameters["rc"]["choices"],
+	    action="store")
+	resp_options.add_argument("--cantpro",
+		dest=Params.parameters["cantpro"]["cmd"],
+		help=Params.parameters["cantpro"]["help"],
+	    action="store",
+	    type=int,
+	    metavar="1-32")
+	resp_options.add_argument("--cantco", 
+		dest=Params.parameters["cantco"]["cmd"],
+	    help=Params.parameters["cantco"]["help"],
+		choices=Params.parameters["cantco"]["choices"],
+		action="store")
+	resp_options.add_argument("--reply-amp", 
+		dest=Params.parameters["replyamp"]["cmd"],
+	    help=Params.parameters["replyamp"]["help"],
+	    action="store")
+
+	# =====================================================================================
+
+
+	# =====================================================================================
+	# Reference Message Data Group Arguments
+	#
+	ref_msg_options = parser.add_argument_group(
+	    "Reference Message Data Group", "Fields of the reference message data group.")
+	ref_msg_options.add_argument("--ref-urn",
+		dest=Params.parameters["ref_urn"]["cmd"],
+	    help=Params.parameters["ref_urn"]["help"],
+	    metavar="URN",
+	    action="store")
+	ref_msg_options.add_argument("--ref-unit", 
+		dest=Params.parameters["ref_unitname"]["cmd"],
+	    help=Params.parameters["ref_unitname"]["help"],
+	    metavar="STRING",
+	    action="store")
+	ref_msg_options.add_argument("--ref-dtg", 
+		dest=Params.parameters["refdtg"]["cmd"],
+	    help=Params.parameters["refdtg"]["help"],
+	    action="store", 
+	    metavar="YYYY-MM-DD HH:mm[:ss] [extension]")
+	# =====================================================================================
+
+
+	# =====================================================================================
+	# Message Security Data Group Arguments
+	#
+	msg_sec_grp = parser.add_argument_group(
+	    "Message Security Group", "Fields of the message security group.")
+	msg_sec_grp.add_argument("--sec-param",
+	 	dest=Params.parameters["secparam"]["cmd"],
+	    help=Params.parameters["secparam"]["help"],
+	    action="store",
+	    type=int)
+	msg_sec_grp.add_argument("--keymat-len",
+	 	dest=Params.parameters["keymatlen"]["cmd"],
+	    help=Params.parameters["keymatlen"]["help"],
+	    action="store", 
+	    type=int)	
+	msg_sec_grp.add_argument("--keymat-id", 
+	 	dest=Params.parameters["keymatid"]["cmd"],
+	    help=Params.parameters["keymatid"]["help"],
+	    action="store", 
+	    type=int)
+	msg_sec_grp.add_argument("--crypto-init-len", 
+	 	dest=Params.parameters["crypto_init_len"]["cmd"],
+	    help=Params.parameters["crypto_init_len"]["help"],
+	    action="store", 
+	    type=int)
+	msg_sec_grp.add_argument("--crypto-init", 
+		dest=Params.parameters["crypto_init"]["cmd"],
+	    help=Params.parameters["crypto_init"]["help"],
+	    action="store", 
+	    type=int)
+	msg_sec_grp.add_argument("--keytok-len", 
+		dest=Params.parameters["keytok_len"]["cmd"],
+	    help=Params.parameters["keytok_len"]["help"],
+	    action="store", 
+	    type=int)
+	msg_sec_grp.add_argument("--keytok", 
+		dest=Params.parameters["keytok"]["cmd"],
+	    help=Params.parameters["keytok"]["help"],
+	    action="store", 
+	    type=int)	
+	msg_sec_grp.add_argument("--autha-len", 
+		dest=Params.parameters["autha-len"]["cmd"],
+	    help=Params.parameters["autha-len"]["help"],
+	    action="store", 
+	    type=int, 
+	    metavar="LENGTH")
+	msg_sec_grp.add_argument("--authb-len",
+		dest=Params.parameters["authb-len"]["cmd"],
+	    help=Params.parameters["authb-len"]["help"],
+	    action="store",
+	    type=int,
+	    metavar="LENGTH")
+	msg_sec_grp.add_argument("--autha", 
+		dest=Params.parameters["autha"]["cmd"],
+	    help=Params.parameters["autha"]["help"],
+	    action="store", 
+	    type=int)
+	msg_sec_grp.add_argument("--authb", 
+		dest=Params.parameters["authb"]["cmd"],
+	    help=Params.parameters["authb"]["help"],
+	    action="store", 
+	    type=int)
+	msg_sec_grp.add_argument("--ack-signed", 
+		dest=Params.parameters["acksigned"]["cmd"],
+	    help=Params.parameters["acksigned"]["help"],
+	    action="store_true")
+	msg_sec_grp.add_argument("--pad-len",
+		dest=Params.parameters["pad_len"]["cmd"],
+	    help=Params.parameters["pad_len"]["help"],
+	    action="store", 
+		type=int,
+	    metavar="LENGTH")
+	msg_sec_grp.add_argument("--padding",
+		dest=Params.parameters["padding"]["cmd"],
+	    help=Params.parameters["padding"]["help"],
+	    action="store",
+	    type=int)
+	_parser = parser
+	return parser
+
+def parse_arguments(_args=None, _namespace=Params):
+	"""
+		Parses the command line arguments. Combinations of options
+		which cannot be used together are reported by the parser.
 
-# =============================================================================
-# Information Address Group Arguments
-info_addr_options = parser.add_argument_group(
-    "Information Address Group", "Fields of the information address group.")
-info_addr_options.add_argument("--info-urns",
-    dest=Params.parameters["info_urns"]["cmd"],
-    metavar="URNs",
-    nargs="+",
-    action="store",
-    help=Params.parameters["info_urns"]["help"])
-info_addr_options.add_argument("--info-units",
-    dest="info_unitnames",
-    metavar="UNITNAMES",
-    action="store",
-    help="Specify the name of the unit of the reference message.")
-# =============================================================================
+		Args:
+			_args: List of the arguments. Defaults to sys.argv.
+			_namespace: Object receiving the values of the options.
+
+		Returns:
+			The namespace holding the values of the options.
+	"""
+	parser = build_parser()
+	args = parser.parse_args(_args, _namespace)
+	from Constants import FRAMING_HEX
+	if (args.decode and args.framing == FRAMING_HEX):
+		# Captures and containers are binary files
+		parser.error("argument --framing: '{:s}' cannot be used with --decode.".format(FRAMING_HEX))
+	return args
 
-# =============================================================================
-# Message Handling Group Arguments
-msg_handling_options = parser.add_argument_group(
-    "Message Handling Group", "Fields of the message handling group.")
-msg_handling_options.add_argument("--umf",
-    dest=Params.parameters["umf"]["cmd"],
-    action="store",
-    choices=Params.parameters["umf"]["choices"],
-    help=Params.parameters["umf"]["help"])
-msg_handling_options.add_argument("--msg-version",
-    dest=Params.parameters["messagevers"]["cmd"],
-    action="store",
-    metavar="VERSION",
-    type=int,
-    help=Params.parameters["messagevers"]["help"])
-msg_handling_options.add_argument("--fad",
-    dest=Params.parameters["fad"]["cmd"],
-    action="store",
-    choices=Params.parameters["fad"]["choices"],
-    help=Params.parameters["fad"]["help"])
-msg_handling_options.add_argument("--msg-number",
-    dest=Params.parameters["msgnumber"]["cmd"],
-    action="store",
-    type=int,
-    metavar="1-127",
-    help=Params.parameters["msgnumber"]["help"])
-msg_handling_options.add_argument("--msg-subtype",
-    dest=Params.parameters["msgsubtype"]["cmd"],
-    action="store",
-    type=int,
-    metavar="1-127",
-    help=Params.parameters["msgsubtype"]["help"])
-msg_handling_options.add_argument("--filename",
-    dest=Params.parameters["filename"]["cmd"],
-    action="store",
-    help=Params.parameters["filename"]["help"])
-msg_handling_options.add_argument("--msg-size",
-    dest=Params.parameters["msgsize"]["cmd"],
-    action="store",
-    type=int,
-    metavar="SIZE",
-    help=Params.parameters["msgsize"]["help"])
-
-msg_handling_options.add_argument("--opind",
-    dest=Params.parameters["opind"]["cmd"],
-    action="store",
-    choices=Params.parameters["opind"]["choices"],
-    help=Params.parameters["opind"]["help"])
-
-msg_handling_options.add_argument("--retrans",
-    dest=Params.parameters["retransmission"]["cmd"],
-    action="store_true",
-    help=Params.parameters["retransmission"]["help"])
-
-msg_handling_options.add_argument("--msg-prec",
-    dest=Params.parameters["msgprecedence"]["cmd"],
-    action="store",
-    choices=Params.parameters["msgprecedence"]["choices"],
-    help=Params.parameters["msgprecedence"]["help"])
-
-msg_handling_options.add_argument("--class",
-    dest=Params.parameters["classification"]["cmd"],
-    action="store",
-    nargs="+",
-    choices=Params.parameters["classification"]["choices"],
-    help=Params.parameters["classification"]["cmd"])
-
-msg_handling_options.add_argument("--release",
-    dest=Params.parameters["releasemark"]["cmd"],
-    action="store",
-    metavar="COUNTRIES",
-    help=Params.parameters["releasemark"]["help"])
-
-msg_handling_options.add_argument("--orig-dtg",
-    dest=Params.parameters["originatordtg"]["cmd"],
-    action="store",
-    metavar="YYYY-MM-DD HH:mm[:ss] [extension]",
-    help=Params.parameters["originatordtg"]["cmd"])
-msg_handling_options.add_argument("--perish-dtg",
-    dest=Params.parameters["perishdtg"]["cmd"],
-    action="store",
-    metavar="YYYY-MM-DD HH:mm[:ss]",
-    help=Params.parameters["perishdtg"]["cmd"])
-
-# =====================================================================================
-
-# =====================================================================================
-# Acknowledge Request Group Arguments
-ack_options = parser.add_argument_group(
-    "Acknowledgement Request Group", "Options to request acknowledgement and replies.")
-ack_options.add_argument("--ack-machine",
-    dest=Params.parameters["ackmachine"]["cmd"],
-    action="store_true",
-    help=Params.parameters["ackmachine"]["help"])
-ack_options.add_argument("--ack-op",
-     dest=Params.parameters["ackop"]["cmd"],
-    action="store_true",
-    help=Params.parameters["ackop"]["help"])
-ack_options.add_argument("--reply",
-    dest=Params.parameters["reply"]["cmd"],
-    action="store_true",
-    help=Params.parameters["reply"]["help"])
-# =====================================================================================
-
-# =====================================================================================
-# Response Data Group Arguments
-#
-resp_options = parser.add_argument_group(
-    "Response Data Options", "Fields for the response data group.")
-resp_options.add_argument("--ack-dtg", 
-	dest=Params.parameters["ackdtg"]["cmd"],
-	help=Params.parameters["ackdtg"]["help"],
-    action="store", 
-    metavar="YYYY-MM-DD HH:mm[:ss] [extension]")
-resp_options.add_argument("--rc",
-	dest=Params.parameters["rc"]["cmd"],
-    help=Params.parameters["rc"]["help"],
-	choices=Params.parameters["rc"]["choices"],
-    action="store")
-resp_options.add_argument("--cantpro",
-	dest=Params.parameters["cantpro"]["cmd"],
-	help=Params.parameters["cantpro"]["help"],
-    action="store",
-    type=int,
-    metavar="1-32")
-resp_options.add_argument("--cantco", 
-	dest=Params.parameters["cantco"]["cmd"],
-    help=Params.parameters["cantco"]["help"],
-	choices=Params.parameters["cantco"]["choices"],
-	action="store")
-resp_options.add_argument("--reply-amp", 
-	dest=Params.parameters["replyamp"]["cmd"],
-    help=Params.parameters["replyamp"]["help"],
-    action="store")
-
-# =====================================================================================
-
-
-# =====================================================================================
-# Reference Message Data Group Arguments
-#
-ref_msg_options = parser.add_argument_group(
-    "Reference Message Data Group", "Fields of the reference message data group.")
-ref_msg_options.add_argument("--ref-urn",
-	dest=Params.parameters["ref_urn"]["cmd"],
-    help=Params.parameters["ref_urn"]["help"],
-    metavar="URN",
-    action="store")
-ref_msg_options.add_argument("--ref-unit", 
-	dest=Params.parameters["ref_unitname"]["cmd"],
-    help=Params.parameters["ref_unitname"]["help"],
-    metavar="STRING",
-    action="store")
-ref_msg_options.add_argument("--ref-dtg", 
-	dest=Params.parameters["refdtg"]["cmd"],
-    help=Params.parameters["refdtg"]["help"],
-    action="store", 
-    metavar="YYYY-MM-DD HH:mm[:ss] [extension]")
-# =====================================================================================
-
-
-# =====================================================================================
-# Message Security Data Group Arguments
-#
-msg_sec_grp = parser.add_argument_group(
-    "Message Security Group", "Fields of the message security group.")
-msg_sec_grp.add_argument("--sec-param",
- 	dest=Params.parameters["secparam"]["cmd"],
-    help=Params.parameters["secparam"]["help"],
-	choices=Params.parameters["secparam"]["choices"],
-    action="store")
-msg_sec_grp.add_argument("--keymat-len",
- 	dest=Params.parameters["keymatlen"]["cmd"],
-    help=Params.parameters["keymatlen"]["help"],
-    action="store", 
-    type=int)	
-msg_sec_grp.add_argument("--keymat-id", 
- 	dest=Params.parameters["keymatid"]["cmd"],
-    help=Params.parameters["keymatid"]["help"],
-    action="store", 
-    type=int)
-msg_sec_grp.add_argument("--crypto-init-len", 
- 	dest=Params.parameters["crypto_init_len"]["cmd"],
-    help=Params.parameters["crypto_init_len"]["help"],
-    action="store", 
-    type=int)
-msg_sec_grp.add_argument("--crypto-init", 
-	dest=Params.parameters["crypto_init"]["cmd"],
-    help=Params.parameters["crypto_init"]["help"],
-    action="store", 
-    type=int)
-msg_sec_grp.add_argument("--keytok-len", 
-	dest=Params.parameters["keytok_len"]["cmd"],
-    help=Params.parameters["keytok_len"]["help"],
-    action="store", 
-    type=int)
-msg_sec_grp.add_argument("--keytok", 
-	dest=Params.parameters["keytok"]["cmd"],
-    help=Params.parameters["keytok"]["help"],
-    action="store", 
-    type=int)	
-msg_sec_grp.add_argument("--autha-len", 
-	dest=Params.parameters["autha-len"]["cmd"],
-    help=Params.parameters["autha-len"]["help"],
-    action="store", 
-    type=int, 
-    metavar="LENGTH")
-msg_sec_grp.add_argument("--authb-len",
-	dest=Params.parameters["authb-len"]["cmd"],
-    help=Params.parameters["authb-len"]["help"],
-    action="store",
-    type=int,
-    metavar="LENGTH")
-msg_sec_grp.add_argument("--autha", 
-	dest=Params.parameters["autha"]["cmd"],
-    help=Params.parameters["autha"]["help"],
-    action="store", 
-    type=int)
-msg_sec_grp.add_argument("--authb", 
-	dest=Params.parameters["authb"]["cmd"],
-    help=Params.parameters["authb"]["help"],
-    action="store", 
-    type=int)
-msg_sec_grp.add_argument("--ack-signed", 
-	dest=Params.parameters["acksigned"]["cmd"],
-    help=Params.parameters["acksigned"]["help"],
-    action="store_true")
-msg_sec_grp.add_argument("--pad-len",
-	dest=Params.parameters["pad_len"]["cmd"],
-    help=Params.parameters["pad_len"]["help"],
-    action="store", 
-	type=int,
-    metavar="LENGTH")
-msg_sec_grp.add_argument("--padding",
-	dest=Params.parameters["padding"]["cmd"],
-    help=Params.parameters["padding"]["help"],
-    action="store",
-    type=int)
 # =============================================================================
 #//////////////////////////////////////////////////////////////////////////////
 
@@ -676,7 +811,13 @@ class VmfShell(object):
 		"""
 			Starts the main loop of the interactive shell.
 		"""
-		
+		# The message classes are only loaded by the shell, not
+		# when the module is imported by the command line tool.
+		import json
+		import traceback
+		from Factory import Factory
+		from bitstring import BitStream
+
 		# Command entered by the user
 		cmd = ""
 		self.logger.print_info("Type 'help' to show a list of available commands.")
@@ -766,16 +907,16 @@ class VmfShell(object):
 					
 					vmf_factory = Factory(_logger=self.logger)
 					vmf_message = vmf_factory.new_message(Params)
-					vmf_elem = vmf_message.header.elements[field]
+					vmf_layout = vmf_message.layout
 
-					if (isinstance(vmf_elem, Field)):
-						vmf_value = vmf_elem.value
-					elif (isinstance(vmf_elem, Group)):
+					if (field in vmf_layout.slot_index):
+						vmf_value = vmf_message.values[field]
+					elif (field in vmf_layout.group_index):
 						vmf_value = "n/a"
 					else:
 						raise Exception("Unknown type for element '{:s}'.".format(field))
 
-					vmf_bits = vmf_elem.get_bit_array()
+					vmf_bits = vmf_layout.encode(vmf_message.values, field)
 					output = vmf_bits
 
 					if (fmt == "bin"):
@@ -810,10 +951,11 @@ class VmfShell(object):
 						vmf_params = tokens[1]
 					else:
 						vmf_params = '0x4023'
-					s = BitStream(vmf_params)
-					bstream = BitStream('0x4023')
+					bstream = BitStream(vmf_params)
 					vmf_factory = Factory(_logger=self.logger)
-					vmf_message = vmf_factory.read_message(bstream)					
+					vmf_message = vmf_factory.read_message(bstream)
+					for (field, value) in vmf_message.values.items():
+						self.logger.print_success("{}\t{}".format(field, value))
 				elif (cmd.lower() == VmfShell.CMD_LOAD):
 					if len(tokens) == 2:
 						file = tokens[1]
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import sys
+import time
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from Bits import BitWriter, BitReader, DEFAULT_CAPACITY
+from Message import header_layout
+from Schema import GENERATED_FUNCTIONS
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Headers timed, from a minimal header to one using repeatable
+# groups, strings and date time groups.
+HEADERS = (
+	("minimal", {"fad": "firesp", "msgnumber": 12}),
+	("addressed", {"fad": "firesp", "msgnumber": 12, "originator_urn": 1234,
+		"originator_unitname": "ALPHA", "rcpt_urns": [1, 2, 3],
+		"rcpt_unitnames": ["BRAVO", None, "CHARLIE"], "msgprecedence": "flash",
+		"originatordtg": "2015-03-26 10:42:17 12"}),
+	("references", {"fad": "airops", "msgnumber": 3, "rcpt_urns": [7, 8],
+		"info_urns": [9], "releasemark": [1, 2, 3], "ref_urn": [5, 6],
+		"ref_unitname": ["R1", "R2"], "refdtg": ["2015-01-01 01:01", "2016-01-01 01:01:01 4"],
+		"keymatid": 1 << 63, "keymatlen": 3, "secparam": 1}),
+)
+#//////////////////////////////////////////////////////////
+
+def time_loop(_function, _args, _runs):
+	"""
+		Calls a function several times.
+
+		Returns:
+			The average time of a call, in microseconds.
+	"""
+	start = time.time()
+	for i in xrange(_runs):
+		_function(*_args)
+	return (time.time() - start) * 1e6 / _runs
+
+def main(args):
+	layout = header_layout(args.version)
+	for name in GENERATED_FUNCTIONS:
+		start = time.time()
+		layout.generate(name)
+		print("{:s}() generated in {:.1f} ms".format(name, (time.time() - start) * 1000.0))
+	print("{:<12s} {:>6s} {:>14s} {:>14s}".format("header", "bits", "encode (us)", "decode (us)"))
+	for (name, params) in HEADERS:
+		values = layout.new_values()
+		values.update(dict(params, vmfversion=args.version))
+		writer = BitWriter(DEFAULT_CAPACITY)
+		layout.write(values, writer)
+		bits = len(writer)
+		data = writer.tobytes()
+
+		def encode():
+			writer.reset()
+			layout.write(values, writer)
+
+		def decode():
+			layout.decode(BitReader(data))
+
+		print("{:<12s} {:>6d} {:>14.1f} {:>14.1f}".format(name, bits,
+			time_loop(encode, (), args.runs), time_loop(decode, (), args.runs)))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Measures the time taken to encode and decode headers with the functions generated for their layout.")
+	parser.add_argument("--vmf-version",
+		dest="version",
+		default="std47001c",
+		help="Version of the headers. Defaults to std47001c.")
+	parser.add_argument("-n", "--runs",
+		type=int,
+		default=10000,
+		help="Number of times each header is encoded and decoded. Defaults to 10000.")
+	main(parser.parse_args())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+DEFAULT_VMFCAT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+	os.pardir, "vmfcat.py")
+
+# Single message encoded by the encode scenarios. Only options which
+# every version of vmfcat accepts are used, so that checkouts older
+# than the output framings can be compared.
+ENCODE_ARGUMENTS = ["--vmf-version", "std47001c", "--fad", "firesp",
+	"--msg-number", "12"]
+
+# Command lines timed, as (name, arguments, use schema cache)
+# tuples. The interpreter alone is timed as a baseline.
+SCENARIOS = (
+	("python", None, False),
+	("version", ["--version"], False),
+	("help", ["--help"], False),
+	("encode", ENCODE_ARGUMENTS, False),
+	("cached", ENCODE_ARGUMENTS, True),
+)
+#//////////////////////////////////////////////////////////
+
+def time_command(_command, _runs, _env=None):
+	"""
+		Runs a command several times.
+
+		Returns:
+			A sorted list of the wall clock time of each run, in
+			milliseconds.
+	"""
+	times = []
+	with open(os.devnull, "w") as devnull:
+		for i in range(_runs):
+			start = time.time()
+			subprocess.check_call(_command, stdout=devnull, stderr=devnull, env=_env)
+			times.append((time.time() - start) * 1000.0)
+	times.sort()
+	return times
+
+def main(args):
+	vmfcat = os.path.abspath(args.vmfcat)
+	# Compiled modules are written by the warm up run, as they
+	# are for installed copies.
+	env = dict(os.environ)
+	env.pop("PYTHONDONTWRITEBYTECODE", None)
+	env.pop("VMFCAT_SCHEMA_CACHE", None)
+	(handle, cache) = tempfile.mkstemp(suffix=".layout")
+	os.close(handle)
+	os.remove(cache)
+	cached_env = dict(env, VMFCAT_SCHEMA_CACHE=cache)
+	try:
+		time_command([args.python, vmfcat] + ENCODE_ARGUMENTS, 1, cached_env)
+		print("{:<10s} {:>10s} {:>10s} {:>10s}".format("scenario", "min (ms)", "median", "mean"))
+		for (name, arguments, use_cache) in SCENARIOS:
+			if (arguments is None):
+				command = [args.python, "-c", "pass"]
+			else:
+				command = [args.python, vmfcat] + arguments
+			times = time_command(command, args.runs, cached_env if use_cache else env)
+			print("{:<10s} {:>10.1f} {:>10.1f} {:>10.1f}".format(name,
+				times[0], times[len(times) // 2], sum(times) / len(times)))
+	finally:
+		if (os.path.exists(cache)):
+			os.remove(cache)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Measures the startup time of vmfcat. Run it against two checkouts to compare them.")
+	parser.add_argument("--vmfcat",
+		default=DEFAULT_VMFCAT,
+		help="Path of the vmfcat.py script to time. Defaults to the one of this checkout.")
+	parser.add_argument("--python",
+		default=sys.executable,
+		help="Interpreter running vmfcat. Defaults to the current one.")
+	parser.add_argument("-n", "--runs",
+		type=int,
+		default=50,
+		help="Number of runs of each command. Defaults to 50.")
+	main(parser.parse_args())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import re
+import sys
+import json
+import unittest
+from binascii import unhexlify
+from cStringIO import StringIO
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import Message
+from Logger import Logger
+from Factory import Factory
+from Bits import BitReader
+from Batch import BatchEncoder, ParallelBatchEncoder, FRAMING_HEX
+from test_roundtrip import DefinitionTestCase
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Version of each of the definitions of the mixed batches
+REVA_VERSION = "std47001c"
+REVB_VERSION = "std47001d_change"
+#//////////////////////////////////////////////////////////
+
+def decode_hex(_output):
+	"""
+		Decodes the headers written by a batch encoder with hex
+		framing.
+
+		Returns:
+			A list of HeaderValues objects.
+	"""
+	registry = Message.header_layouts()
+	return [registry.decode(BitReader(unhexlify(line)))
+		for line in _output.getvalue().splitlines()]
+
+# =============================================================================
+# MixedSchemaTest Class
+#
+# Description:
+#   Filters batches mixing headers of two definitions, each adding its
+#   own field to the header.
+#
+class MixedSchemaTest(DefinitionTestCase):
+
+	def setUp(self):
+		DefinitionTestCase.setUp(self)
+		Message.register_definition(self.definition("RevA", {
+			"a1": {"group": "r3", "index": 99, "size": 8}}), [REVA_VERSION])
+		Message.register_definition(self.definition("RevB", {
+			"b1": {"group": "r3", "index": 99, "size": 8}}), [REVB_VERSION])
+		specs = []
+		for value in range(4, 7):
+			specs.append({"vmfversion": REVA_VERSION, "fad": "firesp", "msgnumber": value, "a1": value})
+			specs.append({"vmfversion": REVB_VERSION, "fad": "airops", "msgnumber": value, "b1": value})
+		self.batch = "".join(json.dumps(spec) + "\n" for spec in specs)
+
+	def encode(self, _where, _workers=1):
+		output = StringIO()
+		logger = Logger(StringIO())
+		if (_workers == 1):
+			encoder = BatchEncoder(output, FRAMING_HEX, None, Factory(_logger=logger), _where)
+		else:
+			encoder = ParallelBatchEncoder(output, FRAMING_HEX, None, _workers, 1, logger, _where)
+		(written, skipped) = encoder.run(StringIO(self.batch))
+		self.assertEqual(skipped, 0)
+		self.assertEqual(written + encoder.filtered, 6)
+		return [(values["vmfversion"], values["msgnumber"]) for values in decode_hex(output)]
+
+	def test_field_of_each_definition(self):
+		for workers in (1, 2):
+			self.assertEqual(self.encode("a1 == 5", workers), [(REVA_VERSION, 5)])
+			self.assertEqual(self.encode("b1 == 5", workers), [(REVB_VERSION, 5)])
+			self.assertEqual(self.encode("a1 >= 5 or b1 == 4", workers),
+				[(REVB_VERSION, 4), (REVA_VERSION, 5), (REVA_VERSION, 6)])
+			self.assertEqual(self.encode("b1", workers),
+				[(REVB_VERSION, 4), (REVB_VERSION, 5), (REVB_VERSION, 6)])
+
+# =============================================================================
+# InvalidLinesTest Class
+#
+# Description:
+#   Checks that invalid lines are reported with their line number and
+#   skipped, in the order of the input, by both batch encoders.
+#
+class InvalidLinesTest(unittest.TestCase):
+
+	lines = [
+		'{"fad": "firesp", "msgnumber": 1}',
+		'',
+		'{bad',
+		'[1]',
+		'{"fad": "firesp", "msgnumber": 2}',
+		'{"fad": "nosuchfad"}',
+		'{"fad": "airops", "msgnumber": 3}',
+		'{bad'
+	]
+
+	def encode(self, _workers, _chunksize=2):
+		output = StringIO()
+		log = StringIO()
+		logger = Logger(log)
+		if (_workers == 1):
+			encoder = BatchEncoder(output, FRAMING_HEX, None, Factory(_logger=logger))
+		else:
+			encoder = ParallelBatchEncoder(output, FRAMING_HEX, None, _workers, _chunksize, logger)
+		result = encoder.run(StringIO("\n".join(self.lines)))
+		# The logger appends the line of the exception being handled
+		messages = [re.sub(r"\[\d+\]$", "", line) for line in log.getvalue().splitlines()]
+		return (result, output.getvalue(), messages)
+
+	def test_serial_and_parallel(self):
+		(result, output, log) = self.encode(1)
+		self.assertEqual(result, (3, 4))
+		self.assertEqual([values["msgnumber"] for values in decode_hex(StringIO(output))], [1, 2, 3])
+		self.assertEqual([line.split(":")[0] for line in log],
+			["[-] Line 3", "[-] Line 4", "[-] Line 6", "[-] Line 8"])
+		for chunksize in (1, 2, 3, 100):
+			self.assertEqual(self.encode(2, chunksize), (result, output, log))
+
+if __name__ == "__main__":
+	unittest.main()
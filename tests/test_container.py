@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import Message
+from Bits import BitReader
+from Container import ContainerWriter, ContainerReader
+from Container import FILE_HEADER, RECORD_HEADER, INDEX_ENTRY, TRAILER
+from test_roundtrip import SEED, random_values
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+VERSION = "std47001c"
+# Number of records of the containers
+RECORDS = 20
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# ContainerTest Class
+#
+# Description:
+#   Writes containers of random headers, corrupts them and checks that
+#   corrupted records are detected and that containers without a
+#   valid footer are recovered by scanning their records.
+#
+class ContainerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.filename = os.path.join(self.folder, "headers.vmfc")
+		rnd = random.Random(SEED)
+		layout = Message.header_layouts().layout(VERSION)
+		self.payloads = [layout.encode_bytes(random_values(rnd, layout, VERSION)) for i in range(RECORDS)]
+		with ContainerWriter(self.filename) as writer:
+			for data in self.payloads:
+				writer.append(data)
+		with open(self.filename, "rb") as f:
+			self.data = f.read()
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def rewrite(self, _data):
+		with open(self.filename, "wb") as f:
+			f.write(_data)
+
+	def offset(self, _n):
+		"""
+			Returns the offset of record _n, computed from the sizes
+			of the payloads.
+		"""
+		return FILE_HEADER.size + sum(RECORD_HEADER.size + len(data) for data in self.payloads[:_n])
+
+	def footer_size(self):
+		return RECORDS * INDEX_ENTRY.size + TRAILER.size
+
+	def check_records(self, _reader, _payloads):
+		self.assertEqual(len(_reader), len(_payloads))
+		self.assertEqual([data for (n, data) in _reader.records()], _payloads)
+		for (n, data) in enumerate(_payloads):
+			self.assertEqual(_reader.offset(n), self.offset(n))
+			self.assertEqual(_reader.record(n), data)
+			self.assertEqual(_reader.message(n).values.items(),
+				Message.header_layouts().decode(BitReader(data)).items())
+
+	def test_records(self):
+		with ContainerReader(self.filename) as reader:
+			self.assertFalse(reader.recovered)
+			self.check_records(reader, self.payloads)
+			self.assertEqual(reader.record(-1), self.payloads[-1])
+			self.assertRaises(IndexError, reader.record, RECORDS)
+			self.assertEqual(reader.ranges(3), [(0, 7), (7, 14), (14, 20)])
+
+	def test_corrupted_payload(self):
+		data = bytearray(self.data)
+		data[self.offset(3) + RECORD_HEADER.size] ^= 0x01
+		self.rewrite(str(data))
+		with ContainerReader(self.filename) as reader:
+			self.assertFalse(reader.recovered)
+			self.assertRaisesRegexp(Exception, "Record 3 is corrupted", reader.record, 3)
+			self.assertEqual(reader.record(4), self.payloads[4])
+			# Corrupted records are skipped unless asked otherwise
+			self.assertEqual([n for (n, payload) in reader.records()],
+				[n for n in range(RECORDS) if n != 3])
+			records = reader.records(_skip_corrupt=False)
+			self.assertEqual([next(records)[0] for n in range(3)], [0, 1, 2])
+			self.assertRaisesRegexp(Exception, "Record 3 is corrupted", next, records)
+
+	def test_corrupted_length(self):
+		# The length of the last record goes past the footer
+		data = bytearray(self.data)
+		offset = self.offset(RECORDS - 1)
+		RECORD_HEADER.pack_into(data, offset, len(self.payloads[-1]) + 1,
+			RECORD_HEADER.unpack_from(self.data, offset)[1])
+		self.rewrite(str(data))
+		with ContainerReader(self.filename) as reader:
+			self.assertFalse(reader.recovered)
+			self.assertRaisesRegexp(Exception, "Record {:d} is corrupted".format(RECORDS - 1),
+				reader.record, RECORDS - 1)
+			self.assertEqual(len(list(reader.records())), RECORDS - 1)
+
+	def test_missing_footer(self):
+		# The writer was interrupted before writing the footer
+		self.rewrite(self.data[:-self.footer_size()])
+		with ContainerReader(self.filename) as reader:
+			self.assertTrue(reader.recovered)
+			self.check_records(reader, self.payloads)
+
+	def test_truncated_record(self):
+		# Scanning stops at the record which was partially written
+		self.rewrite(self.data[:self.offset(RECORDS - 1) + RECORD_HEADER.size + 1])
+		with ContainerReader(self.filename) as reader:
+			self.assertTrue(reader.recovered)
+			self.check_records(reader, self.payloads[:-1])
+
+	def test_inconsistent_trailer(self):
+		# The trailer does not describe the footer preceding it
+		data = bytearray(self.data)
+		(footer, count, magic) = TRAILER.unpack_from(self.data, len(self.data) - TRAILER.size)
+		TRAILER.pack_into(data, len(data) - TRAILER.size, footer, count + 1, magic)
+		self.rewrite(str(data))
+		with ContainerReader(self.filename) as reader:
+			self.assertTrue(reader.recovered)
+			# Scanning stops at the footer
+			self.check_records(reader, self.payloads)
+
+	def test_truncated_footer(self):
+		# The writer was interrupted while writing the footer
+		for size in (1, INDEX_ENTRY.size, self.footer_size() - 1):
+			self.rewrite(self.data[:len(self.data) - self.footer_size() + size])
+			with ContainerReader(self.filename) as reader:
+				self.assertTrue(reader.recovered)
+				self.check_records(reader, self.payloads)
+
+	def test_invalid_files(self):
+		self.rewrite("")
+		self.assertRaisesRegexp(Exception, "is empty", ContainerReader, self.filename)
+		self.rewrite("VMF")
+		self.assertRaisesRegexp(Exception, "is not a VMF container", ContainerReader, self.filename)
+		self.rewrite("VMFX" + self.data[4:])
+		self.assertRaisesRegexp(Exception, "is not a VMF container", ContainerReader, self.filename)
+		self.rewrite(FILE_HEADER.pack("VMFC", 2))
+		self.assertRaisesRegexp(Exception, "Unsupported container version 2", ContainerReader, self.filename)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import sys
+import csv
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from collections import Counter
+from cStringIO import StringIO
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import Message
+from Batch import frame
+from Capture import analyze_capture
+from Export import JsonLinesWriter, CsvWriter, SqliteExporter, export_sqlite
+from Export import SQL_MESSAGES_TABLE, _sql_value
+from test_roundtrip import SEED, CASES, random_values
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+VERSION = "std47001c"
+# Fields written by the projection tests
+FIELDS = ("originator_urn", "rcpt_urns", "fad", "releasemark")
+#//////////////////////////////////////////////////////////
+
+def new_values(_fields):
+	"""
+		Returns the values of a header with the given fields.
+	"""
+	values = Message.header_layouts().layout(VERSION).new_values()
+	values.set("vmfversion", VERSION)
+	for (code, value) in _fields.items():
+		values.set(code, value)
+	return values
+
+def write_capture(_filename, _headers):
+	"""
+		Writes the encoded headers to a capture with the length
+		framing.
+	"""
+	layout = Message.header_layouts().layout(VERSION)
+	with open(_filename, "wb") as capture:
+		for values in _headers:
+			capture.write(frame(layout.encode_bytes(values)))
+
+# =============================================================================
+# ProjectionTest Class
+#
+# Description:
+#   Checks that the fields of repeatable groups are written as lists
+#   whatever the number of instances of their group.
+#
+class ProjectionTest(unittest.TestCase):
+
+	def setUp(self):
+		self.headers = [
+			new_values({"originator_urn": 1, "rcpt_urns": [10], "fad": ["geninfo"],
+				"releasemark": [7, 8]}),
+			new_values({"originator_urn": 2, "rcpt_urns": [10, 11], "fad": ["geninfo", "firesp"]}),
+			new_values({"originator_urn": 3})
+		]
+
+	def project(self, _writer):
+		output = StringIO()
+		with _writer(output, FIELDS) as writer:
+			for values in self.headers:
+				writer.write(values)
+		return output.getvalue()
+
+	def test_jsonl(self):
+		rows = [json.loads(line) for line in self.project(JsonLinesWriter).splitlines()]
+		self.assertEqual(rows, [
+			{"originator_urn": 1, "rcpt_urns": [10], "fad": ["geninfo"], "releasemark": [[7, 8]]},
+			{"originator_urn": 2, "rcpt_urns": [10, 11], "fad": ["geninfo", "firesp"], "releasemark": None},
+			{"originator_urn": 3, "rcpt_urns": None, "fad": None, "releasemark": None}])
+
+	def test_csv(self):
+		rows = list(csv.reader(StringIO(self.project(CsvWriter))))
+		self.assertEqual(rows, [
+			list(FIELDS),
+			["1", "10", "geninfo", "7,8"],
+			["2", "10;11", "geninfo;firesp", ""],
+			["3", "", "", ""]])
+
+# =============================================================================
+# SqliteExportTest Class
+#
+# Description:
+#   Exports headers to a SQLite database and checks that every
+#   instance of the repeatable groups is stored in the child tables.
+#
+class SqliteExportTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.capture = os.path.join(self.folder, "capture.bin")
+		self.database = os.path.join(self.folder, "export.db")
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def query(self, _sql):
+		connection = sqlite3.connect(self.database)
+		try:
+			return connection.execute(_sql).fetchall()
+		finally:
+			connection.close()
+
+	def test_instances(self):
+		# The first instances have no field set
+		write_capture(self.capture, [
+			new_values({"rcpt_urns": [None, 11, 12], "fad": ["geninfo", "firesp"]}),
+			new_values({"rcpt_unitnames": ["A"]})])
+		self.assertEqual(export_sqlite(self.capture, self.database), 2)
+		self.assertEqual(self.query("SELECT message_id, position, rcpt_urns, rcpt_unitnames FROM recipients "
+			"ORDER BY message_id, position"), [(1, 0, None, None), (1, 1, 11, None), (1, 2, 12, None), (2, 0, None, "A")])
+		self.assertEqual(self.query("SELECT message_id, position, fad FROM message_handling "
+			"ORDER BY message_id, position"), [(1, 0, "geninfo"), (1, 1, "firesp")])
+		self.assertEqual(self.query("SELECT id, fad FROM messages ORDER BY id"), [(1, "geninfo"), (2, None)])
+
+	def test_counts(self):
+		# The values stored are the ones counted by --analyze
+		rnd = random.Random(SEED)
+		layout = Message.header_layouts().layout(VERSION)
+		write_capture(self.capture, [random_values(rnd, layout, VERSION) for i in range(CASES)])
+		self.assertEqual(export_sqlite(self.capture, self.database), CASES)
+		with SqliteExporter(self.database) as exporter:
+			tables = [(table, slots) for (table, group, slots) in exporter.children]
+			tables.append((SQL_MESSAGES_TABLE, [slot for slot in exporter.columns if slot.context is None]))
+		for (table, slots) in tables:
+			fields = [slot.code for slot in slots if not slot.is_repeatable]
+			counts = analyze_capture(self.capture, fields, 1)
+			for code in fields:
+				stored = Counter(value for (value,) in self.query(
+					'SELECT "{:s}" FROM {:s} WHERE "{:s}" IS NOT NULL'.format(code, table, code)))
+				expected = Counter(dict((_sql_value(value), n) for (value, n) in counts[code].items()))
+				self.assertEqual(stored, expected, code)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import Message
+from Container import ContainerWriter
+from Index import build_index, ArchiveIndex
+from test_roundtrip import SEED, random_values
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+VERSION = "std47001c"
+# Number of records of the containers
+RECORDS = 20
+# Modification time given to the containers, in whole seconds so
+# that it can be restored exactly
+MTIME = 1427371200
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# StaleIndexTest Class
+#
+# Description:
+#   Modifies indexed containers and checks that their index is
+#   reported as stale, whether the size, the modification time or
+#   only the footer of the container changed.
+#
+class StaleIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.filename = os.path.join(self.folder, "headers.vmfc")
+		rnd = random.Random(SEED)
+		self.layout = Message.header_layouts().layout(VERSION)
+		self.payloads = [self.layout.encode_bytes(random_values(rnd, self.layout, VERSION))
+			for i in range(RECORDS)]
+		self.write(self.payloads)
+		self.assertEqual(build_index(self.filename), RECORDS)
+		self.size = os.path.getsize(self.filename)
+
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+
+	def write(self, _payloads, _footer=True):
+		"""
+			Writes the container, and sets its modification time to
+			MTIME.
+		"""
+		with open(self.filename, "wb") as f:
+			writer = ContainerWriter(f)
+			for data in _payloads:
+				writer.append(data)
+			if (_footer):
+				writer.close()
+		os.utime(self.filename, (MTIME, MTIME))
+
+	def swapped(self):
+		"""
+			Returns the payloads with the first record swapped with
+			a record of another size. The size of the container is
+			the same but the records are moved.
+		"""
+		payloads = list(self.payloads)
+		n = [n for n in range(1, RECORDS) if len(payloads[n]) != len(payloads[0])][0]
+		(payloads[0], payloads[n]) = (payloads[n], payloads[0])
+		return payloads
+
+	def assertStale(self):
+		self.assertRaisesRegexp(Exception, "is stale", ArchiveIndex, self.filename)
+
+	def test_fresh(self):
+		with ArchiveIndex(self.filename) as index:
+			self.assertEqual(index.query({}), range(RECORDS))
+		# Writing the same container again keeps the index valid
+		self.write(self.payloads)
+		with ArchiveIndex(self.filename) as index:
+			self.assertEqual(len(index.container), RECORDS)
+
+	def test_size(self):
+		self.write(self.payloads[:-1])
+		self.assertStale()
+
+	def test_mtime(self):
+		os.utime(self.filename, (MTIME, MTIME + 1))
+		self.assertStale()
+
+	def test_footer(self):
+		self.write(self.swapped())
+		self.assertEqual(os.path.getsize(self.filename), self.size)
+		self.assertStale()
+
+	def test_recovered(self):
+		# Containers without footer are checked through the offsets
+		# of their records
+		self.write(self.payloads, False)
+		build_index(self.filename)
+		with ArchiveIndex(self.filename) as index:
+			self.assertTrue(index.container.recovered)
+		self.write(self.swapped(), False)
+		self.assertStale()
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import Message
+from Query import Where, tokenize
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+VERSION = "std47001c"
+
+# Expressions and whether they match the header of WhereTest
+MATCHES = (
+	("fad == firesp",									True),
+	("fad == FIRESP",									True),
+	("fad == 2",										True),
+	("fad != firesp",									False),
+	("msgprecedence >= flash",							True),
+	("msgprecedence > flash",							False),
+	("classification != unclass",						True),
+	("rc == mr",										False),
+	("rc != mr",										True),
+	("originator_urn",									True),
+	("originator_unitname",								False),
+	("not originator_unitname",							True),
+	("originator_urn == 0x10",							True),
+	("rcpt_urns == 11",									True),
+	("rcpt_urns > 11",									False),
+	('filename == "a b"',								True),
+	("filename == 'a'",									False),
+	('originatordtg <= "2015-03-26 12:30"',				True),
+	('originatordtg < "2015-03-26 12:30"',				False),
+	('originatordtg > "2015-03-26 12:30:44"',			True),
+	("fad == firesp and msgprecedence == flash",		True),
+	("fad == firesp AND msgprecedence == routine",		False),
+	("fad == geninfo or rcpt_urns == 10",				True),
+	("not (fad == geninfo or rcpt_urns == 10)",			False),
+	("not fad == geninfo and not rcpt_urns == 12",		True),
+	("(fad == geninfo or rcpt_urns == 12) or originator_urn < 16", False),
+)
+
+# Invalid expressions and the error they raise
+ERRORS = (
+	("fad == firesp &",				r"Invalid expression at position 13"),
+	("fad ==",						r"Unexpected end of expression"),
+	("(fad == firesp",				r"Unexpected end of expression"),
+	("(fad == firesp fad",			r"Missing '\)'"),
+	("fad == firesp)",				r"Unexpected '\)'"),
+	("fad == firesp fad",			r"Unexpected 'fad'"),
+	("== firesp",					r"Expected a field name instead of '=='"),
+	("fad == (",					r"Expected a value instead of '\('"),
+	("nosuch == 1",					r"Unknown field 'nosuch'"),
+	("fad == nosuch",				r"Invalid value 'nosuch' for field 'fad'"),
+	("originator_urn == urn",		r"Invalid value 'urn' for field 'originator_urn'"),
+	("originatordtg > yesterday",	r"yesterday"),
+)
+#//////////////////////////////////////////////////////////
+
+# =============================================================================
+# WhereTest Class
+#
+# Description:
+#   Checks the parsing of filter expressions, their evaluation against
+#   a header and the errors of invalid expressions.
+#
+class WhereTest(unittest.TestCase):
+
+	def setUp(self):
+		layout = Message.header_layouts().layout(VERSION)
+		self.values = layout.new_values()
+		self.values.set("vmfversion", VERSION)
+		self.values.set("originator_urn", 16)
+		self.values.set("rcpt_urns", [10, 11])
+		self.values.set("fad", ["firesp"])
+		self.values.set("msgprecedence", ["flash"])
+		self.values.set("classification", ["secret"])
+		self.values.set("filename", ["a b"])
+		self.values.set("originatordtg", ["2015-03-26 12:30:45"])
+
+	def test_tokenize(self):
+		self.assertEqual(tokenize("NOT(fad>=firesp) Or x=='a b'"), [
+			("not", "not"), ("paren", "("), ("word", "fad"), ("op", ">="),
+			("word", "firesp"), ("paren", ")"), ("or", "or"), ("word", "x"),
+			("op", "=="), ("string", "a b")])
+
+	def test_matches(self):
+		registry = Message.header_layouts()
+		for (expression, expected) in MATCHES:
+			where = Where(expression)
+			self.assertEqual(where(self.values), expected, expression)
+			self.assertEqual(where.match(registry.values_of(self.values)), expected, expression)
+
+	def test_codes(self):
+		# Parameter names are accepted for the fields and the codes
+		# to decode are listed once
+		where = Where("rc == mr or (fad == firesp and rccode != mr)")
+		self.assertEqual(where.codes, ["rccode", "fad"])
+
+	def test_errors(self):
+		for (expression, error) in ERRORS:
+			self.assertRaisesRegexp(Exception, error, Where, expression)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2015 Jonathan Racicot
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http:#www.gnu.org/licenses/>.
+#
+# You are free to use and modify this code for your own software
+# as long as you retain information about the original author
+# in your code as shown below.
+#
+# <author>Jonathan Racicot</author>
+# <email>infectedpacket@gmail.com</email>
+# <date>2015-03-26</date>
+# <url>https://github.com/infectedpacket</url>
+#
+__version_info__ = ('0','1','0')
+__version__ = '.'.join(__version_info__)
+
+#//////////////////////////////////////////////////////////
+# Imports Statements
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import Message
+from Bits import BitWriter, BitReader, DEFAULT_CAPACITY
+from Definition import HeaderDefinition, definition_data
+from Schema import Instances, KIND_ENUM, KIND_STRING, KIND_DTG
+from Schema import load_layouts
+#//////////////////////////////////////////////////////////
+
+#//////////////////////////////////////////////////////////
+# Global constants
+
+# Seed of the random headers, so that failures can be reproduced
+SEED = 47001
+# Number of random headers encoded per version
+CASES = 150
+# Maximum number of instances of a repeatable group or of
+# occurrences of a repeatable field
+MAX_INSTANCES = 3
+#//////////////////////////////////////////////////////////
+
+def random_value(_rnd, _slot):
+	"""
+		Returns a random valid value for a field.
+	"""
+	if (_slot.kind == KIND_ENUM):
+		return _rnd.choice(sorted(_slot.enum.by_name))
+	if (_slot.kind == KIND_STRING):
+		size = _rnd.randrange(_slot.size // 7 + 1)
+		return "".join(chr(_rnd.randrange(32, 127)) for i in range(size))
+	if (_slot.kind == KIND_DTG):
+		dtg = "20{:02d}-{:02d}-{:02d} {:02d}:{:02d}".format(_rnd.randrange(100),
+			_rnd.randrange(1, 13), _rnd.randrange(1, 29), _rnd.randrange(24), _rnd.randrange(60))
+		if (_rnd.random() < 0.5):
+			dtg += ":{:02d}".format(_rnd.randrange(60))
+		if (_slot.has_extension and _rnd.random() < 0.5):
+			dtg += " {:d}".format(_rnd.randrange(1 << 12))
+		return dtg
+	return _rnd.choice((0, (1 << _slot.size) - 1, _rnd.randrange(1 << _slot.size)))
+
+def random_values(_rnd, _layout, _version, _scalar=False):
+	"""
+		Fills the fields of a layout with random values.
+
+		Args:
+			_rnd: random.Random object.
+			_layout: HeaderLayout object.
+			_version: Name of the version of the header.
+			_scalar: If True, a single value is given to each field,
+					as the legacy Header only has one instance of
+					each element.
+
+		Returns:
+			A HeaderValues object.
+	"""
+	values = _layout.new_values()
+	density = _rnd.random()
+	for slot in _layout.slots:
+		if (_rnd.random() >= density):
+			continue
+		if (_scalar):
+			value = random_value(_rnd, slot)
+		elif (slot.context is not None and _rnd.random() < 0.5):
+			value = Instances(random_value(_rnd, slot) if _rnd.random() < 0.8 else None
+				for i in range(_rnd.randrange(1, MAX_INSTANCES + 1)))
+		elif (slot.is_repeatable and not slot.is_indicator):
+			# Fields without FPI have a single occurrence
+			value = [random_value(_rnd, slot) for i in range(_rnd.randrange(1, MAX_INSTANCES + 1))]
+		else:
+			value = random_value(_rnd, slot)
+		values.set(slot.code, value)
+	values.set("vmfversion", _version)
+	return values
+
+def interpreted_bytes(_layout, _values):
+	"""
+		Encodes a header by walking its layout rather than with
+		the generated encoder.
+	"""
+	writer = BitWriter(DEFAULT_CAPACITY)
+	cursors = [0] * len(_layout.groups)
+	_layout._encode_group(_layout.root, 0, _values.values, _values.counts, cursors, writer)
+	return writer.tobytes()
+
+# =============================================================================
+# RoundTripTest Class
+#
+# Description:
+#   Encodes random headers of every registered version, decodes them
+#   and encodes them again. The generated encoder is compared with the
+#   encoder walking the layout and with the legacy Header objects.
+#
+class RoundTripTest(unittest.TestCase):
+
+	def setUp(self):
+		self.rnd = random.Random(SEED)
+		self.registry = Message.header_layouts()
+		self.versions = sorted(Message.HEADER_DEFINITIONS.keys())
+
+	def check_roundtrip(self, _layout, _values):
+		data = _layout.encode_bytes(_values)
+		self.assertEqual(interpreted_bytes(_layout, _values), data)
+		decoded = self.registry.decode(BitReader(data))
+		self.assertIs(decoded.layout, _layout)
+		self.assertEqual(_layout.encode_bytes(decoded), data)
+		again = _layout.decode(BitReader(data))
+		self.assertEqual(again.items(), decoded.items())
+		return data
+
+	def test_random_headers(self):
+		for version in self.versions:
+			layout = self.registry.layout(version)
+			for i in range(CASES):
+				self.check_roundtrip(layout, random_values(self.rnd, layout, version))
+
+	def test_legacy_header(self):
+		for version in self.versions:
+			layout = self.registry.layout(version)
+			for i in range(CASES):
+				message = Message.Message(_layout=layout)
+				message.values = random_values(self.rnd, layout, version, True)
+				data = self.check_roundtrip(layout, message.values)
+				self.assertEqual(message.header.get_bit_array(), layout.encode(message.values))
+				self.assertEqual(message.header.get_bit_array().tobytes(), data)
+
+	def test_counts(self):
+		# Instances without any field set are only encoded through
+		# the counts of their group
+		for version in self.versions:
+			layout = self.registry.layout(version)
+			for group in layout.groups:
+				if (group.is_repeatable and group.context is None):
+					values = random_values(self.rnd, layout, version)
+					values.set_count(group.code, self.rnd.randrange(1, MAX_INSTANCES + 1))
+					self.check_roundtrip(layout, values)
+
+# =============================================================================
+# DefinitionTestCase Class
+#
+# Description:
+#   Base class of the tests registering header definitions. The
+#   definitions and layouts of the Message module are restored after
+#   each test.
+#
+class DefinitionTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.state = (dict(Message.HEADER_DEFINITIONS), Message._default_definition,
+			Message._schema_cache, Message._header_layouts)
+		Message._header_layouts = None
+
+	def tearDown(self):
+		(definitions, Message._default_definition,
+			Message._schema_cache, Message._header_layouts) = self.state
+		Message.HEADER_DEFINITIONS.clear()
+		Message.HEADER_DEFINITIONS.update(definitions)
+
+	def definition(self, _name, _fields=None, _removed=()):
+		"""
+			Returns the built-in header with other fields.
+
+			Args:
+				_name: Name of the definition.
+				_fields: Dictionary of the attributes of the fields
+						added or replaced, by code.
+				_removed: Codes of the fields removed.
+		"""
+		data = definition_data()
+		data["name"] = _name
+		data["fields"].update(_fields or {})
+		for code in _removed:
+			del data["fields"][code]
+		return HeaderDefinition(data, json.dumps(data))
+
+# =============================================================================
+# VersionDefinitionTest Class
+#
+# Description:
+#   Round trips headers of versions whose definition differs from the
+#   default one. Fields are matched by code across the layouts.
+#
+class VersionDefinitionTest(DefinitionTestCase):
+
+	def check_version(self, _version, _definition):
+		Message.register_definition(_definition, [_version])
+		registry = Message.header_layouts()
+		layout = registry.layout(_version)
+		default = registry.layout("std47001c")
+		rnd = random.Random(SEED)
+		for i in range(CASES):
+			values = random_values(rnd, layout, _version)
+			data = layout.encode_bytes(values)
+			self.assertEqual(interpreted_bytes(layout, values), data)
+			decoded = registry.decode(BitReader(data))
+			self.assertIs(decoded.layout, layout)
+			self.assertEqual(layout.encode_bytes(decoded), data)
+			# The values are numbered alike in all the versions
+			mapped = registry.values_of(decoded)
+			for slot in registry.slots:
+				self.assertEqual(mapped[slot.slot], decoded.get(slot.code))
+		# Other versions are not changed
+		values = random_values(rnd, default, "std47001c")
+		self.assertEqual(registry.values_of(values)[:len(default.slots)], values.values)
+		return layout
+
+	def test_inserted_field(self):
+		layout = self.check_version("std47001d_change", self.definition("Inserted", {
+			"originator_unitname": dict(definition_data()["fields"]["originator_unitname"], index=2),
+			"originator_role": {"group": "g1", "index": 1, "size": 5}}))
+		self.assertEqual([s.code for s in layout.slots[2:5]],
+			["originator_urn", "originator_role", "originator_unitname"])
+
+	def test_removed_field(self):
+		layout = self.check_version("std47001d_change", self.definition("Removed", _removed=("filename",)))
+		self.assertNotIn("filename", layout)
+		self.assertIn("filename", Message.header_layouts().slot_index)
+
+	def test_conflicting_field(self):
+		Message.register_definition(self.definition("Conflict", {
+			"filename": {"group": "r3", "index": 3, "size": 8}}), ["std47001d_change"])
+		self.assertRaisesRegexp(Exception, "defined differently", Message.header_layouts)
+
+# =============================================================================
+# SchemaCacheTest Class
+#
+# Description:
+#   Checks that the layout cache is only used for the definitions it
+#   was written for.
+#
+class SchemaCacheTest(DefinitionTestCase):
+
+	def setUp(self):
+		DefinitionTestCase.setUp(self)
+		self.folder = tempfile.mkdtemp()
+		self.filename = os.path.join(self.folder, "layouts.cache")
+		Message.set_schema_cache(self.filename)
+
+	def tearDown(self):
+		DefinitionTestCase.tearDown(self)
+		shutil.rmtree(self.folder)
+
+	def test_cache_is_written_and_read(self):
+		registry = Message.header_layouts()
+		key = Message.definition_key()
+		self.assertTrue(os.path.exists(self.filename))
+		cached = load_layouts(self.filename, key)
+		self.assertIsNotNone(cached)
+		self.assertEqual(cached.dump(), registry.dump())
+		self.assertIsNone(load_layouts(self.filename, key + "/other"))
+
+		# Headers encoded with the cached layouts are the same
+		rnd = random.Random(SEED)
+		for version in sorted(Message.HEADER_DEFINITIONS.keys()):
+			values = random_values(rnd, registry.layout(version), version)
+			data = registry.layout(version).encode_bytes(values)
+			decoded = cached.decode(BitReader(data))
+			self.assertEqual(cached.layout(version).encode_bytes(decoded), data)
+
+	def test_cache_is_invalidated(self):
+		Message.header_layouts()
+		key = Message.definition_key()
+		Message.register_definition(self.definition("Extended", {
+			"extra": {"group": "r3", "index": 99, "size": 8}}), ["std47001d_change"])
+		self.assertNotEqual(Message.definition_key(), key)
+
+		registry = Message.header_layouts()
+		layout = registry.layout("std47001d_change")
+		self.assertIn("extra", layout)
+		self.assertNotIn("extra", registry.layout("std47001c"))
+		# The cache was written again for the new definitions
+		self.assertIsNone(load_layouts(self.filename, key))
+		cached = load_layouts(self.filename, Message.definition_key())
+		self.assertIsNotNone(cached)
+		self.assertIn("extra", cached.layout("std47001d_change"))
+
+		rnd = random.Random(SEED)
+		for i in range(CASES):
+			values = random_values(rnd, layout, "std47001d_change")
+			data = layout.encode_bytes(values)
+			self.assertEqual(interpreted_bytes(layout, values), data)
+			decoded = cached.decode(BitReader(data))
+			self.assertEqual(decoded.layout.encode_bytes(decoded), data)
+
+if __name__ == "__main__":
+	unittest.main()
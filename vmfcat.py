@@ -35,7 +35,9 @@ __version__ = '.'.join(__version_info__)
 
 #//////////////////////////////////////////////////////////
 # Imports Statements
-from UI import *
+import sys
+from UI import Params, parse_arguments
+from Logger import Logger
 #//////////////////////////////////////////////////////////
 
 def banner():
@@ -50,12 +52,117 @@ def banner():
 
 
 def main(args):
+	if (args.schemacache):
+		from Message import set_schema_cache
+		set_schema_cache(args.schemacache)
+	if (args.schema):
+		from Definition import load_definition
+		from Message import register_definition, header_layouts
+		definition = load_definition(args.schema)
+		register_definition(definition, definition.versions)
+		# Errors of the definition are reported once, before any
+		# message is encoded
+		header_layouts()
+	if (args.dumpschema):
+		import json
+		from Definition import definition_data
+		json.dump(definition_data(definition if args.schema else None),
+			args.outputfile, indent=2, separators=(",", ": "))
+		args.outputfile.write("\n")
+		return
+	# The modules of each mode are imported when the mode is
+	# selected, so that a run only loads what it uses.
 	if (args.interactive):
+		from UI import VmfShell
+		banner()
 		shell = VmfShell()
 		shell.start()
 	else:
-		#TODO manage command shell creation
-		pass
+		# Messages are written to the output file, errors are
+		# reported on STDERR.
+		logger = Logger(sys.stderr, _debug=args.debug)
+		try:
+			run(args, logger)
+		except Exception as e:
+			# Errors which stop the run are reported like the
+			# errors of the messages of a batch
+			logger.print_error(str(e))
+			sys.exit(1)
+		args.outputfile.flush()
+
+def run(args, logger):
+	"""
+		Runs the mode selected by the command line arguments, other
+		than the interactive shell.
+	"""
+	if (args.buildindex):
+		from Index import build_index, index_filename
+		count = build_index(args.buildindex)
+		logger.print_info("{:d} record(s) indexed in {:s}.".format(count, index_filename(args.buildindex)))
+		return
+	if (args.analyze):
+		import json
+		from Capture import analyze_capture, ANALYSIS_FIELDS
+		counts = analyze_capture(args.analyze, args.countfields or ANALYSIS_FIELDS,
+			args.workers or None, args.chunksize)
+		json.dump(dict((code, dict(counter)) for (code, counter) in counts.items()),
+			args.outputfile, sort_keys=True, indent=2)
+		args.outputfile.write("\n")
+		return
+	if (args.decode):
+		from Query import compile_where, filter_capture
+		where = compile_where(args.where) if args.where else None
+		if (args.sqlite):
+			from Export import export_sqlite
+			count = export_sqlite(args.decode, args.sqlite, args.framing, where)
+		elif (args.fields or args.format):
+			from Export import project_capture, FORMAT_JSONL
+			count = project_capture(args.decode, args.outputfile, args.fields,
+				args.format or FORMAT_JSONL, args.framing, where)
+		else:
+			count = filter_capture(args.decode, args.outputfile, args.framing, where)
+		logger.print_info("{:d} message(s) written.".format(count))
+		return
+	# Parameters given on the command line apply to every
+	# message of the batch.
+	defaults = dict((param, getattr(args, param, None))
+		for param in Params.parameters.keys())
+	if (args.assignments):
+		from Ingest import parse_assignments
+		from Message import header_layout
+		defaults.update(parse_assignments(args.assignments,
+			header_layout(defaults.get("vmfversion"))))
+	if (args.batch and args.workers != 1):
+		from Batch import ParallelBatchEncoder
+		encoder = ParallelBatchEncoder(args.outputfile, args.framing,
+			defaults, args.workers, args.chunksize, logger, args.where)
+	else:
+		from Batch import BatchEncoder
+		from Factory import Factory
+		encoder = BatchEncoder(args.outputfile, args.framing, defaults,
+			Factory(_logger=logger), args.where)
+	if (args.template):
+		from Template import Template
+		(written, skipped) = encoder.run_specs(Template.load(args.template))
+		logger.print_info("{:d} message(s) written, {:d} skipped, {:d} filtered out.".format(
+			written, skipped, encoder.filtered))
+	elif (args.fromcsv or args.fromsqlite):
+		from Ingest import read_csv, read_sqlite, ingest, parse_mapping, DEFAULT_SQL_QUERY
+		if (args.fromcsv):
+			chunks = read_csv(args.fromcsv, args.chunksize)
+		else:
+			chunks = read_sqlite(args.fromsqlite, args.sql or DEFAULT_SQL_QUERY, args.chunksize)
+		(written, skipped) = ingest(chunks, encoder, parse_mapping(args.mapping))
+		logger.print_info("{:d} message(s) written, {:d} skipped, {:d} filtered out.".format(
+			written, skipped, encoder.filtered))
+	elif (args.batch):
+		(written, skipped) = encoder.run(args.batch)
+		logger.print_info("{:d} message(s) written, {:d} skipped, {:d} filtered out.".format(
+			written, skipped, encoder.filtered))
+	else:
+		encoder.write({})
+	encoder.close()
+	args.outputfile.flush()
+
 if __name__ == "__main__":
-	banner()
-	main(parser.parse_args(namespace=Params))
+	main(parse_arguments())